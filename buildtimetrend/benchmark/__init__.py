@@ -0,0 +1,66 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmarks of the Buildtime Trend python library.
+
+Each module in this package benchmarks a part of the library,
+run a benchmark with `python -m buildtimetrend.benchmark.<module>`
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+from __future__ import division
+import os
+import timeit
+
+SAMPLE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "test"
+)
+SAMPLE_TRAVIS_LOG = os.path.join(SAMPLE_DIR, "test_sample_travis_log")
+SAMPLE_TRAVIS_TIME_TAGS = os.path.join(
+    SAMPLE_DIR, "test_sample_travis_time_tags"
+)
+
+
+def best_time(function, number=100, repeat=5):
+    """
+    Return the best time of executing a function, in seconds per call.
+
+    Parameters:
+    - function : function to be timed, called without arguments
+    - number : number of calls in each measurement
+    - repeat : number of measurements
+    """
+    timer = timeit.Timer(function)
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def print_comparison(title, reference_time, new_time):
+    """
+    Print timing of a reference and a new implementation.
+
+    Parameters:
+    - title : name of the benchmark
+    - reference_time : time of the reference implementation (seconds)
+    - new_time : time of the new implementation (seconds)
+    """
+    print(title)
+    print("  reference : {0:.3f} ms".format(reference_time * 1000))
+    print("  new       : {0:.3f} ms".format(new_time * 1000))
+    if new_time > 0:
+        print("  speedup   : {0:.2f}x".format(reference_time / new_time))
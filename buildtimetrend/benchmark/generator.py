@@ -0,0 +1,133 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Generate synthetic Travis CI job logs.
+
+The generated log consists of substages with Travis CI timing tags,
+separated by build output lines. Size, line length and
+the density of lines with tags are configurable.
+
+Usage : python -m buildtimetrend.benchmark.generator <logfile> [size in MB]
+
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+from __future__ import division
+import sys
+
+# timestamp of the first generated substage, nanoseconds since epoch
+START_TIMESTAMP_NANO = 1408282815329854910
+# duration of a generated substage, nanoseconds
+SUBSTAGE_DURATION_NANO = 1234567890
+WORKER_LINE = b'Using worker: worker-linux-1-1.bb.travis-ci.org:' \
+    b'travis-linux-1\r\n'
+START_TAGS = 'travis_fold:start:script.{substage:d}\r\x1b[0K' \
+    'travis_time:start:{substage:08x}\r\x1b[0K$ ./command_{substage:d}.sh\r\n'
+END_TAGS = 'travis_time:end:{substage:08x}:' \
+    'start={start:d},finish={finish:d},duration={duration:d}' \
+    '\r\x1b[0Ktravis_fold:end:script.{substage:d}' \
+    '\r\x1b[0K\r\n'
+
+
+def generate_output(line_count, line_length):
+    """
+    Return a block of build output lines.
+
+    Parameters:
+    - line_count : number of lines
+    - line_length : length of each line (bytes), including newline
+    """
+    text = b'compiling src/module.c -O2 -Wall -Wextra -o build/module.o '
+    text = text * (line_length // len(text) + 1)
+    line_length = max(line_length - 1, 0)
+
+    return b''.join(
+        ('[{0:d}] '.format(index).encode('ascii') + text)[:line_length] +
+        b'\n'
+        for index in range(line_count)
+    )
+
+
+def generate_log(stream, size, tag_density=0.01, line_length=80):
+    """
+    Write a synthetic Travis CI job log to a stream.
+
+    Returns the number of substages that were written.
+
+    Parameters:
+    - stream : stream the log is written to, in binary mode
+    - size : approximate size of the log, in bytes
+    - tag_density : fraction of lines with Travis CI tags (0 < x <= 1)
+    - line_length : length of build output lines, in bytes
+    """
+    if not 0 < tag_density <= 1:
+        raise ValueError("tag_density should be between 0 and 1")
+
+    # each substage has one start and one end line with tags
+    output = generate_output(
+        max(int(round(2 / tag_density)) - 2, 0), line_length
+    )
+
+    stream.write(WORKER_LINE)
+    written = len(WORKER_LINE)
+    substage = 0
+    timestamp = START_TIMESTAMP_NANO
+
+    while written < size:
+        substage += 1
+        start_tags = START_TAGS.format(substage=substage).encode('ascii')
+        end_tags = END_TAGS.format(
+            substage=substage,
+            start=timestamp,
+            finish=timestamp + SUBSTAGE_DURATION_NANO,
+            duration=SUBSTAGE_DURATION_NANO
+        ).encode('ascii')
+        stream.write(start_tags)
+        stream.write(output)
+        stream.write(end_tags)
+        written += len(start_tags) + len(output) + len(end_tags)
+        timestamp += SUBSTAGE_DURATION_NANO
+
+    return substage
+
+
+def generate_log_file(filename, size, tag_density=0.01, line_length=80):
+    """
+    Write a synthetic Travis CI job log file.
+
+    Returns the number of substages that were written.
+
+    Parameters:
+    - filename : name of the log file
+    - size : approximate size of the log, in bytes
+    - tag_density : fraction of lines with Travis CI tags (0 < x <= 1)
+    - line_length : length of build output lines, in bytes
+    """
+    with open(filename, 'wb') as log_file:
+        return generate_log(log_file, size, tag_density, line_length)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__.splitlines()[7])
+    else:
+        SIZE_MB = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+        print("{0:d} substages written".format(
+            generate_log_file(sys.argv[1], int(SIZE_MB * 1024 * 1024))
+        ))
@@ -0,0 +1,84 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmark reading Travis CI job logs.
+
+Compares decoding and checking each line of a job log
+with scanning the log as bytes for tag markers (iter_tagged_lines).
+
+Usage : python -m buildtimetrend.benchmark.job_log [logfile]
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+import io
+import sys
+from buildtimetrend.benchmark import SAMPLE_TRAVIS_LOG
+from buildtimetrend.benchmark import best_time
+from buildtimetrend.benchmark import print_comparison
+from buildtimetrend.travis.logreader import iter_tagged_lines
+
+
+def decode_tagged_lines(stream):
+    """
+    Decode each line of a stream and return the lines containing tags.
+
+    Reference implementation, as TravisData.parse_job_log_stream()
+    read job logs before iter_tagged_lines() was introduced.
+
+    Parameters:
+    - stream : job log stream
+    """
+    lines = []
+    for line in stream:
+        line = line.decode('utf-8')
+        if 'travis_' in line or 'Using worker:' in line:
+            lines.append(line)
+
+    return lines
+
+
+def run(filename=SAMPLE_TRAVIS_LOG):
+    """
+    Run benchmark.
+
+    Parameters:
+    - filename : Travis CI log file
+    """
+    with open(filename, 'rb') as log_file:
+        log_bytes = log_file.read()
+
+    def reference():
+        """Read log line by line."""
+        decode_tagged_lines(io.BytesIO(log_bytes))
+
+    def scanner():
+        """Scan log for markers."""
+        list(iter_tagged_lines(io.BytesIO(log_bytes)))
+
+    print_comparison(
+        "Read tagged lines of {0!s} ({1:d} bytes)".format(
+            filename, len(log_bytes)
+        ),
+        best_time(reference),
+        best_time(scanner)
+    )
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
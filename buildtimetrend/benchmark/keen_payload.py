@@ -0,0 +1,122 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmark adding project info to Keen.io event payloads.
+
+Compares add_project_info_list(), building shallow payloads that share
+the project info, with a deep copy of each payload and retrieving the
+project info for each event, on the stage events of a generated build job.
+
+Usage : python -m buildtimetrend.benchmark.keen_payload [number of events]
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+import sys
+import copy
+from buildtimetrend.benchmark import best_time
+from buildtimetrend.benchmark import print_comparison
+from buildtimetrend.buildjob import BuildJob
+from buildtimetrend.keenio import KEEN_PROJECT_INFO_NAME
+from buildtimetrend.keenio import add_project_info_list
+from buildtimetrend.settings import Settings
+from buildtimetrend.stages import Stage
+
+DEFAULT_EVENTS = 10000
+
+
+def deepcopy_project_info_dict(payload):
+    """
+    Add project info to a deep copy of a dictionary.
+
+    Reference implementation, as add_project_info_dict() added project info
+    before payloads were shallow copies sharing the project info.
+
+    Parameters:
+    - payload : dictionary payload
+    """
+    payload_as_dict = copy.deepcopy(payload)
+
+    payload_as_dict[KEEN_PROJECT_INFO_NAME] = Settings().get_project_info()
+
+    if "job" in payload:
+        if "repo" in payload["job"]:
+            payload_as_dict[KEEN_PROJECT_INFO_NAME]["project_name"] = \
+                payload["job"]["repo"]
+
+        if "finished_at" in payload["job"]:
+            payload_as_dict["keen"] = {
+                "timestamp": payload["job"]["finished_at"]["isotimestamp"]
+            }
+
+    return payload_as_dict
+
+
+def create_stage_events(count=DEFAULT_EVENTS):
+    """
+    Return list of stage events of a build job.
+
+    Parameters:
+    - count : number of stages
+    """
+    buildjob = BuildJob()
+    buildjob.add_property("build", "123")
+    buildjob.add_property("job", "123.1")
+    buildjob.add_property("repo", "buildtimetrend/python-lib")
+    buildjob.set_started_at("2014-07-08T11:18:13Z")
+    buildjob.set_finished_at("2014-07-08T11:38:13Z")
+
+    for index in range(count):
+        stage = Stage()
+        stage.set_name("stage{0:d}".format(index))
+        stage.set_started_at(1404818293 + index)
+        stage.set_finished_at(1404818294 + index)
+        stage.set_command("command {0:d}".format(index))
+        buildjob.stages.add_stage(stage)
+
+    return buildjob.stages_to_list()
+
+
+def run(count=DEFAULT_EVENTS):
+    """
+    Run benchmark.
+
+    Parameters:
+    - count : number of events
+    """
+    count = int(count)
+    events = create_stage_events(count)
+
+    def reference():
+        """Add project info to deep copies of the events."""
+        for event in events:
+            deepcopy_project_info_dict(event)
+
+    def shallow():
+        """Add shared project info to shallow copies of the events."""
+        add_project_info_list(events)
+
+    print_comparison(
+        "Add project info to {0:d} stage events".format(count),
+        best_time(reference, 1, 3),
+        best_time(shallow, 1, 3)
+    )
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
@@ -0,0 +1,120 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmark parsing large Travis CI job log files.
+
+A synthetic log file is generated and parsed with
+TravisData.parse_job_log_file(), by reading the file as a stream and
+by memory mapping it. Each parse runs in a separate process
+to measure its peak resident memory.
+
+Usage : python -m buildtimetrend.benchmark.log_file [size in MB]
+
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+from __future__ import division
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+from buildtimetrend.benchmark.generator import generate_log_file
+from buildtimetrend.travis.parser import TravisData
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def get_peak_rss():
+    """Return peak resident memory of the current process, in MB."""
+    if resource is None:
+        return float('nan')
+
+    # ru_maxrss is expressed in kilobytes on Linux, in bytes on OS X
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss /= 1024
+
+    return peak_rss / 1024
+
+
+def parse_log_file(filename, use_mmap):
+    """
+    Parse a Travis CI log file.
+
+    Returns a tuple : (duration (s), number of stages, peak RSS (MB))
+
+    Parameters:
+    - filename : Travis CI log file
+    - use_mmap : memory map the log file
+    """
+    travis_data = TravisData("buildtimetrend/benchmark", 1)
+    # enable parsing timing tags
+    travis_data.current_job.set_started_at("2014-08-17T13:40:14Z")
+
+    start = time.time()
+    travis_data.parse_job_log_file(filename, use_mmap)
+    duration = time.time() - start
+
+    return (
+        duration,
+        len(travis_data.current_job.stages),
+        get_peak_rss()
+    )
+
+
+def run(size_mb=100):
+    """
+    Run benchmark.
+
+    Parameters:
+    - size_mb : size of generated log file in MB
+    """
+    log_file = tempfile.NamedTemporaryFile(suffix='.log', delete=False)
+    log_file.close()
+
+    try:
+        generate_log_file(log_file.name, int(float(size_mb) * 1024 * 1024))
+        size = os.path.getsize(log_file.name) / 1024 / 1024
+        print("Parse generated log file ({0:.1f} MB)".format(size))
+
+        for use_mmap in (False, True):
+            # use a new process for each run, to measure peak memory
+            pool = multiprocessing.Pool(1)
+            duration, stages, peak_rss = pool.apply(
+                parse_log_file, (log_file.name, use_mmap)
+            )
+            pool.close()
+            pool.join()
+
+            print(
+                "  {0!s:6} : {1:.1f} MB/s, {2:d} stages, "
+                "peak RSS {3:.1f} MB".format(
+                    "mmap" if use_mmap else "stream",
+                    size / duration, stages, peak_rss
+                )
+            )
+    finally:
+        os.remove(log_file.name)
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
@@ -0,0 +1,153 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmark serializing build jobs with thousands of stages.
+
+Compares BuildJob.stages_to_list(), sharing the build properties snapshot
+and the stage dictionaries, with a deep copy of the build properties
+and of each stage dictionary. Each is run in a separate process
+to measure the increase of peak resident memory.
+
+Usage : python -m buildtimetrend.benchmark.serialize [number of stages]
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+import sys
+import copy
+import multiprocessing
+from buildtimetrend import logger
+from buildtimetrend.buildjob import BuildJob
+from buildtimetrend.benchmark import best_time
+from buildtimetrend.benchmark import print_comparison
+from buildtimetrend.benchmark.log_file import get_peak_rss
+from buildtimetrend.benchmark.stages import create_stage
+
+DEFAULT_STAGES = 5000
+
+
+def deepcopy_stages_to_list(buildjob):
+    """
+    Return list of stages, all containing a deep copy of the build properties.
+
+    Reference implementation, as BuildJob.stages_to_list() created
+    the list before properties were shared using a collection snapshot.
+
+    Parameters:
+    - buildjob : BuildJob instance
+    """
+    data = []
+
+    build_properties = copy.deepcopy(buildjob.properties.items)
+    if "duration" not in build_properties:
+        build_properties["duration"] = buildjob.stages.total_duration()
+    if buildjob.stages.started_at is not None and \
+            "started_at" not in build_properties:
+        build_properties["started_at"] = buildjob.stages.started_at
+    if buildjob.stages.finished_at is not None and \
+            "finished_at" not in build_properties:
+        build_properties["finished_at"] = buildjob.stages.finished_at
+
+    for stage in buildjob.stages.stages:
+        temp = {"stage": copy.deepcopy(stage)}
+        if build_properties:
+            temp["job"] = build_properties
+        data.append(temp)
+
+    return data
+
+
+def create_buildjob(count=DEFAULT_STAGES):
+    """
+    Return a build job with properties and stages.
+
+    Parameters:
+    - count : number of stages
+    """
+    buildjob = BuildJob()
+    buildjob.add_property("build", "123")
+    buildjob.add_property("job", "123.1")
+    buildjob.add_property("repo", "buildtimetrend/python-lib")
+    buildjob.add_property("branch", "master")
+    buildjob.add_property("build_matrix", {
+        "language": "python", "python": "2.7", "summary": "python 2.7"
+    })
+    buildjob.set_started_at("2014-07-08T11:18:13Z")
+    buildjob.set_finished_at("2014-07-08T11:38:13Z")
+
+    for index in range(count):
+        buildjob.add_stage(create_stage(index))
+
+    return buildjob
+
+
+def serialize_stages(count, use_reference):
+    """
+    Serialize stages of a build job, return increase of peak memory (MB).
+
+    Parameters:
+    - count : number of stages
+    - use_reference : use reference implementation (deep copies)
+    """
+    logger.setLevel("WARNING")
+    buildjob = create_buildjob(count)
+    start_rss = get_peak_rss()
+
+    if use_reference:
+        stages = deepcopy_stages_to_list(buildjob)
+    else:
+        stages = buildjob.stages_to_list()
+
+    memory = get_peak_rss() - start_rss
+    del stages
+    return memory
+
+
+def run(count=DEFAULT_STAGES):
+    """
+    Run benchmark.
+
+    Parameters:
+    - count : number of stages
+    """
+    count = int(count)
+    print("Memory usage of serializing {0:d} stages".format(count))
+
+    for use_reference in (True, False):
+        # use a new process for each run, to measure peak memory
+        pool = multiprocessing.Pool(1)
+        memory = pool.apply(serialize_stages, (count, use_reference))
+        pool.close()
+        pool.join()
+
+        print("  {0!s:9} : {1:.1f} MB".format(
+            "reference" if use_reference else "new", memory
+        ))
+
+    logger.setLevel("WARNING")
+    buildjob = create_buildjob(count)
+
+    print_comparison(
+        "Serialize {0:d} stages (stages_to_list)".format(count),
+        best_time(lambda: deepcopy_stages_to_list(buildjob), 1, 3),
+        best_time(buildjob.stages_to_list, 1, 3)
+    )
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
@@ -0,0 +1,125 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmark splitting datetime timestamps.
+
+Compares tools.split_datetime(), deriving the fields from the datetime
+attributes and caching them per second, with a strftime() call
+for each field, on timestamps of consecutive stages (neighbouring
+stages often share seconds).
+
+Usage : python -m buildtimetrend.benchmark.split_datetime [timestamps]
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+import sys
+from datetime import datetime
+from datetime import timedelta
+from dateutil.tz import tzutc
+from buildtimetrend.benchmark import best_time
+from buildtimetrend.benchmark import print_comparison
+from buildtimetrend.tools import split_datetime
+
+
+def split_datetime_strftime(timestamp_datetime):
+    """
+    Split a datetime timestamp with strftime().
+
+    Reference implementation, as tools.split_datetime() split timestamps
+    before the fields were derived from the datetime attributes.
+
+    Parameters :
+    - timestamp_datetime : timestamp in datetime class format
+    """
+    timestamp_dict = {}
+    timestamp_dict["isotimestamp"] = timestamp_datetime.isoformat()
+
+    epoch = datetime.utcfromtimestamp(0)
+    if timestamp_datetime.tzname() is not None:
+        epoch = datetime.utcfromtimestamp(0).replace(tzinfo=tzutc())
+
+    timestamp_dict["timestamp_seconds"] = \
+        (timestamp_datetime - epoch).total_seconds()
+
+    formats = {
+        "year": "%Y",
+        "month": "%m",
+        "month_short_en": "%b",
+        "month_full_en": "%B",
+        "day_of_month": "%d",
+        "day_of_week": "%w",
+        "day_of_week_short_en": "%a",
+        "day_of_week_full_en": "%A",
+        "hour_12": "%I",
+        "hour_ampm": "%p",
+        "hour_24": "%H",
+        "minute": "%M",
+        "second": "%S",
+        "microsecond": "%f",
+        "timezone": "%Z",
+        "timezone_offset": "%z"
+    }
+    for key, date_format in formats.items():
+        timestamp_dict[key] = timestamp_datetime.strftime(date_format)
+
+    return timestamp_dict
+
+
+def create_timestamps(count=300):
+    """
+    Return list of timestamps of consecutive stages.
+
+    Parameters:
+    - count : number of timestamps
+    """
+    started_at = datetime(2014, 8, 17, 13, 40, 14, tzinfo=tzutc())
+    return [
+        started_at + timedelta(microseconds=index * 300000)
+        for index in range(count)
+    ]
+
+
+def run(count=300):
+    """
+    Run benchmark.
+
+    Parameters:
+    - count : number of timestamps
+    """
+    timestamps = create_timestamps(int(count))
+
+    def reference():
+        """Split timestamps with strftime()."""
+        for timestamp in timestamps:
+            split_datetime_strftime(timestamp)
+
+    def split():
+        """Split timestamps with split_datetime()."""
+        for timestamp in timestamps:
+            split_datetime(timestamp)
+
+    print_comparison(
+        "Split {0:d} datetime timestamps".format(len(timestamps)),
+        best_time(reference, 10),
+        best_time(split, 10)
+    )
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
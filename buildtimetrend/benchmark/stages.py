@@ -0,0 +1,143 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmark memory usage and aggregation of stages.
+
+Stages are stored as compact Stage instances, the previous design stored
+a dictionary per stage, with split started_at and finished_at timestamps.
+Both are created in a separate process to measure peak resident memory.
+Aggregating stages (total duration, duration by name) is compared
+with ColumnarStages.
+
+Usage : python -m buildtimetrend.benchmark.stages [number of stages]
+
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+from __future__ import division
+import sys
+import multiprocessing
+from buildtimetrend import logger
+from buildtimetrend.stages import Stage
+from buildtimetrend.stages import Stages
+from buildtimetrend.stages import ColumnarStages
+from buildtimetrend.benchmark import best_time
+from buildtimetrend.benchmark import print_comparison
+from buildtimetrend.benchmark.log_file import get_peak_rss
+
+# start of the first generated stage, seconds since epoch
+STAGES_STARTED_AT = 1408282815.329854
+
+
+def create_stage(index):
+    """
+    Create a stage.
+
+    Parameters:
+    - index : stage index
+    """
+    stage = Stage()
+    stage.set_name("stage.{0:d}".format(index % 50))
+    stage.set_command("command{0:d}.sh".format(index))
+    stage.set_started_at(STAGES_STARTED_AT + index)
+    stage.set_finished_at(STAGES_STARTED_AT + index + 0.5)
+    stage.set_duration(0.5)
+    return stage
+
+
+def get_duration_by_name(stages):
+    """
+    Return dictionary with total duration of stages by name.
+
+    Parameters:
+    - stages : Stages instance
+    """
+    durations = {}
+    for stage in stages.stage_list:
+        durations[stage.name] = durations.get(stage.name, 0) + stage.duration
+
+    return durations
+
+
+def create_stages(count, as_dict):
+    """
+    Create stages, return increase of peak resident memory (MB).
+
+    Parameters:
+    - count : number of stages
+    - as_dict : store stages as dictionaries (previous design)
+    """
+    logger.setLevel("WARNING")
+    start_rss = get_peak_rss()
+
+    stages = Stages()
+    stage_dicts = []
+    for index in range(count):
+        stage = create_stage(index)
+
+        if as_dict:
+            stage_dicts.append(stage.to_dict())
+        else:
+            stages.add_stage(stage)
+
+    return get_peak_rss() - start_rss
+
+
+def run(count=100000):
+    """
+    Run benchmark.
+
+    Parameters:
+    - count : number of stages
+    """
+    count = int(count)
+    print("Memory usage of {0:d} stages".format(count))
+
+    for as_dict in (True, False):
+        # use a new process for each run, to measure peak memory
+        pool = multiprocessing.Pool(1)
+        memory = pool.apply(create_stages, (count, as_dict))
+        pool.close()
+        pool.join()
+
+        print("  {0!s:8} : {1:.1f} MB ({2:.0f} bytes/stage)".format(
+            "dict" if as_dict else "compact",
+            memory, memory * 1024 * 1024 / count
+        ))
+
+    logger.setLevel("WARNING")
+    stages = Stages()
+    for index in range(count):
+        stages.add_stage(create_stage(index))
+    columnar_stages = ColumnarStages.from_stages(stages)
+
+    print_comparison(
+        "Total duration of {0:d} stages".format(count),
+        best_time(stages.total_duration, 1),
+        best_time(columnar_stages.total_duration, 1)
+    )
+    print_comparison(
+        "Duration by name of {0:d} stages".format(count),
+        best_time(lambda: get_duration_by_name(stages), 1),
+        best_time(columnar_stages.get_duration_by_name, 1)
+    )
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
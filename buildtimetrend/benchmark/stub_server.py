@@ -0,0 +1,186 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Local stub of the Travis CI API, serving synthetic builds, jobs and logs.
+
+The stub is an asyncio HTTP server, listening on localhost,
+so connectors can be tested and benchmarked without network access.
+This module requires Python 3.5 or later.
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+import asyncio
+import io
+import json
+import re
+from buildtimetrend.benchmark.generator import generate_log
+
+STUB_REPO = "buildtimetrend/stub"
+# paths of the stub Travis CI API
+STUB_BUILDS_PATH = re.compile(r'^/repos/[^/]+/[^/]+/builds\?number=(\d+)$')
+STUB_JOB_PATH = re.compile(r'^/jobs/(\d+)$')
+STUB_JOB_LOG_PATH = re.compile(r'^/jobs/(\d+)/log$')
+STUB_LOG_PATH = re.compile(r'^/logs/(\d+)$')
+HTTP_REASONS = {200: "OK", 307: "Temporary Redirect", 404: "Not Found"}
+
+
+class StubTravisServer(object):
+
+    """
+    Stub Travis CI API server.
+
+    Each build has jobs_per_build jobs, job IDs are derived from the
+    build number. Job log requests are redirected, like the Travis CI API
+    redirects to the log storage.
+    """
+
+    def __init__(self, jobs_per_build=2, delay=0, log_size=64 * 1024):
+        """
+        Constructor.
+
+        Parameters:
+        - jobs_per_build : number of jobs of each build
+        - delay : time before a response is sent, in seconds
+        - log_size : size of the job log, in bytes
+        """
+        self.jobs_per_build = jobs_per_build
+        self.delay = delay
+        log_stream = io.BytesIO()
+        self.substages = generate_log(log_stream, log_size)
+        self.log = log_stream.getvalue()
+        self.server = None
+        self.port = None
+        # request statistics
+        self.requests = 0
+        self.active_requests = 0
+        self.max_active_requests = 0
+
+    @property
+    def url(self):
+        """URL of the stub Travis CI API."""
+        return 'http://127.0.0.1:{:d}/'.format(self.port)
+
+    async def start(self):
+        """Start listening on a free port on localhost."""
+        self.server = await asyncio.start_server(
+            self._handle_connection, '127.0.0.1', 0
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stop the server."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def get_job_ids(self, build_number):
+        """
+        Return job IDs of a build.
+
+        Parameters:
+        - build_number : number of the build
+        """
+        return [
+            build_number * 1000 + job
+            for job in range(1, self.jobs_per_build + 1)
+        ]
+
+    def get_response(self, path):
+        """
+        Return a response to a request.
+
+        Returns a tuple (status, headers, body).
+
+        Parameters:
+        - path : path of the requested url
+        """
+        match = STUB_BUILDS_PATH.match(path)
+        if match:
+            build_number = int(match.group(1))
+            return 200, {}, json.dumps({
+                "builds": [{
+                    "id": build_number,
+                    "number": str(build_number),
+                    "event_type": "push",
+                    "job_ids": self.get_job_ids(build_number),
+                    "config": {"script": ["./command_1.sh"]}
+                }],
+                "commits": []
+            }).encode('utf-8')
+
+        match = STUB_JOB_PATH.match(path)
+        if match:
+            job_id = int(match.group(1))
+            return 200, {}, json.dumps({
+                "job": {
+                    "id": job_id,
+                    "number": "{:d}.{:d}".format(
+                        job_id // 1000, job_id % 1000
+                    ),
+                    "repository_slug": STUB_REPO,
+                    "state": "passed",
+                    "started_at": "2014-08-17T13:40:14Z",
+                    "finished_at": "2014-08-17T13:45:14Z",
+                    "config": {"language": "python", "python": "3.5"}
+                },
+                "commit": {"branch": "master"}
+            }).encode('utf-8')
+
+        match = STUB_JOB_LOG_PATH.match(path)
+        if match:
+            return 307, {"location": "/logs/" + match.group(1)}, b''
+
+        if STUB_LOG_PATH.match(path):
+            return 200, {}, self.log
+
+        return 404, {}, b'Not Found'
+
+    async def _handle_connection(self, reader, writer):
+        """Read a request and send the response."""
+        self.requests += 1
+        self.active_requests += 1
+        self.max_active_requests = max(
+            self.max_active_requests, self.active_requests
+        )
+
+        try:
+            request_head = await reader.readuntil(b'\r\n\r\n')
+            path = request_head.split(b' ', 2)[1].decode('latin-1')
+
+            if self.delay:
+                await asyncio.sleep(self.delay)
+
+            status, headers, body = self.get_response(path)
+            headers["content-length"] = len(body)
+            response_lines = [
+                'HTTP/1.0 {:d} {}'.format(status, HTTP_REASONS[status])
+            ]
+            for name, value in headers.items():
+                response_lines.append('{}: {}'.format(name, value))
+
+            writer.write(
+                ('\r\n'.join(response_lines) + '\r\n\r\n').encode('latin-1')
+            )
+            writer.write(body)
+            await writer.drain()
+        except (OSError, IndexError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.active_requests -= 1
+            writer.close()
@@ -0,0 +1,431 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmark suite of the Travis CI log parser and timestamp functions.
+
+A synthetic log file is generated (see benchmark.generator) and used by :
+- parse_job_log_stream : TravisData.parse_job_log_stream()
+- travis_substage : scanning tagged lines and processing them
+                    with TravisSubstage
+- parse_timestamps : Stages.parse_timestamps()
+- split_timestamp : tools.split_timestamp()
+Each benchmark runs in a separate process, to measure its peak resident
+memory. Throughput is reported in MB/s and lines/s (timestamps/s for
+the timestamp benchmarks). Results can be saved as JSON, and compared
+with the results of a previous run, to detect regressions.
+
+Usage : python -m buildtimetrend.benchmark.suite -h -s <size in MB>
+        -d <tag density> -l <line length> -n <timestamps> -r <repeat>
+        -o <results file> -c <reference results file>
+
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+from __future__ import division
+import os
+import sys
+import json
+import time
+import getopt
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from collections import OrderedDict
+import buildtimetrend
+from buildtimetrend import tools
+from buildtimetrend.stages import Stages
+from buildtimetrend.benchmark.generator import START_TIMESTAMP_NANO
+from buildtimetrend.benchmark.generator import generate_log_file
+from buildtimetrend.benchmark.log_file import get_peak_rss
+from buildtimetrend.travis.parser import TravisData
+from buildtimetrend.travis.parser import scan_travis_time_tags
+from buildtimetrend.travis.substage import TravisSubstage
+from buildtimetrend.travis.logreader import iter_tagged_lines
+
+# default size of the generated log, in MB
+DEFAULT_SIZE_MB = 20
+# default number of timestamps of the timestamp benchmarks
+DEFAULT_TIMESTAMP_COUNT = 100000
+# default number of runs of each benchmark, the best run is reported
+DEFAULT_REPEAT = 3
+# relative decrease of throughput that is reported as a regression
+REGRESSION_THRESHOLD = 0.1
+# interval between generated timestamps, in seconds
+TIMESTAMP_INTERVAL = 1.234567
+
+
+def get_timestamps(count):
+    """
+    Return a list of timestamps, seconds since epoch.
+
+    Parameters:
+    - count : number of timestamps
+    """
+    start = START_TIMESTAMP_NANO / 1e9
+    return [start + index * TIMESTAMP_INTERVAL for index in range(count)]
+
+
+def benchmark_parse_job_log_stream(filename, count):
+    """
+    Parse a job log file with TravisData.parse_job_log_stream().
+
+    Returns a tuple : (duration (s), number of bytes, number of lines)
+
+    Parameters:
+    - filename : Travis CI log file
+    - count : number of timestamps (not used)
+    """
+    travis_data = TravisData("buildtimetrend/benchmark", 1)
+    # enable parsing timing tags
+    travis_data.current_job.set_started_at("2014-08-17T13:40:14Z")
+
+    with open(filename, 'rb') as log_file:
+        start = time.time()
+        travis_data.parse_job_log_stream(log_file)
+        duration = time.time() - start
+
+    with open(filename, 'rb') as log_file:
+        lines = sum(chunk.count(b'\n') for chunk in iter(
+            lambda: log_file.read(1024 * 1024), b''
+        ))
+
+    return duration, os.path.getsize(filename), lines
+
+
+def benchmark_travis_substage(filename, count):
+    """
+    Process the lines with Travis CI tags of a job log with TravisSubstage.
+
+    Returns a tuple : (duration (s), number of bytes, number of lines)
+
+    Parameters:
+    - filename : Travis CI log file
+    - count : number of timestamps (not used)
+    """
+    with open(filename, 'rb') as log_file:
+        lines = list(iter_tagged_lines(log_file))
+
+    start = time.time()
+    substage = TravisSubstage()
+    for line in lines:
+        for tag_type, tags_dict in scan_travis_time_tags(line):
+            substage.process_parsed_tags(tags_dict, tag_type)
+            if substage.has_finished():
+                substage = TravisSubstage()
+    duration = time.time() - start
+
+    return (
+        duration,
+        sum(len(line.encode('utf-8')) for line in lines),
+        len(lines)
+    )
+
+
+def benchmark_parse_timestamps(filename, count):
+    """
+    Calculate stage durations with Stages.parse_timestamps().
+
+    Returns a tuple : (duration (s), number of bytes, number of timestamps),
+    the number of bytes is the size of the timestamps in CSV format.
+
+    Parameters:
+    - filename : Travis CI log file (not used)
+    - count : number of timestamps
+    """
+    rows = [
+        ("stage{0:d}".format(index), repr(timestamp))
+        for index, timestamp in enumerate(get_timestamps(count))
+    ]
+    rows.append(("end", repr(get_timestamps(count + 1)[-1])))
+
+    stages = Stages()
+    start = time.time()
+    stages.parse_timestamps(rows)
+    duration = time.time() - start
+
+    return (
+        duration,
+        sum(len(name) + len(timestamp) + 2 for name, timestamp in rows),
+        len(rows)
+    )
+
+
+def benchmark_split_timestamp(filename, count):
+    """
+    Split timestamps in components with tools.split_timestamp().
+
+    Returns a tuple : (duration (s), number of bytes, number of timestamps),
+    the number of bytes is not applicable (None).
+
+    Parameters:
+    - filename : Travis CI log file (not used)
+    - count : number of timestamps
+    """
+    timestamps = get_timestamps(count)
+    tools.SPLIT_DATETIME_CACHE.clear()
+
+    start = time.time()
+    for timestamp in timestamps:
+        tools.split_timestamp(timestamp)
+    duration = time.time() - start
+
+    return duration, None, len(timestamps)
+
+
+BENCHMARKS = OrderedDict([
+    ("parse_job_log_stream", benchmark_parse_job_log_stream),
+    ("travis_substage", benchmark_travis_substage),
+    ("parse_timestamps", benchmark_parse_timestamps),
+    ("split_timestamp", benchmark_split_timestamp)
+])
+
+
+def run_benchmark(name, filename, count, repeat=DEFAULT_REPEAT):
+    """
+    Run a benchmark several times, return a dictionary with the best result.
+
+    - duration : duration of the fastest run, in seconds
+    - bytes : number of processed bytes (None if not applicable)
+    - lines : number of processed lines (or timestamps)
+    - mb_per_s : throughput in MB/s (None if not applicable)
+    - lines_per_s : throughput in lines (or timestamps) per second
+    - peak_rss_mb : peak resident memory of the process, in MB
+
+    Parameters:
+    - name : name of the benchmark, key of BENCHMARKS
+    - filename : Travis CI log file
+    - count : number of timestamps
+    - repeat : number of runs
+    """
+    duration = None
+    for _ in range(max(repeat, 1)):
+        run_duration, size, lines = BENCHMARKS[name](filename, count)
+        if duration is None or run_duration < duration:
+            duration = run_duration
+
+    # avoid dividing by zero, if timer resolution is too low
+    duration = max(duration, 1e-9)
+
+    return {
+        "duration": duration,
+        "bytes": size,
+        "lines": lines,
+        "mb_per_s": None if size is None else size / 1024 / 1024 / duration,
+        "lines_per_s": lines / duration,
+        "peak_rss_mb": get_peak_rss()
+    }
+
+
+def get_commit():
+    """Return hash of the git commit of the source, None if unknown."""
+    try:
+        with open(os.devnull, 'w') as devnull:
+            commit = subprocess.check_output(
+                ["git", "rev-parse", "HEAD"],
+                cwd=os.path.dirname(os.path.realpath(__file__)),
+                stderr=devnull
+            )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return commit.decode('ascii').strip()
+
+
+def run(size_mb=DEFAULT_SIZE_MB, tag_density=0.01, line_length=80,
+        count=DEFAULT_TIMESTAMP_COUNT, repeat=DEFAULT_REPEAT,
+        benchmarks=None):
+    """
+    Run benchmarks, each in a separate process.
+
+    Returns a dictionary with the parameters, environment
+    and the results of each benchmark (see run_benchmark()).
+
+    Parameters:
+    - size_mb : size of generated log file in MB
+    - tag_density : fraction of lines with Travis CI tags (0 < x <= 1)
+    - line_length : length of build output lines, in bytes
+    - count : number of timestamps of the timestamp benchmarks
+    - repeat : number of runs of each benchmark
+    - benchmarks : list of benchmark names, defaults to all benchmarks
+    """
+    if benchmarks is None:
+        benchmarks = list(BENCHMARKS.keys())
+
+    results = {
+        "version": buildtimetrend.VERSION,
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": tools.format_timestamp(time.time()),
+        "parameters": {
+            "size_mb": size_mb,
+            "tag_density": tag_density,
+            "line_length": line_length,
+            "count": count,
+            "repeat": repeat
+        },
+        "benchmarks": {}
+    }
+
+    log_file = tempfile.NamedTemporaryFile(suffix='.log', delete=False)
+    log_file.close()
+
+    try:
+        generate_log_file(
+            log_file.name, int(float(size_mb) * 1024 * 1024),
+            tag_density, line_length
+        )
+
+        for name in benchmarks:
+            # use a new process for each benchmark, to measure peak memory
+            pool = multiprocessing.Pool(1)
+            try:
+                results["benchmarks"][name] = pool.apply(
+                    run_benchmark, (name, log_file.name, count, repeat)
+                )
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+    finally:
+        os.remove(log_file.name)
+
+    return results
+
+
+def print_results(results):
+    """
+    Print benchmark results.
+
+    Parameters:
+    - results : dictionary with benchmark results, see run()
+    """
+    for name in BENCHMARKS:
+        if name not in results["benchmarks"]:
+            continue
+
+        result = results["benchmarks"][name]
+        mb_per_s = "-" if result["mb_per_s"] is None else \
+            "{0:.1f} MB/s".format(result["mb_per_s"])
+        print(
+            "{0!s:20} : {1:>11s}, {2:>12.0f} lines/s, "
+            "peak RSS {3:.1f} MB".format(
+                name, mb_per_s, result["lines_per_s"], result["peak_rss_mb"]
+            )
+        )
+
+
+def compare_results(reference, results, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare benchmark results with reference results.
+
+    Returns a list of regressions : tuples (benchmark name,
+    reference lines/s, lines/s), of benchmarks with a throughput
+    (lines/s) that decreased more than threshold.
+
+    Parameters:
+    - reference : dictionary with reference results, see run()
+    - results : dictionary with benchmark results, see run()
+    - threshold : relative decrease of throughput reported as a regression
+    """
+    regressions = []
+
+    for name in BENCHMARKS:
+        if name not in reference["benchmarks"] or \
+                name not in results["benchmarks"]:
+            continue
+
+        reference_speed = reference["benchmarks"][name]["lines_per_s"]
+        speed = results["benchmarks"][name]["lines_per_s"]
+        if speed < reference_speed * (1 - threshold):
+            regressions.append((name, reference_speed, speed))
+
+    return regressions
+
+
+def main(argv):
+    """
+    Run benchmarks with command line arguments.
+
+    Returns exit code : 1 if a regression was found, 0 otherwise.
+
+    Parameters:
+    - argv : command line arguments
+    """
+    usage_string = "{0!s} -h -s <size in MB> -d <tag density> " \
+        "-l <line length> -n <timestamps> -r <repeat> " \
+        "-o <results file> -c <reference results file>".format(argv[0])
+
+    try:
+        opts, _ = getopt.getopt(
+            argv[1:], "hs:d:l:n:r:o:c:",
+            ["help", "size=", "density=", "line-length=", "timestamps=",
+             "repeat=", "output=", "compare="]
+        )
+    except getopt.GetoptError:
+        print(usage_string)
+        return 1
+
+    params = {}
+    output_file = None
+    reference_file = None
+    for opt, arg in opts:
+        if opt in ('-h', "--help"):
+            print(usage_string)
+            return 0
+        elif opt in ('-s', "--size"):
+            params["size_mb"] = float(arg)
+        elif opt in ('-d', "--density"):
+            params["tag_density"] = float(arg)
+        elif opt in ('-l', "--line-length"):
+            params["line_length"] = int(arg)
+        elif opt in ('-n', "--timestamps"):
+            params["count"] = int(arg)
+        elif opt in ('-r', "--repeat"):
+            params["repeat"] = int(arg)
+        elif opt in ('-o', "--output"):
+            output_file = arg
+        elif opt in ('-c', "--compare"):
+            reference_file = arg
+
+    results = run(**params)
+    print_results(results)
+
+    if output_file is not None:
+        with open(output_file, 'w') as json_file:
+            json.dump(results, json_file, sort_keys=True, indent=2)
+
+    if reference_file is None:
+        return 0
+
+    with open(reference_file, 'r') as json_file:
+        reference = json.load(json_file)
+
+    regressions = compare_results(reference, results)
+    for name, reference_speed, speed in regressions:
+        print("Regression in {0!s} : {1:.0f} -> {2:.0f} lines/s".format(
+            name, reference_speed, speed
+        ))
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
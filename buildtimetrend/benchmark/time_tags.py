@@ -0,0 +1,104 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmark parsing of Travis CI timing tags.
+
+Compares the single pass tokenizer (scan_travis_time_tags) with
+searching each regular expression in TRAVIS_LOG_PARSE_TIMING_STRINGS
+separately, on the lines with timing tags of a sample Travis CI log file.
+
+Usage : python -m buildtimetrend.benchmark.time_tags [logfile]
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+import re
+import sys
+from buildtimetrend import logger
+from buildtimetrend.benchmark import SAMPLE_TRAVIS_LOG
+from buildtimetrend.benchmark import best_time
+from buildtimetrend.benchmark import print_comparison
+from buildtimetrend.travis.parser import TRAVIS_LOG_PARSE_TIMING_STRINGS
+from buildtimetrend.travis.parser import scan_travis_time_tags
+
+
+def search_travis_time_tags(line):
+    """
+    Search timing tags, one regular expression at a time.
+
+    Reference implementation, as TravisData.parse_travis_time_tag()
+    parsed timing tags before the single pass tokenizer was introduced.
+
+    Parameters:
+    - line : line from logfile containing Travis CI tags
+    """
+    escaped_line = line.replace('\x0d', '*').replace('\x1b', 'ESC')
+    logger.debug('line : %s', escaped_line)
+
+    tags = []
+    for parse_string in TRAVIS_LOG_PARSE_TIMING_STRINGS:
+        result = re.search(parse_string, line)
+        if result:
+            tags.append(result.groupdict())
+
+    return tags
+
+
+def read_tag_lines(filename):
+    """
+    Return all lines with Travis CI tags of a log file.
+
+    Parameters:
+    - filename : Travis CI log file
+    """
+    with open(filename, 'rb') as log_file:
+        lines = [line.decode('utf-8') for line in log_file]
+
+    return [line for line in lines if 'travis_' in line]
+
+
+def run(filename=SAMPLE_TRAVIS_LOG):
+    """
+    Run benchmark.
+
+    Parameters:
+    - filename : Travis CI log file
+    """
+    lines = read_tag_lines(filename)
+
+    def reference():
+        """Parse lines with reference implementation."""
+        for line in lines:
+            search_travis_time_tags(line)
+
+    def tokenizer():
+        """Parse lines with single pass tokenizer."""
+        for line in lines:
+            scan_travis_time_tags(line)
+
+    print_comparison(
+        "Parse {0:d} lines with timing tags of {1!s}".format(
+            len(lines), filename
+        ),
+        best_time(reference),
+        best_time(tokenizer)
+    )
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
@@ -0,0 +1,131 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmark processing Travis CI substage timing in nanoseconds.
+
+The timestamps and duration of each travis_time:end tag of a log file
+are set on a Stage instance, as TravisSubstage.process_end_time() does.
+Splitting the timestamps when the stage is converted to a dictionary
+is timed separately.
+The reference implementation converts nanoseconds to Decimal seconds,
+changing the decimal context of the thread, as nano2sec() did before
+nanoseconds were processed as integers.
+
+Usage : python -m buildtimetrend.benchmark.timing [log file]
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+import sys
+from decimal import Decimal
+from decimal import getcontext
+from buildtimetrend import logger
+from buildtimetrend.benchmark import SAMPLE_TRAVIS_TIME_TAGS
+from buildtimetrend.benchmark import best_time
+from buildtimetrend.benchmark import print_comparison
+from buildtimetrend.benchmark.time_tags import read_tag_lines
+from buildtimetrend.stages import Stage
+from buildtimetrend.travis.parser import scan_travis_time_tags
+
+
+def nano2sec_decimal(time):
+    """
+    Convert time from nanoseconds to Decimal seconds.
+
+    Reference implementation, as nano2sec() converted time before.
+
+    Parameters:
+    - time : time in nanoseconds
+    """
+    getcontext().prec = 20
+    return Decimal(int(time)) / Decimal(1000000000)
+
+
+def set_timing_decimal(tags_dict):
+    """
+    Set substage timing in Decimal seconds, return Stage instance.
+
+    Parameters:
+    - tags_dict : parsed travis_time:end tags
+    """
+    stage = Stage()
+    stage.set_started_at(nano2sec_decimal(tags_dict['start_timestamp']))
+    stage.set_finished_at(nano2sec_decimal(tags_dict['finish_timestamp']))
+    stage.set_duration(nano2sec_decimal(tags_dict['duration']))
+    return stage
+
+
+def set_timing_nano(tags_dict):
+    """
+    Set substage timing in integer nanoseconds, return Stage instance.
+
+    Parameters:
+    - tags_dict : parsed travis_time:end tags
+    """
+    stage = Stage()
+    stage.set_started_at_nano(tags_dict['start_timestamp'])
+    stage.set_finished_at_nano(tags_dict['finish_timestamp'])
+    stage.set_duration_nano(tags_dict['duration'])
+    return stage
+
+
+def run(filename=SAMPLE_TRAVIS_TIME_TAGS):
+    """
+    Run benchmark.
+
+    Parameters:
+    - filename : Travis CI log file
+    """
+    logger.setLevel("WARNING")
+
+    end_tags = [
+        tags_dict
+        for line in read_tag_lines(filename)
+        for tag, tags_dict in scan_travis_time_tags(line)
+        if tag == "time_end"
+    ]
+
+    def reference():
+        """Process timing with Decimal seconds."""
+        for tags_dict in end_tags:
+            set_timing_decimal(tags_dict)
+
+    def nano():
+        """Process timing with integer nanoseconds."""
+        for tags_dict in end_tags:
+            set_timing_nano(tags_dict)
+
+    print_comparison(
+        "Process {0:d} substage timings of {1!s}".format(
+            len(end_tags), filename
+        ),
+        best_time(reference, 1000),
+        best_time(nano, 1000)
+    )
+
+    decimal_stages = [set_timing_decimal(tags) for tags in end_tags]
+    nano_stages = [set_timing_nano(tags) for tags in end_tags]
+    print_comparison(
+        "Convert {0:d} substages to dictionaries".format(len(end_tags)),
+        best_time(lambda: [stage.to_dict() for stage in decimal_stages]),
+        best_time(lambda: [stage.to_dict() for stage in nano_stages])
+    )
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
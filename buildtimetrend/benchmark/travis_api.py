@@ -0,0 +1,163 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Benchmark retrieving builds from a stub Travis CI API with asyncio.
+
+Builds are retrieved and parsed concurrently with AsyncTravisData from a
+local stub server (see stub_server), requests per second and the
+latency distribution of the requests are reported.
+This module requires Python 3.5 or later.
+
+Usage : python -m buildtimetrend.benchmark.travis_api [builds] [jobs]
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+import asyncio
+import math
+import sys
+import time
+from buildtimetrend.benchmark.stub_server import StubTravisServer
+from buildtimetrend.benchmark.stub_server import STUB_REPO
+from buildtimetrend.travis.aioconnector import AsyncTravisConnector
+from buildtimetrend.travis.aioparser import AsyncTravisData
+
+
+class TimedTravisConnector(AsyncTravisConnector):
+
+    """Async Travis connector recording the latency of each request."""
+
+    def __init__(self, api_url, max_connections):
+        """
+        Constructor.
+
+        Parameters:
+        - api_url : url of the Travis CI API
+        - max_connections : maximum number of concurrent requests
+        """
+        super(TimedTravisConnector, self).__init__(max_connections)
+        self.api_url = api_url
+        self.latencies = []
+
+    async def _get(self, url, headers, output=None):
+        """Send a GET request, record its latency."""
+        start = time.time()
+        try:
+            return await super(TimedTravisConnector, self)._get(
+                url, headers, output
+            )
+        finally:
+            self.latencies.append(time.time() - start)
+
+
+def percentile(values, percent):
+    """
+    Return a percentile of a list of values (nearest rank).
+
+    Parameters:
+    - values : list of values
+    - percent : percentile (0-100)
+    """
+    if not values:
+        return float('nan')
+
+    values = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+async def retrieve_build(connector, build_number):
+    """
+    Retrieve and parse a build and its jobs.
+
+    Parameters:
+    - connector : AsyncTravisConnector instance
+    - build_number : number of the build
+    """
+    travis_data = AsyncTravisData(STUB_REPO, build_number, connector)
+    if await travis_data.get_build_data():
+        return await travis_data.process_build_jobs()
+
+    return []
+
+
+async def retrieve_builds(server, builds, max_connections):
+    """
+    Retrieve builds concurrently from a stub server.
+
+    Returns a tuple (duration (s), number of jobs, connector)
+
+    Parameters:
+    - server : StubTravisServer instance
+    - builds : number of builds
+    - max_connections : maximum number of concurrent requests
+    """
+    connector = TimedTravisConnector(server.url, max_connections)
+
+    start = time.time()
+    results = await asyncio.gather(*[
+        retrieve_build(connector, build_number)
+        for build_number in range(1, builds + 1)
+    ])
+    duration = time.time() - start
+
+    return duration, sum(len(jobs) for jobs in results), connector
+
+
+def run(builds=100, jobs=4, delay=0.005, max_connections=50):
+    """
+    Run benchmark.
+
+    Parameters:
+    - builds : number of builds
+    - jobs : number of jobs per build
+    - delay : response time of the stub server, in seconds
+    - max_connections : maximum number of concurrent requests
+    """
+    loop = asyncio.new_event_loop()
+    server = StubTravisServer(int(jobs), float(delay))
+
+    try:
+        loop.run_until_complete(server.start())
+        duration, job_count, connector = loop.run_until_complete(
+            retrieve_builds(server, int(builds), int(max_connections))
+        )
+        loop.run_until_complete(server.close())
+    finally:
+        loop.close()
+
+    latencies = connector.latencies
+    print("Retrieve {0:d} builds, {1:d} jobs from stub Travis CI API".format(
+        int(builds), job_count
+    ))
+    print("  requests : {0:d} in {1:.2f} s, {2:.0f} requests/s".format(
+        server.requests, duration, server.requests / duration
+    ))
+    print("  latency  : p50 {0:.1f} ms, p95 {1:.1f} ms, "
+          "p99 {2:.1f} ms, max {3:.1f} ms".format(
+              percentile(latencies, 50) * 1000,
+              percentile(latencies, 95) * 1000,
+              percentile(latencies, 99) * 1000,
+              max(latencies) * 1000
+          ))
+    print("  max concurrent requests : {0:d}".format(
+        server.max_active_requests
+    ))
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
@@ -21,7 +21,6 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
-import copy
 from lxml import etree
 from buildtimetrend import logger
 from buildtimetrend.settings import Settings
@@ -82,9 +81,14 @@ class BuildJob(object):
         return self.properties.get_item(name)
 
     def get_properties(self):
-        """Return build properties."""
-        # copy values of properties
-        data = self.properties.get_items()
+        """
+        Return build properties.
+
+        Returns a new dictionary, the values are shared with the properties
+        collection (see Collection.get_snapshot()), they shouldn't be
+        modified.
+        """
+        data = dict(self.properties.get_snapshot())
 
         # add total duration
         # use total stage duration if it is defined
@@ -172,7 +176,13 @@ class BuildJob(object):
         return data
 
     def stages_to_list(self):
-        """Return list of stages, all containing the build properties."""
+        """
+        Return list of stages, all containing the build properties.
+
+        The stage dictionaries are created for each call, the build
+        properties are retrieved once and shared by all stages,
+        they shouldn't be modified.
+        """
         if isinstance(self.stages, Stages):
             # create list to be returned
             data = []
@@ -182,10 +192,7 @@ class BuildJob(object):
 
             # iterate all stages
             for stage in self.stages.stages:
-                temp = {}
-                # copy stage data
-                temp["stage"] = copy.deepcopy(stage)
-                # copy values of properties
+                temp = {"stage": stage}
                 # check if collection is empty
                 if build_properties:
                     temp["job"] = build_properties
@@ -198,7 +205,7 @@ class BuildJob(object):
         root = etree.Element("build")
 
         # add properties
-        for key in self.properties.get_items():
+        for key in self.properties.get_snapshot():
             root.set(str(key), str(self.properties.get_item(key)))
 
         # add stages
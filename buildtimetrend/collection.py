@@ -25,6 +25,41 @@ import copy
 from collections import OrderedDict
 from buildtimetrend.tools import check_dict
 from buildtimetrend import logger
+try:
+    from types import MappingProxyType
+except ImportError:
+    # Python 2
+    MappingProxyType = None
+
+
+def read_only_view(items):
+    """
+    Return a read-only view of a dictionary.
+
+    Parameters:
+    - items : dictionary
+    """
+    if MappingProxyType is not None:
+        return MappingProxyType(items)
+
+    return ReadOnlyDict(items)
+
+
+class ReadOnlyDict(dict):
+
+    """Dictionary that can't be modified, used if MappingProxyType is n/a."""
+
+    def _read_only(self, *args, **kwargs):
+        """Raise an error, a read-only dictionary can't be modified."""
+        raise TypeError("read-only dictionary can't be modified")
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    clear = _read_only
+    pop = _read_only
+    popitem = _read_only
+    setdefault = _read_only
+    update = _read_only
 
 
 class Collection(object):
@@ -34,6 +69,8 @@ class Collection(object):
     def __init__(self):
         """Initialize instance."""
         self.items = {}
+        # read-only snapshot of items, reset when the collection is modified
+        self._snapshot = None
 
     def add_item(self, name, value):
         """
@@ -45,10 +82,15 @@ class Collection(object):
         """
         if check_dict(value) and name in self.items and \
                 check_dict(self.items[name]):
-            self.items[name].update(value)
+            # merge in a new dictionary, snapshots share the previous one
+            merged_value = dict(self.items[name])
+            merged_value.update(value)
+            self.items[name] = merged_value
         else:
             self.items[name] = value
 
+        self._snapshot = None
+
     def get_item(self, name):
         """
         Get an item from a collection.
@@ -75,15 +117,31 @@ class Collection(object):
         if check_dict(items_dict, "items_dict"):
             # append dictionary with items to the existing collection
             self.items.update(items_dict)
+            self._snapshot = None
 
     def get_items(self):
         """Return items collection as dictionary."""
         # copy values of items collection
         return copy.deepcopy(self.items)
 
+    def get_snapshot(self):
+        """
+        Return a read-only snapshot of the items collection.
+
+        The snapshot is a read-only view of a copy of the items (a
+        TypeError is raised when it is modified), created once and
+        shared until the collection is modified. The values are shared
+        with the collection instead of being copied, they shouldn't be
+        modified. Use get_items() to get a copy that can be modified.
+        """
+        if self._snapshot is None:
+            self._snapshot = read_only_view(dict(self.items))
+
+        return self._snapshot
+
     def get_items_with_summary(self):
         """Return items collection as dictionary with an summary property."""
-        items = self.get_items()
+        items = dict(self.get_snapshot())
 
         # concatenate all properties in a summary field
         matrix_params = self.get_key_sorted_items().values()
@@ -23,8 +23,12 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 from __future__ import division
 from builtins import str
+from builtins import object
 import os
-import copy
+import time
+import atexit
+import threading
+from multiprocessing.pool import ThreadPool
 import keen
 import math
 from datetime import datetime
@@ -36,6 +40,10 @@ from buildtimetrend.tools import check_dict
 from buildtimetrend.tools import is_list
 from buildtimetrend.tools import is_string
 from buildtimetrend.buildjob import BuildJob
+from buildtimetrend.spool import EventSpool
+from buildtimetrend.spool import SpoolDrainWorker
+from buildtimetrend.spool import get_process_spool_path
+from buildtimetrend.spool import REJECTED_FILENAME
 
 
 TIME_INTERVALS = {
@@ -44,6 +52,35 @@ TIME_INTERVALS = {
     'year': {'name': 'year', 'timeframe': 'this_52_weeks', 'max_age': 1800}
 }
 KEEN_PROJECT_INFO_NAME = "buildtime_trend"
+# number of buffered events that triggers sending a batch,
+# and maximum delay (seconds) before a buffered event is sent
+DEFAULT_BATCH_MAX_EVENTS = 500
+DEFAULT_BATCH_MAX_DELAY = 5
+# number of buffered events (multiple of max_events)
+# before adding an event blocks until a batch is sent
+BATCH_MAX_PENDING_FACTOR = 10
+# analyses of build_jobs sharing the repo filter and timeframe,
+# retrieved with one multi-analysis query, see get_interval_statistics()
+INTERVAL_ANALYSES = {
+    "avg_buildtime": {
+        "analysis_type": "average", "target_property": "job.duration"
+    },
+    "total_build_jobs": {
+        "analysis_type": "count_unique", "target_property": "job.job"
+    },
+    "total_builds": {
+        "analysis_type": "count_unique", "target_property": "job.build"
+    }
+}
+# number of statistics queries sent concurrently, see get_build_statistics()
+DEFAULT_STATISTICS_WORKERS = 4
+
+# shared Keen.io event writer, see get_event_writer()
+_EVENT_WRITER = None
+_EVENT_WRITER_LOCK = threading.Lock()
+# shared spool drain worker, see get_spool_worker()
+_SPOOL_WORKER = None
+_SPOOL_WORKER_LOCK = threading.Lock()
 
 
 def has_project_id():
@@ -160,6 +197,9 @@ def send_build_data(buildjob, detail=None):
             "Sending client build job data to Keen.io (data detail: %s)",
             data_detail
         )
+        if queue_build_job(buildjob, data_detail, "build_stages"):
+            return
+
         # store build job data
         add_event("build_jobs", {"job": buildjob.to_dict()})
 
@@ -187,6 +227,9 @@ def send_build_data_service(buildjob, detail=None):
             "Sending service build job data to Keen.io (data detail: %s)",
             data_detail
         )
+        if queue_build_job(buildjob, data_detail, "build_substages"):
+            return
+
         add_event("build_jobs", {"job": buildjob.to_dict()})
         if data_detail in ("full", "extended"):
             add_events("build_substages", buildjob.stages_to_list())
@@ -228,24 +271,389 @@ def add_events(event_collection, payload):
     )
 
 
-def add_project_info_dict(payload):
+def queue_build_job(buildjob, data_detail, stages_collection):
+    """
+    Add the events of a build job to the spool or the event writer.
+
+    Events are appended to the spool if spooling is enabled
+    (see get_spool_worker()), otherwise they are buffered
+    by the event writer if batching is enabled (see get_event_writer()).
+    Returns false if neither is enabled, events should be sent directly.
+
+    Parameters:
+    - buildjob : BuildJob instance
+    - data_detail : Data storage detail level :
+                    'minimal', 'basic', 'full', 'extended'
+    - stages_collection : collection the build stages are submitted to
+    """
+    worker = get_spool_worker()
+    if worker is not None:
+        for event_collection, events in get_build_job_events(
+                buildjob, data_detail, stages_collection
+        ):
+            worker.spool.append(event_collection, events)
+        return True
+
+    writer = get_event_writer()
+    if writer is not None:
+        writer.add_build_job(buildjob, data_detail, stages_collection)
+        return True
+
+    return False
+
+
+def get_build_job_events(buildjob, data_detail, stages_collection):
+    """
+    Return the events of a build job, with project info.
+
+    Returns a list of tuples (collection, list of events).
+
+    Parameters:
+    - buildjob : BuildJob instance
+    - data_detail : Data storage detail level :
+                    'minimal', 'basic', 'full', 'extended'
+    - stages_collection : collection the build stages are submitted to
+    """
+    project_info = Settings().get_project_info()
+    events = [(
+        "build_jobs",
+        [add_project_info_dict({"job": buildjob.to_dict()}, project_info)]
+    )]
+
+    if data_detail in ("full", "extended"):
+        events.append((
+            stages_collection,
+            add_project_info_list(buildjob.stages_to_list(), project_info)
+        ))
+
+    return events
+
+
+def get_spool_worker():
+    """
+    Return the shared SpoolDrainWorker if spooling Keen.io events is enabled.
+
+    The drain worker is started when it is created.
+    Each process writes to its own spool directory in the configured path,
+    the drain worker replays the spools of stopped processes as well.
+    Events rejected by Keen.io are appended to REJECTED_FILENAME in path.
+    The spool is configured with the keen_spool setting :
+    - enabled : write events to a spool before they are sent
+    - path : directory containing the spool directories of all processes
+    - max_segment_size : maximum size of a spool segment, in MB
+    - max_segment_age : maximum age of a spool segment, in seconds
+    """
+    global _SPOOL_WORKER
+
+    spool_settings = Settings().get_setting("keen_spool")
+
+    if not spool_settings or not spool_settings.get("enabled"):
+        return None
+
+    with _SPOOL_WORKER_LOCK:
+        if _SPOOL_WORKER is None:
+            spool = EventSpool(
+                get_process_spool_path(spool_settings.get("path")),
+                float(spool_settings.get("max_segment_size", 1)) *
+                1024 * 1024,
+                float(spool_settings.get("max_segment_age", 10))
+            )
+            _SPOOL_WORKER = SpoolDrainWorker(
+                spool, orphans_path=spool_settings.get("path"),
+                rejected_path=os.path.join(
+                    spool_settings.get("path"), REJECTED_FILENAME
+                )
+            )
+            _SPOOL_WORKER.start()
+
+        return _SPOOL_WORKER
+
+
+def get_event_writer():
+    """
+    Return the shared KeenEventWriter if batching Keen.io events is enabled.
+
+    The writer is configured with the keen_batch setting :
+    - enabled : buffer events and send them in batches
+    - max_events : number of buffered events that triggers sending a batch
+    - max_delay : maximum delay before a buffered event is sent, in seconds
+    """
+    global _EVENT_WRITER
+
+    batch_settings = Settings().get_setting("keen_batch")
+
+    if not batch_settings or not batch_settings.get("enabled"):
+        return None
+
+    with _EVENT_WRITER_LOCK:
+        if _EVENT_WRITER is None:
+            _EVENT_WRITER = KeenEventWriter(
+                int(batch_settings.get(
+                    "max_events", DEFAULT_BATCH_MAX_EVENTS
+                )),
+                float(batch_settings.get(
+                    "max_delay", DEFAULT_BATCH_MAX_DELAY
+                ))
+            )
+
+        return _EVENT_WRITER
+
+
+class KeenEventWriter(object):
+
+    """
+    Buffer Keen.io events and send them in batches.
+
+    Events of all collections are collected in a buffer, a background
+    thread sends them with one keen.add_events() call when max_events
+    events are buffered, or when the oldest buffered event
+    was added max_delay seconds ago.
+    Adding events blocks if the sending thread can't keep up
+    (BATCH_MAX_PENDING_FACTOR * max_events events are buffered).
+    Buffered events are sent when the interpreter exits.
+    Errors while sending a batch are logged, the events of that batch
+    are counted as failed.
+    """
+
+    def __init__(self, max_events=DEFAULT_BATCH_MAX_EVENTS,
+                 max_delay=DEFAULT_BATCH_MAX_DELAY):
+        """
+        Constructor.
+
+        Parameters:
+        - max_events : number of buffered events that triggers sending
+        - max_delay : maximum delay before a buffered event is sent (s)
+        """
+        self.max_events = max(int(max_events), 1)
+        self.max_delay = max_delay
+        self.max_pending = self.max_events * BATCH_MAX_PENDING_FACTOR
+        # counters
+        self.sent_events = 0
+        self.failed_events = 0
+        self.batches = 0
+        # buffered events of each collection, in order of arrival
+        self._events = {}
+        self._count = 0
+        self._first_event_time = None
+        # number of events that are being sent
+        self._sending = 0
+        self._flush = False
+        self._closed = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def add_event(self, event_collection, payload):
+        """
+        Add project info to an event and add it to the buffer.
+
+        Param event_collection : collection event data is submitted to
+        Param payload : data that is submitted
+        """
+        self._add(event_collection, [add_project_info_dict(payload)])
+
+    def add_events(self, event_collection, payload):
+        """
+        Add project info to each event and add them to the buffer.
+
+        Param event_collection : collection event data is submitted to
+        Param payload : array of events that is submitted
+        """
+        self._add(event_collection, add_project_info_list(payload))
+
+    def add_build_job(self, buildjob, data_detail, stages_collection):
+        """
+        Add the events of a build job to the buffer.
+
+        Parameters:
+        - buildjob : BuildJob instance
+        - data_detail : Data storage detail level :
+                        'minimal', 'basic', 'full', 'extended'
+        - stages_collection : collection the build stages are submitted to
+        """
+        for event_collection, events in get_build_job_events(
+                buildjob, data_detail, stages_collection
+        ):
+            self._add(event_collection, events)
+
+    def flush(self):
+        """Send all buffered events, wait until they are sent."""
+        with self._condition:
+            self._flush = True
+            self._condition.notify_all()
+
+            while (self._count or self._sending) and \
+                    self._thread is not None and self._thread.is_alive():
+                self._condition.wait()
+
+    def close(self):
+        """Send all buffered events and stop the background thread."""
+        self.flush()
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join()
+
+    def get_pending(self):
+        """Return number of events that are buffered or being sent."""
+        with self._condition:
+            return self._count + self._sending
+
+    def _add(self, event_collection, events):
+        """
+        Add events to the buffer.
+
+        Parameters:
+        - event_collection : collection the events are submitted to
+        - events : list of events, with project info
+        """
+        if not events:
+            return
+
+        with self._condition:
+            if self._closed:
+                raise ValueError("KeenEventWriter is closed")
+
+            if self._thread is None:
+                self._start()
+
+            # wait until a batch is sent, if buffer is full
+            while self._count >= self.max_pending:
+                self._condition.wait()
+
+            self._events.setdefault(event_collection, []).extend(events)
+            self._count += len(events)
+            if self._first_event_time is None:
+                self._first_event_time = time.time()
+
+            if self._count >= self.max_events:
+                self._condition.notify_all()
+
+    def _start(self):
+        """Start background thread, send buffered events at exit."""
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        """Send batches of buffered events, until the writer is closed."""
+        while True:
+            with self._condition:
+                while not self._is_batch_ready():
+                    if self._closed and not self._count:
+                        return
+
+                    if self._count:
+                        self._condition.wait(max(
+                            self._first_event_time + self.max_delay -
+                            time.time(), 0.001
+                        ))
+                    else:
+                        self._flush = False
+                        self._condition.notify_all()
+                        self._condition.wait()
+
+                batch, count = self._take_batch()
+                self._sending = count
+                # unblock threads waiting for free space in the buffer
+                self._condition.notify_all()
+
+            self._send_batch(batch, count)
+
+            with self._condition:
+                self._sending = 0
+                self._condition.notify_all()
+
+    def _is_batch_ready(self):
+        """Check if buffered events should be sent."""
+        if not self._count:
+            return False
+
+        return self._count >= self.max_events or self._flush or \
+            self._closed or \
+            time.time() >= self._first_event_time + self.max_delay
+
+    def _take_batch(self):
+        """
+        Remove at most max_events events from the buffer.
+
+        Returns a tuple (dictionary with a list of events per collection,
+        number of events).
+        """
+        batch = {}
+        count = 0
+
+        for event_collection in list(self._events.keys()):
+            events = self._events[event_collection]
+            size = min(len(events), self.max_events - count)
+            batch[event_collection] = events[:size]
+            count += size
+
+            if size < len(events):
+                self._events[event_collection] = events[size:]
+                break
+            del self._events[event_collection]
+
+        self._count -= count
+        if not self._count:
+            self._first_event_time = None
+
+        return batch, count
+
+    def _send_batch(self, batch, count):
+        """
+        Send a batch of events to Keen.io.
+
+        Parameters:
+        - batch : dictionary with a list of events per collection
+        - count : number of events in the batch
+        """
+        try:
+            keen.add_events(batch)
+        except Exception as msg:
+            self.failed_events += count
+            logger.error(
+                "Error sending %d events to Keen.io : %s", count, msg
+            )
+            return
+
+        self.sent_events += count
+        self.batches += 1
+        logger.info(
+            "Sent batch of %d events to %s collections (Keen.io)",
+            count, ", ".join("'{}'".format(name) for name in sorted(batch))
+        )
+
+
+def add_project_info_dict(payload, project_info=None):
     """
     Add project info to a dictonary.
 
+    Returns a new dictionary, a shallow copy of payload : the values
+    (fe. stages and timestamps of a build job) and the project info
+    are shared with payload and other events, they shouldn't be modified.
+
     Param payload: dictonary payload
+    Param project_info: dictionary with project info,
+                        retrieved from Settings if it is None
     """
     # check if payload is a dictionary, throws an exception if it isn't
     check_dict(payload, "payload")
 
-    payload_as_dict = copy.deepcopy(payload)
+    if project_info is None:
+        project_info = Settings().get_project_info()
 
-    payload_as_dict[KEEN_PROJECT_INFO_NAME] = Settings().get_project_info()
+    payload_as_dict = dict(payload)
 
     if "job" in payload:
         # override project_name, set to build_job repo
         if "repo" in payload["job"]:
-            payload_as_dict[KEEN_PROJECT_INFO_NAME]["project_name"] = \
-                payload["job"]["repo"]
+            project_info = dict(project_info)
+            project_info["project_name"] = payload["job"]["repo"]
 
         # override timestamp, set to finished_at timestamp
         if "finished_at" in payload["job"]:
@@ -253,25 +661,33 @@ def add_project_info_dict(payload):
                 "timestamp": payload["job"]["finished_at"]["isotimestamp"]
             }
 
+    payload_as_dict[KEEN_PROJECT_INFO_NAME] = project_info
+
     return payload_as_dict
 
 
-def add_project_info_list(payload):
+def add_project_info_list(payload, project_info=None):
     """
     Add project info to a list of dictionaries.
 
+    Project info is retrieved once, and shared by all events
+    (see add_project_info_dict()).
+
     Param payload: list of dictionaries
+    Param project_info: dictionary with project info,
+                        retrieved from Settings if it is None
     """
     # check if payload is a list, throws an exception if it isn't
     is_list(payload, "payload")
 
-    payload_as_list = []
+    if project_info is None:
+        project_info = Settings().get_project_info()
 
     # loop over dicts in payload and add project info to each one
-    for event_dict in payload:
-        payload_as_list.append(add_project_info_dict(event_dict))
-
-    return payload_as_list
+    return [
+        add_project_info_dict(event_dict, project_info)
+        for event_dict in payload
+    ]
 
 
 def get_dashboard_keen_config(repo):
@@ -416,9 +832,20 @@ def get_pct_passed_build_jobs(repo=None, interval=None):
     - interval : timeframe, possible values : 'week', 'month', 'year',
                  anything else defaults to 'week'
     """
-    total_jobs = get_total_build_jobs(repo, interval)
-    passed_jobs = get_passed_build_jobs(repo, interval)
+    return calculate_pct_passed_build_jobs(
+        get_total_build_jobs(repo, interval),
+        get_passed_build_jobs(repo, interval)
+    )
+
+
+def calculate_pct_passed_build_jobs(total_jobs, passed_jobs):
+    """
+    Calculate percentage of passed build jobs.
 
+    Parameters :
+    - total_jobs : total number of build jobs
+    - passed_jobs : number of build jobs that passed
+    """
     logger.debug("passed/total build jobs : %d/%d", passed_jobs, total_jobs)
 
     # calculate percentage if at least one job was executed
@@ -552,6 +979,110 @@ def get_days_since_fail(repo=None):
     return -1
 
 
+def get_interval_statistics(repo=None, interval=None):
+    """
+    Query Keen.io database and retrieve build job statistics of an interval.
+
+    Average build time, total number of build jobs and of builds
+    are retrieved with one multi-analysis query.
+    Returns a dictionary (see INTERVAL_ANALYSES), values are -1
+    if the query fails.
+
+    Parameters :
+    - repo : repo name (fe. buildtimetrend/service)
+    - interval : timeframe, possible values : 'week', 'month', 'year',
+                 anything else defaults to 'week'
+    """
+    statistics = dict.fromkeys(INTERVAL_ANALYSES, -1)
+
+    if repo is None or not is_readable():
+        return statistics
+
+    interval_data = check_time_interval(interval)
+
+    try:
+        result = keen.multi_analysis(
+            "build_jobs",
+            analyses=INTERVAL_ANALYSES,
+            timeframe=interval_data['timeframe'],
+            max_age=interval_data['max_age'],
+            filters=[get_repo_filter(repo)]
+        )
+    except requests.ConnectionError:
+        logger.error("Connection to Keen.io API failed")
+        return statistics
+    except keen.exceptions.KeenApiError as msg:
+        logger.error("Error in keenio.get_interval_statistics() : " + str(msg))
+        return statistics
+
+    if check_dict(result):
+        for name in INTERVAL_ANALYSES:
+            if name in result:
+                statistics[name] = result[name]
+
+    return statistics
+
+
+def get_build_statistics(repo=None, interval=None,
+                         workers=DEFAULT_STATISTICS_WORKERS):
+    """
+    Query Keen.io database and retrieve all build statistics of a repo.
+
+    Instead of a query per statistic, the statistics of the interval
+    are retrieved with one multi-analysis query (see
+    get_interval_statistics()), it is sent concurrently with the queries
+    of passed build jobs, latest build time and days since last failure,
+    using a pool of threads.
+    Returns a dictionary with the repo, interval name and the statistics,
+    a statistic is -1 if it can't be retrieved.
+
+    Parameters :
+    - repo : repo name (fe. buildtimetrend/service)
+    - interval : timeframe, possible values : 'week', 'month', 'year',
+                 anything else defaults to 'week'
+    - workers : number of queries sent concurrently,
+                queries are sent one after the other if it is 1
+    """
+    queries = [
+        (get_interval_statistics, (repo, interval)),
+        (get_passed_build_jobs, (repo, interval)),
+        (get_latest_buildtime, (repo, )),
+        (get_days_since_fail, (repo, ))
+    ]
+
+    if workers is not None and workers > 1 and \
+            repo is not None and is_readable():
+        pool = ThreadPool(min(workers, len(queries)))
+        try:
+            results = [
+                result.get() for result in [
+                    pool.apply_async(function, args)
+                    for function, args in queries
+                ]
+            ]
+        finally:
+            pool.terminate()
+    else:
+        results = [function(*args) for function, args in queries]
+
+    interval_statistics, passed_jobs, latest_buildtime, days_since_fail = \
+        results
+
+    statistics = {
+        "repo": repo,
+        "interval": check_time_interval(interval)['name'],
+        "passed_build_jobs": passed_jobs,
+        "pct_passed_build_jobs": calculate_pct_passed_build_jobs(
+            interval_statistics["total_build_jobs"], passed_jobs
+        ),
+        "latest_buildtime": latest_buildtime,
+        "days_since_fail": days_since_fail
+    }
+    statistics.update(interval_statistics)
+
+    return statistics
+
+
 def has_build_id(repo=None, build_id=None):
     """
     Check if build_id exists in Keen.io database.
@@ -584,6 +1115,42 @@ def has_build_id(repo=None, build_id=None):
     return count > 0
 
 
+def get_build_ids(repo=None):
+    """
+    Query Keen.io database and retrieve the IDs of all builds of a repo.
+
+    Build IDs are retrieved with one query, use it instead of calling
+    has_build_id() for each build.
+    Raises SystemError if the query fails.
+
+    Parameters :
+    - repo : repo name (fe. buildtimetrend/python-lib)
+    """
+    if repo is None:
+        logger.error("Repo is not set")
+        raise ValueError("Repo is not set")
+    if not is_readable():
+        raise SystemError("Keen.io Project ID or API Read Key is not set")
+
+    try:
+        result = keen.select_unique(
+            "build_jobs",
+            "job.build",
+            filters=[get_repo_filter(repo)]
+        )
+    except requests.ConnectionError:
+        logger.error("Connection to Keen.io API failed")
+        raise SystemError("Connection to Keen.io API failed")
+    except keen.exceptions.KeenApiError as msg:
+        logger.error("Error in keenio.get_build_ids : " + str(msg))
+        raise SystemError(msg)
+
+    if is_list(result):
+        return [str(build_id) for build_id in result]
+
+    return []
+
+
 def get_all_projects():
     """Query Keen.io database and retrieve a list of all projects."""
     if not is_readable():
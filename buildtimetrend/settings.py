@@ -81,6 +81,38 @@ class Settings(object):
                 }
             )
 
+            # set Travis CI API response cache settings
+            self.add_setting(
+                'travis_cache',
+                {
+                    'enabled': False,
+                    'path': '.buildtimetrend_cache',
+                    'max_size': 500,
+                    'revalidate': True
+                }
+            )
+
+            # set Keen.io event batch settings
+            self.add_setting(
+                'keen_batch',
+                {
+                    'enabled': False,
+                    'max_events': 500,
+                    'max_delay': 5
+                }
+            )
+
+            # set Keen.io event spool settings
+            self.add_setting(
+                'keen_spool',
+                {
+                    'enabled': False,
+                    'path': '.buildtimetrend_spool',
+                    'max_segment_size': 1,
+                    'max_segment_age': 10
+                }
+            )
+
             # set level detail of build job data storage
             self.add_setting("data_detail", "full")
             self.add_setting("repo_data_detail", {})
@@ -312,6 +344,12 @@ class Settings(object):
             self.load_env_vars_task_queue()
             # load multi build import environment variables
             self.load_env_vars_multi_import()
+            # load Travis CI cache environment variables
+            self.load_env_vars_travis_cache()
+            # load Keen.io event batch environment variables
+            self.load_env_vars_keen_batch()
+            # load Keen.io event spool environment variables
+            self.load_env_vars_keen_spool()
 
         def load_env_vars_task_queue(self):
             """
@@ -355,6 +393,60 @@ class Settings(object):
             if multi_import:
                 self.add_setting("multi_import", multi_import)
 
+        def load_env_vars_travis_cache(self):
+            """
+            Load Travis CI cache environment variables.
+
+            Setting the cache directory enables the cache.
+            """
+            travis_cache = {}
+
+            if "BTT_TRAVIS_CACHE_DIR" in os.environ:
+                travis_cache["enabled"] = True
+                travis_cache["path"] = os.environ["BTT_TRAVIS_CACHE_DIR"]
+            if "BTT_TRAVIS_CACHE_MAX_SIZE" in os.environ:
+                travis_cache["max_size"] = \
+                    int(os.environ["BTT_TRAVIS_CACHE_MAX_SIZE"])
+
+            # check if collection is empty
+            if travis_cache:
+                self.add_setting("travis_cache", travis_cache)
+
+        def load_env_vars_keen_batch(self):
+            """
+            Load Keen.io event batch environment variables.
+
+            Setting the maximum number of events of a batch enables batching.
+            """
+            keen_batch = {}
+
+            if "BTT_KEEN_BATCH_MAX_EVENTS" in os.environ:
+                keen_batch["enabled"] = True
+                keen_batch["max_events"] = \
+                    int(os.environ["BTT_KEEN_BATCH_MAX_EVENTS"])
+            if "BTT_KEEN_BATCH_MAX_DELAY" in os.environ:
+                keen_batch["max_delay"] = \
+                    int(os.environ["BTT_KEEN_BATCH_MAX_DELAY"])
+
+            # check if collection is empty
+            if keen_batch:
+                self.add_setting("keen_batch", keen_batch)
+
+        def load_env_vars_keen_spool(self):
+            """
+            Load Keen.io event spool environment variables.
+
+            Setting the spool directory enables the spool.
+            """
+            if "BTT_KEEN_SPOOL_DIR" in os.environ:
+                self.add_setting(
+                    "keen_spool",
+                    {
+                        "enabled": True,
+                        "path": os.environ["BTT_KEEN_SPOOL_DIR"]
+                    }
+                )
+
         def env_var_to_settings(self, env_var_name, settings_name):
             """
             Store environment variable value as a setting.
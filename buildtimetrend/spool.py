@@ -0,0 +1,700 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Durable local spool of Keen.io events.
+
+Events are appended to a segment file in the spool directory
+(JSON lines, one event per line) before they are sent, so they are not
+lost if Keen.io is slow or unavailable, or when the process is stopped.
+A segment is closed when it exceeds a maximum size or age, closed segments
+are replayed to Keen.io by a drain worker thread, in order.
+A failed replay is retried with exponential backoff, a segment is removed
+when all its events are acknowledged. The number of acknowledged lines
+of a segment is saved, so events are not sent twice when a replay is
+interrupted. Events rejected by Keen.io are acknowledged as well,
+they are not sent again, but appended to a file of rejected events.
+A spool directory is used by one process at a time : it is locked by
+the process that writes it (fcntl). Each process writes to its own
+spool directory (see get_process_spool_path()), the drain worker of a
+process replays the spool directories of processes that stopped.
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from builtins import object
+import os
+import json
+import time
+import socket
+import atexit
+import threading
+import keen
+from buildtimetrend import logger
+from buildtimetrend.tools import check_dict
+from buildtimetrend.tools import is_list
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# extensions of the segment that is written, closed segments
+# and the file with the number of acknowledged lines of a segment
+SEGMENT_OPEN_EXTENSION = '.open'
+SEGMENT_EXTENSION = '.jsonl'
+SEGMENT_ACK_EXTENSION = '.ack'
+# file locked by the process using the spool directory
+LOCK_FILENAME = 'spool.lock'
+# file with the events rejected by Keen.io, in the directory containing
+# the spool directories of all processes
+REJECTED_FILENAME = 'rejected.jsonl'
+# maximum size (bytes) and age (seconds) of a segment before it is closed
+DEFAULT_MAX_SEGMENT_SIZE = 1024 * 1024
+DEFAULT_MAX_SEGMENT_AGE = 10
+# maximum number of events sent in one request
+DEFAULT_DRAIN_BATCH_SIZE = 500
+# delay before retrying a failed replay : backoff_factor * 2 ** (failures - 1)
+# limited to max_backoff (seconds)
+DEFAULT_BACKOFF_FACTOR = 1
+DEFAULT_MAX_BACKOFF = 300
+
+
+def send_events(batch):
+    """
+    Send a batch of events to Keen.io.
+
+    Raises an error if the request fails, so the batch is sent again.
+    Returns list of (collection, event, error) tuples of the events
+    rejected by Keen.io, the other events of the batch are stored.
+
+    Parameters:
+    - batch : dictionary with a list of events per collection
+    """
+    return get_rejected_events(batch, keen.add_events(batch))
+
+
+def get_rejected_events(batch, result):
+    """
+    Return list of (collection, event, error) tuples of rejected events.
+
+    The results of a collection are in the order of its events in the batch.
+
+    Parameters:
+    - batch : dictionary with a list of events per collection
+    - result : response of a batch request, dictionary with a list of
+               results ({"success": true/false, "error": ...}) per collection
+    """
+    rejected = []
+
+    if not check_dict(batch) or not check_dict(result):
+        return rejected
+
+    for event_collection, events in batch.items():
+        event_results = result.get(event_collection)
+        if not is_list(event_results):
+            continue
+
+        for event, event_result in zip(events, event_results):
+            if check_dict(event_result) and \
+                    not event_result.get("success", False):
+                rejected.append(
+                    (event_collection, event, event_result.get("error"))
+                )
+
+    return rejected
+
+
+def get_process_spool_path(path):
+    """
+    Return spool directory of the current process.
+
+    Parameters:
+    - path : directory containing the spool directories of all processes
+    """
+    return os.path.join(
+        path, "{0!s}-{1:d}".format(socket.gethostname(), os.getpid())
+    )
+
+
+def get_orphan_spools(path, exclude=None):
+    """
+    Return list of EventSpool instances of spools of stopped processes.
+
+    The spool directories in path that are not locked by another process
+    are locked and returned. Returns an empty list if locking
+    is not supported (fcntl is not available).
+
+    Parameters:
+    - path : directory containing the spool directories of all processes
+    - exclude : spool directory that is skipped
+    """
+    spools = []
+
+    if fcntl is None or not os.path.isdir(path):
+        return spools
+
+    for name in sorted(os.listdir(path)):
+        spool_path = os.path.join(path, name)
+        if spool_path == exclude or \
+                not os.path.isfile(os.path.join(spool_path, LOCK_FILENAME)):
+            continue
+
+        try:
+            spools.append(EventSpool(spool_path, sync=False))
+        except (IOError, OSError):
+            # spool is used by another process
+            continue
+
+    return spools
+
+
+class SpoolLock(object):
+
+    """
+    Exclusive lock of a spool directory, held by the process using it.
+
+    The lock is released when the process stops, so the spool of a stopped
+    process can be taken over. Locking is not enforced if fcntl
+    is not available.
+    """
+
+    def __init__(self, path):
+        """
+        Constructor.
+
+        Parameters:
+        - path : spool directory
+        """
+        self.filename = os.path.join(path, LOCK_FILENAME)
+        self._lock_file = None
+
+    def acquire(self):
+        """Acquire lock without blocking, returns false if it is locked."""
+        if fcntl is None or self._lock_file is not None:
+            return True
+
+        lock_file = open(self.filename, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # lock file was removed by the previous owner
+            if os.fstat(lock_file.fileno()).st_ino != \
+                    os.stat(self.filename).st_ino:
+                raise IOError("Lock file was removed")
+        except (IOError, OSError):
+            lock_file.close()
+            return False
+
+        self._lock_file = lock_file
+        return True
+
+    def release(self, remove=False):
+        """
+        Release lock.
+
+        Parameters:
+        - remove : remove lock file before releasing the lock
+        """
+        if self._lock_file is None:
+            return
+
+        if remove:
+            os.remove(self.filename)
+        self._lock_file.close()
+        self._lock_file = None
+
+
+class EventSpool(object):
+
+    """
+    Append-only spool of events, in segment files.
+
+    Segment files are named after a sequence number, so they sort
+    in the order they were written. The segment that is written has
+    extension SEGMENT_OPEN_EXTENSION, it is renamed when it is closed.
+    The spool directory is locked while the spool is used, segments left
+    open by a previous process are closed when the spool is created.
+    """
+
+    def __init__(self, path, max_segment_size=DEFAULT_MAX_SEGMENT_SIZE,
+                 max_segment_age=DEFAULT_MAX_SEGMENT_AGE, sync=True):
+        """
+        Constructor.
+
+        Raises IOError if the spool directory is used by another process.
+
+        Parameters:
+        - path : spool directory
+        - max_segment_size : maximum size of a segment (bytes)
+        - max_segment_age : maximum age of a segment (seconds)
+        - sync : flush appended events to disk (fsync)
+        """
+        self.path = path
+        self.max_segment_size = max_segment_size
+        self.max_segment_age = max_segment_age
+        self.sync = sync
+        self._segment = None
+        self._segment_file = None
+        self._segment_size = 0
+        self._segment_time = None
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        self._spool_lock = SpoolLock(self.path)
+        if not self._spool_lock.acquire():
+            raise IOError(
+                "Spool directory {0!s} is used by another process".format(
+                    self.path
+                )
+            )
+
+        # close segments of a previous process
+        segments = self._list_segments(SEGMENT_OPEN_EXTENSION)
+        for segment in segments:
+            self._close_segment_file(segment)
+        self._sequence = self._get_last_sequence()
+
+    def append(self, event_collection, events):
+        """
+        Append events to the current segment.
+
+        Parameters:
+        - event_collection : collection the events are submitted to
+        - events : list of events
+        """
+        is_list(events, "events")
+        if not events:
+            return
+
+        lines = "".join(
+            json.dumps({"collection": event_collection, "event": event},
+                       sort_keys=True) + "\n"
+            for event in events
+        ).encode('utf-8')
+
+        with self._lock:
+            if self._segment_file is None:
+                self._open_segment()
+
+            self._segment_file.write(lines)
+            self._segment_file.flush()
+            if self.sync:
+                os.fsync(self._segment_file.fileno())
+            self._segment_size += len(lines)
+
+            if self._segment_size >= self.max_segment_size:
+                self._close_segment()
+
+    def rotate(self, force=False):
+        """
+        Close the current segment if it is too old, so it can be replayed.
+
+        Parameters:
+        - force : close the current segment, regardless of its age
+        """
+        with self._lock:
+            if self._segment_file is None:
+                return
+
+            if force or \
+                    time.time() - self._segment_time >= self.max_segment_age:
+                self._close_segment()
+
+    def close(self):
+        """Close the current segment."""
+        self.rotate(True)
+
+    def release(self):
+        """Close the current segment and release the spool directory."""
+        self.close()
+        self._spool_lock.release()
+
+    def remove(self):
+        """
+        Remove the spool directory if it has no segments, release it.
+
+        Returns true if the spool directory was removed.
+        """
+        self.close()
+
+        with self._lock:
+            if self.get_segments() or self._list_segments(
+                    SEGMENT_OPEN_EXTENSION):
+                return False
+
+            self._spool_lock.release(True)
+            try:
+                os.rmdir(self.path)
+            except OSError as msg:
+                logger.warning(
+                    "Spool directory %s wasn't removed : %s", self.path, msg
+                )
+                return False
+
+        return True
+
+    def get_segments(self):
+        """Return list of closed segments (filenames), oldest first."""
+        return [
+            os.path.join(self.path, segment)
+            for segment in self._list_segments(SEGMENT_EXTENSION)
+        ]
+
+    def read_segment(self, segment):
+        """
+        Return list of (collection, event) tuples of a closed segment.
+
+        Lines that can't be decoded (fe. an incomplete line that was
+        written when the process stopped) are skipped.
+
+        Parameters:
+        - segment : segment filename
+        """
+        events = []
+
+        with open(segment, 'rb') as segment_file:
+            for line in segment_file:
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                    events.append((record["collection"], record["event"]))
+                except (ValueError, KeyError, TypeError) as msg:
+                    logger.warning(
+                        "Skip invalid line in spool segment %s : %s",
+                        segment, msg
+                    )
+
+        return events
+
+    def get_acknowledged(self, segment):
+        """
+        Return number of acknowledged events of a segment.
+
+        Parameters:
+        - segment : segment filename
+        """
+        try:
+            with open(segment + SEGMENT_ACK_EXTENSION, 'r') as ack_file:
+                return int(ack_file.read())
+        except (IOError, OSError, ValueError):
+            return 0
+
+    def acknowledge(self, segment, count):
+        """
+        Save number of acknowledged events of a segment.
+
+        Parameters:
+        - segment : segment filename
+        - count : number of acknowledged events
+        """
+        temp_filename = segment + SEGMENT_ACK_EXTENSION + '.tmp'
+        with open(temp_filename, 'w') as ack_file:
+            ack_file.write(str(count))
+        os.rename(temp_filename, segment + SEGMENT_ACK_EXTENSION)
+
+    def remove_segment(self, segment):
+        """
+        Remove a segment, when all its events are acknowledged.
+
+        Parameters:
+        - segment : segment filename
+        """
+        for filename in (segment, segment + SEGMENT_ACK_EXTENSION):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    def _open_segment(self):
+        """Open a new segment for writing."""
+        self._sequence += 1
+        self._segment = os.path.join(
+            self.path,
+            "{0:012d}{1!s}".format(self._sequence, SEGMENT_OPEN_EXTENSION)
+        )
+        self._segment_file = open(self._segment, 'ab')
+        self._segment_size = 0
+        self._segment_time = time.time()
+
+    def _close_segment(self):
+        """Close the current segment, so it can be replayed."""
+        self._segment_file.close()
+        self._close_segment_file(os.path.basename(self._segment))
+        self._segment = None
+        self._segment_file = None
+
+    def _close_segment_file(self, segment):
+        """
+        Rename an open segment file to a closed segment.
+
+        Parameters:
+        - segment : open segment filename, in the spool directory
+        """
+        name = os.path.splitext(segment)[0]
+        os.rename(
+            os.path.join(self.path, segment),
+            os.path.join(self.path, name + SEGMENT_EXTENSION)
+        )
+
+    def _list_segments(self, extension):
+        """
+        Return sorted list of segment filenames in the spool directory.
+
+        Parameters:
+        - extension : extension of the segments
+        """
+        return sorted(
+            filename for filename in os.listdir(self.path)
+            if filename.endswith(extension)
+        )
+
+    def _get_last_sequence(self):
+        """Return the highest sequence number of the segments."""
+        sequences = [
+            int(os.path.splitext(segment)[0])
+            for segment in self._list_segments(SEGMENT_EXTENSION)
+            if os.path.splitext(segment)[0].isdigit()
+        ]
+
+        return max(sequences) if sequences else 0
+
+
+class SpoolDrainWorker(object):
+
+    """
+    Replay the closed segments of a spool to Keen.io, in a thread.
+
+    The events of a segment are sent in batches, the number of
+    acknowledged events is saved after each batch. A failed batch is retried
+    with exponential backoff, the segment is removed when all its events
+    are sent. Events rejected by Keen.io are not retried, they are appended
+    to the rejected_path file, or logged and discarded if it isn't set.
+    The spools of stopped processes are replayed as well, if orphans_path
+    is set (see get_orphan_spools()).
+    """
+
+    def __init__(self, spool, send=send_events,
+                 batch_size=DEFAULT_DRAIN_BATCH_SIZE,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 max_backoff=DEFAULT_MAX_BACKOFF, orphans_path=None,
+                 rejected_path=None):
+        """
+        Constructor.
+
+        Parameters:
+        - spool : EventSpool instance
+        - send : function sending a batch (dictionary with a list
+                 of events per collection), raises an error if it fails,
+                 returns list of (collection, event, error) tuples
+                 of rejected events
+        - batch_size : maximum number of events sent in one request
+        - backoff_factor : factor of the delay between retries, in seconds
+        - max_backoff : maximum delay between retries, in seconds
+        - orphans_path : directory containing the spool directories
+                         of all processes
+        - rejected_path : file rejected events are appended to
+        """
+        self.spool = spool
+        self.orphans_path = orphans_path
+        self.rejected_path = rejected_path
+        self.send = send
+        self.batch_size = max(int(batch_size), 1)
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        # counters
+        self.sent_events = 0
+        self.rejected_events = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the drain thread, it is stopped when the interpreter exits."""
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """
+        Stop the drain thread, close the current segment and release
+        the spool directory.
+
+        Events that are not sent stay in the spool,
+        they are replayed when a drain worker is started again.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.spool.release()
+
+    def notify(self):
+        """Wake up the drain thread, to replay closed segments."""
+        self._wakeup.set()
+
+    def drain(self):
+        """
+        Replay all closed segments, and the spools of stopped processes.
+
+        Returns true if all segments were replayed, false if a batch failed.
+        """
+        return self.drain_spool(self.spool) and self.drain_orphans()
+
+    def drain_spool(self, spool):
+        """
+        Replay all closed segments of a spool.
+
+        Returns true if all segments were replayed, false if a batch failed.
+
+        Parameters:
+        - spool : EventSpool instance
+        """
+        for segment in spool.get_segments():
+            if self._stop.is_set() or \
+                    not self.drain_segment(segment, spool):
+                return False
+
+        return True
+
+    def drain_orphans(self):
+        """
+        Replay the spools of stopped processes, remove them when replayed.
+
+        Returns true if all segments were replayed, false if a batch failed.
+        """
+        if self.orphans_path is None:
+            return True
+
+        for spool in get_orphan_spools(self.orphans_path, self.spool.path):
+            try:
+                if not self.drain_spool(spool):
+                    return False
+                spool.remove()
+            finally:
+                spool.release()
+
+        return True
+
+    def drain_segment(self, segment, spool=None):
+        """
+        Replay the events of a segment, remove it when all are sent.
+
+        Events rejected by Keen.io are acknowledged, so they don't block
+        the replay of the segment, see store_rejected_events().
+        Returns true if all events were sent, false if a batch failed.
+
+        Parameters:
+        - segment : segment filename
+        - spool : EventSpool instance the segment belongs to,
+                  defaults to the spool of the worker
+        """
+        if spool is None:
+            spool = self.spool
+
+        events = spool.read_segment(segment)
+        acknowledged = spool.get_acknowledged(segment)
+
+        while acknowledged < len(events):
+            batch = {}
+            count = min(self.batch_size, len(events) - acknowledged)
+            for event_collection, event in \
+                    events[acknowledged:acknowledged + count]:
+                batch.setdefault(event_collection, []).append(event)
+
+            try:
+                rejected = self.send(batch) or []
+            except Exception as msg:
+                logger.warning(
+                    "Error sending %d spooled events to Keen.io : %s",
+                    count, msg
+                )
+                return False
+
+            if rejected:
+                self.store_rejected_events(rejected)
+
+            acknowledged += count
+            self.sent_events += count - len(rejected)
+            self.rejected_events += len(rejected)
+            spool.acknowledge(segment, acknowledged)
+
+        spool.remove_segment(segment)
+        return True
+
+    def store_rejected_events(self, rejected):
+        """
+        Log events rejected by Keen.io, append them to rejected_path.
+
+        Each rejected event is appended as a JSON line, with its collection
+        and the error returned by Keen.io. The events are discarded
+        if rejected_path isn't set or if it can't be written.
+
+        Parameters:
+        - rejected : list of (collection, event, error) tuples
+        """
+        logger.error(
+            "%d spooled events were rejected by Keen.io, first error : %s",
+            len(rejected), rejected[0][2]
+        )
+
+        if self.rejected_path is None:
+            return
+
+        try:
+            with open(self.rejected_path, 'ab') as rejected_file:
+                for event_collection, event, error in rejected:
+                    rejected_file.write(json.dumps({
+                        "collection": event_collection,
+                        "event": event,
+                        "error": error
+                    }).encode('utf-8') + b'\n')
+        except (IOError, OSError, TypeError, ValueError) as msg:
+            logger.error(
+                "Rejected events weren't written to %s : %s",
+                self.rejected_path, msg
+            )
+
+    def get_backoff(self):
+        """Return delay before retrying a failed replay, in seconds."""
+        if self.failures <= 0:
+            return 0
+
+        return min(
+            self.backoff_factor * 2 ** (self.failures - 1), self.max_backoff
+        )
+
+    def _run(self):
+        """Replay closed segments, until the worker is stopped."""
+        while not self._stop.is_set():
+            self.spool.rotate()
+
+            if self.drain():
+                self.failures = 0
+                delay = self.spool.max_segment_age
+            else:
+                self.failures += 1
+                delay = self.get_backoff()
+
+            # don't poll the spool continuously
+            self._wakeup.wait(max(delay, 0.1))
+            self._wakeup.clear()
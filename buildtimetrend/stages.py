@@ -24,12 +24,91 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+from __future__ import division
 import csv
+import math
+from array import array
+from bisect import bisect_right
+from numbers import Number
 from lxml import etree
 from buildtimetrend import logger
 from buildtimetrend.tools import split_timestamp
+from buildtimetrend.tools import split_timestamp_nano
+from buildtimetrend.tools import NANOSECONDS_PER_SECOND
 from buildtimetrend.tools import check_file
 from buildtimetrend.tools import nano2sec
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# column value of a timestamp in nanoseconds that isn't set
+NANO_NOT_SET = -2 ** 63
+
+
+def to_column_value(timestamp):
+    """
+    Convert a timestamp to a float stored in a column, NaN if not set.
+
+    Parameters:
+    - timestamp : seconds since epoch, or None
+    """
+    if timestamp is None:
+        return float('nan')
+
+    return float(timestamp)
+
+
+def from_column_value(value):
+    """
+    Convert a float stored in a column to a timestamp, None if NaN.
+
+    Parameters:
+    - value : value stored in a column
+    """
+    if math.isnan(value):
+        return None
+
+    return value
+
+
+def to_nano_column_value(timestamp):
+    """
+    Convert a timestamp in nanoseconds to a value stored in a column.
+
+    Parameters:
+    - timestamp : nanoseconds since epoch, or None
+    """
+    if timestamp is None:
+        return NANO_NOT_SET
+
+    return timestamp
+
+
+def from_nano_column_value(value):
+    """
+    Convert a value stored in a column to a timestamp in nanoseconds.
+
+    Parameters:
+    - value : value stored in a column
+    """
+    if value == NANO_NOT_SET:
+        return None
+
+    return value
+
+
+def to_numpy(column):
+    """
+    Return a NumPy array sharing the memory of a column.
+
+    Parameters:
+    - column : array.array instance
+    """
+    if not column:
+        return numpy.array([], dtype=column.typecode)
+
+    return numpy.frombuffer(column, dtype=column.typecode)
 
 
 class Stages(object):
@@ -39,15 +118,44 @@ class Stages(object):
 
     It gathers timestamps from a csv file and calculates stage duration.
     Output stages in xml format.
+    Stages are stored as compact Stage instances,
+    they are converted to dictionaries when stages are retrieved.
     """
 
     def __init__(self):
         """Initialize instance."""
-        self.stages = []
-        self.started_at = None
-        self.finished_at = None
+        # list of Stage instances
+        self.stage_list = []
+        # first started stage and last finished stage
+        self.started_at_stage = None
+        self.finished_at_stage = None
         self.end_timestamp = 0
 
+    def __len__(self):
+        """Return number of stages."""
+        return len(self.stage_list)
+
+    @property
+    def stages(self):
+        """Return list of stages, as dictionaries."""
+        return [stage.to_dict() for stage in self.stage_list]
+
+    @property
+    def started_at(self):
+        """Return split timestamp of the start of the first stage."""
+        if self.started_at_stage is None:
+            return None
+
+        return self.started_at_stage.get_split_timestamp("started_at")
+
+    @property
+    def finished_at(self):
+        """Return split timestamp of the end of the last stage."""
+        if self.finished_at_stage is None:
+            return None
+
+        return self.finished_at_stage.get_split_timestamp("finished_at")
+
     def set_end_timestamp(self, timestamp):
         """
         Set end timestamp.
@@ -82,8 +190,8 @@ class Stages(object):
         """Calculate total duration of all stages."""
         total_duration = 0
         # calculate total duration
-        for stage in self.stages:
-            total_duration += stage["duration"]
+        for stage in self.stage_list:
+            total_duration += stage.duration
 
         return total_duration
 
@@ -91,10 +199,10 @@ class Stages(object):
         """Return xml object from stages dictionary."""
         root = etree.Element("stages")
 
-        for stage in self.stages:
+        for stage in self.stage_list:
             root.append(etree.Element(
-                "stage", name=stage["name"],
-                duration=str(stage["duration"])))
+                "stage", name=stage.name,
+                duration=str(stage.duration)))
 
         return root
 
@@ -156,16 +264,24 @@ class Stages(object):
             )
 
         # add stage
-        self.stages.append(stage.to_dict())
+        self.stage_list.append(stage)
+        self.set_started_finished(stage)
 
+    def set_started_finished(self, stage):
+        """
+        Assign the first started and the last finished stage.
+
+        Parameters:
+        - stage : added Stage instance
+        """
         # assign starting timestamp of first stage
         # to started_at of the build job
-        if self.started_at is None and "started_at" in stage.data:
-            self.started_at = stage.data["started_at"]
+        if self.started_at_stage is None and stage.started_at is not None:
+            self.started_at_stage = stage
 
         # assign finished timestamp
-        if "finished_at" in stage.data:
-            self.finished_at = stage.data["finished_at"]
+        if stage.finished_at is not None:
+            self.finished_at_stage = stage
 
     def create_stage(self, name, start_time, end_time):
         """
@@ -196,22 +312,310 @@ class Stages(object):
         return stage
 
 
+class ColumnarStages(Stages):
+
+    """
+    Build stages, stored in columns.
+
+    Stage names are interned per instance (stored once, referred to by id),
+    timestamps (seconds since epoch) and durations are stored in arrays,
+    so aggregates are calculated without creating a Stage instance
+    or a dictionary per stage. Aggregates are vectorized with NumPy,
+    if it is installed.
+    Stages of several jobs can be concatenated to aggregate a batch.
+    """
+
+    def __init__(self):
+        """Initialize instance."""
+        self.started_at_stage = None
+        self.finished_at_stage = None
+        self.end_timestamp = 0
+        # interned stage names, the index is the name id
+        self.names = []
+        # name id of interned stage names (name : name id)
+        self.name_index = {}
+        self.name_ids = array('l')
+        self.commands = []
+        self.started = array('d')
+        self.finished = array('d')
+        # timestamps in nanoseconds, if they were set in nanoseconds
+        self.started_nano = array('q')
+        self.finished_nano = array('q')
+        self.durations = array('d')
+        # other timestamps, by stage index
+        self.timestamps = {}
+
+    def __len__(self):
+        """Return number of stages."""
+        return len(self.name_ids)
+
+    @property
+    def stage_list(self):
+        """Return list of Stage instances."""
+        return [self.get_stage(index) for index in range(len(self))]
+
+    @classmethod
+    def from_stages(cls, stages):
+        """
+        Create a ColumnarStages instance from a Stages instance.
+
+        Parameters:
+        - stages : Stages instance
+        """
+        if isinstance(stages, ColumnarStages):
+            return stages
+
+        columnar_stages = cls()
+        columnar_stages.end_timestamp = stages.end_timestamp
+        for stage in stages.stage_list:
+            columnar_stages.add_stage(stage)
+
+        return columnar_stages
+
+    @classmethod
+    def concatenate(cls, stages_list):
+        """
+        Concatenate stages of several jobs.
+
+        Parameters:
+        - stages_list : list of Stages instances
+        """
+        result = cls()
+
+        for stages in stages_list:
+            stages = cls.from_stages(stages)
+
+            offset = len(result)
+            for index, timestamps in stages.timestamps.items():
+                result.timestamps[index + offset] = timestamps
+
+            # map name ids of the concatenated stages to interned names
+            name_map = [result.intern_name(name) for name in stages.names]
+            result.name_ids.extend(
+                name_map[name_id] for name_id in stages.name_ids
+            )
+            result.commands.extend(stages.commands)
+            result.started.extend(stages.started)
+            result.finished.extend(stages.finished)
+            result.started_nano.extend(stages.started_nano)
+            result.finished_nano.extend(stages.finished_nano)
+            result.durations.extend(stages.durations)
+
+            if result.started_at_stage is None:
+                result.started_at_stage = stages.started_at_stage
+            if stages.finished_at_stage is not None:
+                result.finished_at_stage = stages.finished_at_stage
+
+        return result
+
+    def intern_name(self, name):
+        """
+        Return id of an interned stage name, intern it if needed.
+
+        Parameters:
+        - name : stage name
+        """
+        name_id = self.name_index.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.name_index[name] = name_id
+            self.names.append(name)
+
+        return name_id
+
+    def add_stage(self, stage):
+        """
+        Add a stage.
+
+        param stage Stage instance
+        """
+        if not isinstance(stage, Stage):
+            raise TypeError(
+                "param {0!s} should be a Stage instance".format(stage)
+            )
+
+        if stage.timestamps:
+            self.timestamps[len(self)] = dict(stage.timestamps)
+
+        self.name_ids.append(self.intern_name(stage.name))
+        self.commands.append(stage.command)
+        self.started.append(to_column_value(stage.started_at))
+        self.finished.append(to_column_value(stage.finished_at))
+        self.started_nano.append(to_nano_column_value(stage.started_at_nano))
+        self.finished_nano.append(
+            to_nano_column_value(stage.finished_at_nano)
+        )
+        self.durations.append(stage.duration)
+
+        self.set_started_finished(stage)
+
+    def get_stage(self, index):
+        """
+        Return a stage as a Stage instance.
+
+        Parameters:
+        - index : index of the stage
+        """
+        stage = Stage()
+        stage.name = self.names[self.name_ids[index]]
+        stage.command = self.commands[index]
+        stage.started_at = from_column_value(self.started[index])
+        stage.finished_at = from_column_value(self.finished[index])
+        stage.started_at_nano = from_nano_column_value(
+            self.started_nano[index]
+        )
+        stage.finished_at_nano = from_nano_column_value(
+            self.finished_nano[index]
+        )
+        stage.duration = self.durations[index]
+        if index in self.timestamps:
+            stage.timestamps = dict(self.timestamps[index])
+
+        return stage
+
+    def total_duration(self):
+        """Calculate total duration of all stages."""
+        if numpy is not None and self.durations:
+            return float(to_numpy(self.durations).sum())
+
+        return sum(self.durations)
+
+    def get_duration_by_name(self):
+        """Return dictionary with total duration of stages, by name."""
+        if numpy is not None and self.name_ids:
+            name_ids = to_numpy(self.name_ids)
+            durations = numpy.bincount(
+                name_ids, weights=to_numpy(self.durations)
+            )
+            return dict(
+                (self.names[name_id], float(durations[name_id]))
+                for name_id in numpy.unique(name_ids)
+            )
+
+        durations = {}
+        for name_id, duration in zip(self.name_ids, self.durations):
+            name = self.names[name_id]
+            durations[name] = durations.get(name, 0) + duration
+
+        return durations
+
+    def get_duration_percentile(self, percentile, name=None):
+        """
+        Return percentile of stage durations (nearest rank).
+
+        Returns None if there are no stages.
+
+        Parameters:
+        - percentile : percentile (0-100)
+        - name : only use stages with this name
+        """
+        if numpy is not None:
+            durations = to_numpy(self.durations)
+            if name is not None:
+                name_id = self.name_index.get(name)
+                durations = durations[to_numpy(self.name_ids) == name_id]
+            durations = numpy.sort(durations)
+        else:
+            durations = self.durations
+            if name is not None:
+                name_id = self.name_index.get(name)
+                durations = [
+                    duration for stage_name_id, duration
+                    in zip(self.name_ids, self.durations)
+                    if stage_name_id == name_id
+                ]
+            durations = sorted(durations)
+
+        if len(durations) == 0:
+            return None
+
+        rank = int(math.ceil(percentile / 100 * len(durations)))
+        return float(durations[min(max(rank, 1), len(durations)) - 1])
+
+    def get_critical_path(self):
+        """
+        Return the chain of stages that determined the finish time.
+
+        Starting from the stage that finished last, the stage that finished
+        last before the start of the current stage is added, until no stage
+        finished before. Stages without start or finish time are ignored.
+
+        Returns list of Stage instances, in chronological order.
+        """
+        if numpy is not None:
+            started = to_numpy(self.started)
+            finished = to_numpy(self.finished)
+            indexes = numpy.nonzero(
+                ~(numpy.isnan(started) | numpy.isnan(finished))
+            )[0]
+            order = indexes[numpy.argsort(finished[indexes], kind='stable')]
+            sorted_finished = finished[order]
+        else:
+            order = sorted(
+                (
+                    index for index in range(len(self))
+                    if not math.isnan(self.started[index]) and
+                    not math.isnan(self.finished[index])
+                ),
+                key=self.finished.__getitem__
+            )
+            sorted_finished = [self.finished[index] for index in order]
+
+        path = []
+        position = len(order) - 1
+        while position >= 0:
+            index = int(order[position])
+            path.append(self.get_stage(index))
+            # last stage that finished before the current stage started
+            position = min(
+                bisect_right(sorted_finished, self.started[index]), position
+            ) - 1
+
+        path.reverse()
+        return path
+
+
 class Stage(object):
 
-    """Build stage object."""
+    """
+    Build stage object.
+
+    A stage is stored in a compact form (name, command, start and finish
+    timestamps in seconds since epoch and duration), the timestamps
+    are split in their components when the stage is converted
+    to a dictionary.
+    Timestamps set in nanoseconds are kept as integers as well,
+    to split them exactly.
+    """
+
+    __slots__ = (
+        'name', 'command', 'started_at', 'finished_at', 'duration',
+        'started_at_nano', 'finished_at_nano', 'timestamps'
+    )
 
     def __init__(self):
         """Initialize instance."""
-        self.data = {}
-        self.set_name("")
-        self.set_duration(0)
+        self.name = ""
+        self.command = None
+        self.started_at = None
+        self.finished_at = None
+        self.started_at_nano = None
+        self.finished_at_nano = None
+        self.duration = 0
+        # other timestamps (name : seconds since epoch)
+        self.timestamps = None
+
+    @property
+    def data(self):
+        """Return stage data as dictionary."""
+        return self.to_dict()
 
     def set_name(self, name):
         """Set stage name."""
         if name is None:
             return False
 
-        self.data["name"] = str(name)
+        self.name = str(name)
         logger.info("Set name : %s", name)
         return True
 
@@ -220,7 +624,7 @@ class Stage(object):
         if command is None:
             return False
 
-        self.data["command"] = str(command)
+        self.command = str(command)
         return True
 
     def set_started_at(self, timestamp):
@@ -247,14 +651,22 @@ class Stage(object):
         - name timestamp name
         - timestamp seconds since epoch
         """
-        if timestamp is not None and name is not None:
-            try:
-                self.data[name] = split_timestamp(timestamp)
-                return True
-            except TypeError:
-                return False
+        if timestamp is None or name is None or \
+                not isinstance(timestamp, Number):
+            return False
 
-        return False
+        if name == "started_at":
+            self.started_at = timestamp
+            self.started_at_nano = None
+        elif name == "finished_at":
+            self.finished_at = timestamp
+            self.finished_at_nano = None
+        else:
+            if self.timestamps is None:
+                self.timestamps = {}
+            self.timestamps[name] = timestamp
+
+        return True
 
     def set_timestamp_nano(self, name, timestamp):
         """
@@ -264,14 +676,25 @@ class Stage(object):
         - name timestamp name
         - timestamp nanoseconds since epoch
         """
-        return self.set_timestamp(name, nano2sec(timestamp))
+        timestamp = int(timestamp)
+
+        if name == "started_at":
+            self.started_at = timestamp / NANOSECONDS_PER_SECOND
+            self.started_at_nano = timestamp
+        elif name == "finished_at":
+            self.finished_at = timestamp / NANOSECONDS_PER_SECOND
+            self.finished_at_nano = timestamp
+        else:
+            return self.set_timestamp(name, nano2sec(timestamp))
+
+        return True
 
     def set_duration(self, duration):
         """Set stage duration in seconds."""
         try:
             duration = float(duration)
             if duration >= 0:
-                self.data["duration"] = duration
+                self.duration = duration
                 return True
             return False
         except (ValueError, TypeError):
@@ -280,10 +703,46 @@ class Stage(object):
     def set_duration_nano(self, duration):
         """Set stage duration in nanoseconds."""
         try:
-            return self.set_duration(nano2sec(duration))
+            return self.set_duration(int(duration) / NANOSECONDS_PER_SECOND)
         except (ValueError, TypeError):
             return False
 
+    def get_split_timestamp(self, name):
+        """
+        Return a timestamp split in its components, None if it isn't set.
+
+        Parameters:
+        - name timestamp name
+        """
+        if name == "started_at":
+            timestamp = self.started_at
+            timestamp_nano = self.started_at_nano
+        elif name == "finished_at":
+            timestamp = self.finished_at
+            timestamp_nano = self.finished_at_nano
+        else:
+            timestamp = (self.timestamps or {}).get(name)
+            timestamp_nano = None
+
+        if timestamp_nano is not None:
+            return split_timestamp_nano(timestamp_nano)
+        if timestamp is not None:
+            return split_timestamp(timestamp)
+
+        return None
+
     def to_dict(self):
-        """Return stages data as dictionary."""
-        return self.data
+        """Return stages data as dictionary, with split timestamps."""
+        data = {"name": self.name, "duration": self.duration}
+
+        if self.command is not None:
+            data["command"] = self.command
+        if self.started_at is not None:
+            data["started_at"] = self.get_split_timestamp("started_at")
+        if self.finished_at is not None:
+            data["finished_at"] = self.get_split_timestamp("finished_at")
+        if self.timestamps is not None:
+            for name, timestamp in self.timestamps.items():
+                data[name] = split_timestamp(timestamp)
+
+        return data
@@ -0,0 +1,119 @@
+# vim: set expandtab sw=4 ts=4:
+#
+# Unit tests for the benchmark suite and log generator
+#
+# Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+#
+# This file is part of buildtimetrend/python-lib
+# <https://github.com/buildtimetrend/python-lib/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import json
+import shutil
+import tempfile
+from buildtimetrend.benchmark import suite
+from buildtimetrend.benchmark.generator import generate_log
+from buildtimetrend.benchmark.generator import generate_log_file
+from buildtimetrend.travis.parser import TravisData
+import unittest
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    """Unit tests for the benchmark suite and log generator"""
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        self.path = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.path, "test.log")
+        self.substages = generate_log_file(self.log_file, 100 * 1024, 0.1)
+
+    def tearDown(self):
+        """Remove temporary files."""
+        shutil.rmtree(self.path)
+
+    def test_generate_log(self):
+        """Test generate_log()"""
+        self.assertRaises(ValueError, generate_log, io.BytesIO(), 1000, 0)
+
+        stream = io.BytesIO()
+        substages = generate_log(stream, 10000, 0.5, 40)
+        self.assertTrue(len(stream.getvalue()) >= 10000)
+
+        # all generated substages are parsed
+        travis_data = TravisData("buildtimetrend/benchmark", 1)
+        travis_data.current_job.set_started_at("2014-08-17T13:40:14Z")
+        stream.seek(0)
+        travis_data.parse_job_log_stream(stream)
+        self.assertEqual(substages, len(travis_data.current_job.stages))
+
+        # lines with tags are 2 out of 4 lines (+ worker line)
+        lines = stream.getvalue().split(b'\n')[:-1]
+        self.assertEqual(4 * substages + 1, len(lines))
+        self.assertEqual(2 * substages + 1, len(
+            [line for line in lines if b'travis_' in line or b'worker' in line]
+        ))
+
+    def test_benchmarks(self):
+        """Test each benchmark with a small log"""
+        for name in suite.BENCHMARKS:
+            result = suite.run_benchmark(name, self.log_file, 100, 1)
+            self.assertTrue(result["duration"] > 0)
+            self.assertTrue(result["lines_per_s"] > 0)
+            self.assertTrue(result["lines"] > 0)
+            self.assertEqual(
+                result["bytes"] is None, result["mb_per_s"] is None
+            )
+
+        result = suite.run_benchmark(
+            "parse_job_log_stream", self.log_file, 100, 1
+        )
+        self.assertEqual(os.path.getsize(self.log_file), result["bytes"])
+        self.assertEqual(20 * self.substages + 1, result["lines"])
+
+    def test_run(self):
+        """Test run() and saving results as JSON"""
+        results = suite.run(0.01, count=100, repeat=1, benchmarks=[
+            "split_timestamp"
+        ])
+        self.assertListEqual(
+            ["split_timestamp"], list(results["benchmarks"].keys())
+        )
+        self.assertEqual(100, results["parameters"]["count"])
+
+        # results are serializable
+        self.assertDictEqual(results, json.loads(json.dumps(results)))
+
+    def test_compare_results(self):
+        """Test compare_results()"""
+        reference = {"benchmarks": {
+            "parse_job_log_stream": {"lines_per_s": 1000.0},
+            "split_timestamp": {"lines_per_s": 1000.0}
+        }}
+        results = {"benchmarks": {
+            "parse_job_log_stream": {"lines_per_s": 950.0},
+            "split_timestamp": {"lines_per_s": 800.0},
+            "parse_timestamps": {"lines_per_s": 1.0}
+        }}
+
+        self.assertListEqual(
+            [("split_timestamp", 1000.0, 800.0)],
+            suite.compare_results(reference, results)
+        )
+        self.assertListEqual(
+            [], suite.compare_results(reference, results, 0.5)
+        )
@@ -289,6 +289,27 @@ class TestBuildJob(unittest.TestCase):
             {'duration': 0, 'property1': 2, 'property2': 4},
             self.build.get_properties())
 
+    def test_get_properties_shared(self):
+        """Test build properties are shared, not copied"""
+        self.build.set_started_at(constants.ISOTIMESTAMP_STARTED)
+        self.build.add_stage(Stage())
+        self.build.add_stage(Stage())
+
+        properties = self.build.get_properties()
+        self.assertTrue(
+            properties["started_at"] is self.build.get_property("started_at")
+        )
+
+        # new dictionary, adding a property doesn't change the build job
+        properties["test"] = "value"
+        self.assertEqual(None, self.build.get_property("test"))
+
+        # all stages share the build properties
+        stages = self.build.stages_to_list()
+        self.assertEqual(2, len(stages))
+        self.assertTrue(stages[0]["job"] is stages[1]["job"])
+        self.assertFalse(stages[0]["stage"] is stages[1]["stage"])
+
     def test_load_properties(self):
         """Test loading properties"""
         self.build.load_properties_from_settings()
@@ -22,6 +22,7 @@
 
 import unittest
 from buildtimetrend.collection import Collection
+from buildtimetrend.collection import ReadOnlyDict
 
 
 class TestCollection(unittest.TestCase):
@@ -160,6 +161,63 @@ class TestCollection(unittest.TestCase):
             {'property1': 2, 'property2': 4},
             self.collection.get_items())
 
+    def test_get_snapshot(self):
+        """Test get_snapshot()"""
+        self.assertDictEqual({}, dict(self.collection.get_snapshot()))
+
+        self.collection.add_item('property1', 2)
+        self.collection.add_item('property2', {'key1': 1})
+        snapshot = self.collection.get_snapshot()
+        self.assertDictEqual(
+            {'property1': 2, 'property2': {'key1': 1}}, dict(snapshot)
+        )
+
+        # snapshot is shared until the collection is modified
+        self.assertTrue(snapshot is self.collection.get_snapshot())
+        self.assertTrue(
+            snapshot['property2'] is self.collection.get_item('property2')
+        )
+
+        # merging a dictionary item doesn't change the previous snapshot
+        self.collection.add_item('property2', {'key2': 2})
+        self.assertDictEqual(
+            {'property1': 2, 'property2': {'key1': 1}}, dict(snapshot)
+        )
+        self.assertDictEqual(
+            {'property1': 2, 'property2': {'key1': 1, 'key2': 2}},
+            dict(self.collection.get_snapshot())
+        )
+
+        self.collection.add_items({'property3': 3})
+        self.assertFalse('property3' in snapshot)
+        self.assertEqual(3, self.collection.get_snapshot()['property3'])
+
+    def test_get_snapshot_read_only(self):
+        """Test snapshot can't be modified"""
+        self.collection.add_item('property1', 2)
+        snapshot = self.collection.get_snapshot()
+
+        def set_item():
+            snapshot['property1'] = 3
+
+        def del_item():
+            del snapshot['property1']
+
+        self.assertRaises(TypeError, set_item)
+        self.assertRaises(TypeError, del_item)
+
+        # next snapshot is not changed
+        self.assertDictEqual(
+            {'property1': 2}, dict(self.collection.get_snapshot())
+        )
+        self.assertDictEqual({'property1': 2}, self.collection.items)
+
+        # read-only view used on Python 2
+        read_only = ReadOnlyDict({'property1': 2})
+        self.assertRaises(TypeError, read_only.update, {'property1': 3})
+        self.assertRaises(TypeError, read_only.pop, 'property1')
+        self.assertDictEqual({'property1': 2}, read_only)
+
     def test_get_items_with_summary(self):
         """Test get_items_with_summary()"""
         self.collection.add_item('property1', '2')
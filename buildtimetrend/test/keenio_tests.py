@@ -22,6 +22,7 @@
 
 import os
 import copy
+import time
 import unittest
 from datetime import datetime, timedelta
 import keen
@@ -30,6 +31,7 @@ import mock
 from buildtimetrend import keenio
 from buildtimetrend.settings import Settings
 from buildtimetrend.buildjob import BuildJob
+from buildtimetrend.stages import Stage
 from buildtimetrend.test import constants
 
 
@@ -200,6 +202,32 @@ class TestKeen(unittest.TestCase):
                 {"test2": "value2"}])
         )
 
+    def test_add_project_info_shared(self):
+        """Test adding project info without copying the payload values"""
+        job = {"repo": "test/repo", "stages": [{"name": "stage1"}]}
+        payload = [{"test": "value"}, {"job": job}]
+        events = keenio.add_project_info_list(payload)
+
+        # payload is not modified, values are shared
+        self.assertListEqual([{"test": "value"}, {"job": job}], payload)
+        self.assertTrue(events[1]["job"] is job)
+
+        # project name is overridden in a copy of the project info
+        self.assertEqual(
+            "test/repo", events[1]["buildtime_trend"]["project_name"]
+        )
+        self.assertEqual(self.project_info, events[0]["buildtime_trend"])
+
+        # project info is retrieved once
+        project_info = {"project_name": "test"}
+        with mock.patch.object(
+            Settings(), 'get_project_info', return_value=project_info
+        ) as get_project_info:
+            events = keenio.add_project_info_list([{}, {}, {}])
+            self.assertEqual(1, get_project_info.call_count)
+            for event in events:
+                self.assertTrue(event["buildtime_trend"] is project_info)
+
     def test_has_project_id_keen_var(self):
         """Test keenio.has_project_id() with keen vars"""
         keen.project_id = "1234abcd"
@@ -464,6 +492,35 @@ class TestKeen(unittest.TestCase):
         keen_count_func.side_effect = requests.ConnectionError
         self.assertRaises(SystemError, keenio.has_build_id, "test", 123)
 
+    @mock.patch('keen.select_unique', return_value=[157, "158"])
+    def test_get_build_ids(self, keen_select_func):
+        """Test keenio.get_build_ids() with a mocked keen.select_unique"""
+        # error is thrown when called without parameters
+        self.assertRaises(ValueError, keenio.get_build_ids)
+
+        # error is thrown when project_id or read key is not set
+        self.assertRaises(SystemError, keenio.get_build_ids, "test")
+
+        # test with some token (value doesn't matter, keen is mocked)
+        keen.project_id = "1234abcd"
+        keen.read_key = "4567abcd5678efgh"
+        self.assertListEqual(["157", "158"], keenio.get_build_ids("test"))
+
+        # test parameters passed to keen.select_unique
+        args, kwargs = keen_select_func.call_args
+        self.assertEqual(args, ("build_jobs", "job.build"))
+        self.assertDictEqual(
+            kwargs, {'filters': [keenio.get_repo_filter("test")]}
+        )
+
+        # returned value is invalid
+        keen_select_func.return_value = None
+        self.assertListEqual([], keenio.get_build_ids("test"))
+
+        # test raising ConnectionError
+        keen_select_func.side_effect = requests.ConnectionError
+        self.assertRaises(SystemError, keenio.get_build_ids, "test")
+
     @mock.patch(
         'buildtimetrend.keenio.generate_read_key',
         return_value=None
@@ -738,6 +795,130 @@ class TestKeen(unittest.TestCase):
         )
         self.assertEqual(-1, keenio.get_total_builds("test/repo"))
 
+    @mock.patch('keen.multi_analysis')
+    def test_get_interval_statistics(self, multi_analysis_func):
+        """Test keenio.get_interval_statistics()"""
+        multi_analysis_func.return_value = {
+            "avg_buildtime": 123.4,
+            "total_build_jobs": 23,
+            "total_builds": 12
+        }
+        failed = {"avg_buildtime": -1, "total_build_jobs": -1,
+                  "total_builds": -1}
+
+        self.assertDictEqual(failed, keenio.get_interval_statistics())
+        self.assertDictEqual(
+            failed, keenio.get_interval_statistics("test/repo")
+        )
+        self.assertFalse(multi_analysis_func.called)
+
+        # test with some token (value doesn't matter, query is mocked)
+        keen.project_id = "1234abcd"
+        keen.read_key = "4567abcd5678efgh"
+        self.assertDictEqual(
+            multi_analysis_func.return_value,
+            keenio.get_interval_statistics("test/repo", "month")
+        )
+
+        # test parameters passed to keen.multi_analysis
+        args, kwargs = multi_analysis_func.call_args
+        self.assertEqual(args, ("build_jobs",))
+        self.assertDictEqual(kwargs, {
+            'analyses': keenio.INTERVAL_ANALYSES,
+            'timeframe': keenio.TIME_INTERVALS['month']['timeframe'],
+            'max_age': keenio.TIME_INTERVALS['month']['max_age'],
+            'filters': [{
+                'operator': 'eq',
+                'property_name': 'buildtime_trend.project_name',
+                'property_value': 'test/repo'
+            }]
+        })
+
+        # missing analysis
+        multi_analysis_func.return_value = {"total_builds": 12}
+        self.assertDictEqual(
+            {"avg_buildtime": -1, "total_build_jobs": -1, "total_builds": 12},
+            keenio.get_interval_statistics("test/repo")
+        )
+
+        # test raising ConnectionError
+        multi_analysis_func.side_effect = requests.ConnectionError
+        self.assertDictEqual(
+            failed, keenio.get_interval_statistics("test/repo")
+        )
+
+        # test raising KeenApiError (call with invalid read_key)
+        multi_analysis_func.side_effect = keen.exceptions.KeenApiError(
+            self.test_api_error
+        )
+        self.assertDictEqual(
+            failed, keenio.get_interval_statistics("test/repo")
+        )
+
+    @mock.patch('keen.maximum', return_value=0)
+    @mock.patch('keen.extraction', return_value=[{"job": {"duration": 34}}])
+    @mock.patch('keen.count_unique', return_value=20)
+    @mock.patch('keen.multi_analysis')
+    def test_get_build_statistics(self, multi_analysis_func, count_func,
+                                  extraction_func, maximum_func):
+        """Test keenio.get_build_statistics()"""
+        multi_analysis_func.return_value = {
+            "avg_buildtime": 123.4,
+            "total_build_jobs": 25,
+            "total_builds": 12
+        }
+
+        self.assertDictEqual(
+            {
+                "repo": "test/repo",
+                "interval": "week",
+                "avg_buildtime": -1,
+                "total_build_jobs": -1,
+                "total_builds": -1,
+                "passed_build_jobs": -1,
+                "pct_passed_build_jobs": -1,
+                "latest_buildtime": -1,
+                "days_since_fail": -1
+            },
+            keenio.get_build_statistics("test/repo")
+        )
+
+        # test with some token (value doesn't matter, queries are mocked)
+        keen.project_id = "1234abcd"
+        keen.read_key = "4567abcd5678efgh"
+        expected = {
+            "repo": "test/repo",
+            "interval": "year",
+            "avg_buildtime": 123.4,
+            "total_build_jobs": 25,
+            "total_builds": 12,
+            "passed_build_jobs": 20,
+            "pct_passed_build_jobs": 80,
+            "latest_buildtime": 34,
+            "days_since_fail": -1
+        }
+        self.assertDictEqual(
+            expected, keenio.get_build_statistics("test/repo", "year")
+        )
+
+        # one query per statistic type
+        self.assertEqual(1, multi_analysis_func.call_count)
+        self.assertEqual(1, count_func.call_count)
+        self.assertEqual(1, extraction_func.call_count)
+        self.assertEqual(1, maximum_func.call_count)
+
+        # queries sent one after the other
+        self.assertDictEqual(
+            expected, keenio.get_build_statistics("test/repo", "year", 1)
+        )
+
+        # failing query
+        multi_analysis_func.side_effect = requests.ConnectionError
+        statistics = keenio.get_build_statistics("test/repo", "year")
+        self.assertEqual(-1, statistics["total_build_jobs"])
+        self.assertEqual(-1, statistics["pct_passed_build_jobs"])
+        self.assertEqual(20, statistics["passed_build_jobs"])
+
     def test_get_latest_buildtime(self):
         """Test keenio.get_latest_buildtime()"""
         patcher = mock.patch(
@@ -1205,3 +1386,117 @@ class TestKeen(unittest.TestCase):
         keenio.send_build_data_service(buildjob)
         self.assertTrue(add_event_func.called)
         self.assertFalse(add_events_func.called)
+
+
+class TestKeenEventWriter(unittest.TestCase):
+
+    """Unit tests for KeenEventWriter"""
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        # reinit settings singleton
+        Settings().__init__()
+        self.project_info = Settings().get_project_info()
+        keenio._EVENT_WRITER = None
+
+    def tearDown(self):
+        """Stop shared event writer."""
+        if keenio._EVENT_WRITER is not None:
+            keenio._EVENT_WRITER.close()
+        keenio._EVENT_WRITER = None
+        Settings().__init__()
+
+    @mock.patch('keen.add_events')
+    def test_batches(self, add_events_func):
+        """Test sending events in batches of max_events"""
+        writer = keenio.KeenEventWriter(100, 60)
+        for index in range(150):
+            writer.add_event("collection1", {"index": index})
+        writer.add_events(
+            "collection2", [{"index": index} for index in range(100)]
+        )
+        writer.add_events("collection2", [])
+
+        writer.flush()
+        self.assertEqual(0, writer.get_pending())
+        self.assertEqual(250, writer.sent_events)
+        self.assertEqual(3, writer.batches)
+        self.assertEqual(3, add_events_func.call_count)
+
+        # events of several collections are sent in one call, in order
+        batches = [args[0] for args, _ in add_events_func.call_args_list]
+        self.assertEqual(100, len(batches[0]["collection1"]))
+        self.assertEqual(50, len(batches[1]["collection1"]))
+        self.assertEqual(50, len(batches[1]["collection2"]))
+        self.assertEqual(50, len(batches[2]["collection2"]))
+        self.assertDictEqual(
+            {"index": 100, "buildtime_trend": self.project_info},
+            batches[1]["collection1"][0]
+        )
+
+        writer.close()
+        self.assertRaises(
+            ValueError, writer.add_event, "collection1", {"index": 0}
+        )
+
+    @mock.patch('keen.add_events')
+    def test_max_delay(self, add_events_func):
+        """Test sending buffered events after max_delay"""
+        writer = keenio.KeenEventWriter(100, 0.05)
+        writer.add_event("collection", {"index": 0})
+        self.assertFalse(add_events_func.called)
+
+        # wait for background thread to send the event
+        for _ in range(100):
+            if writer.sent_events:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(1, writer.sent_events)
+        add_events_func.assert_called_once_with({"collection": [
+            {"index": 0, "buildtime_trend": self.project_info}
+        ]})
+        writer.close()
+
+    @mock.patch('keen.add_events', side_effect=ValueError("error"))
+    def test_errors(self, add_events_func):
+        """Test counting events that failed"""
+        writer = keenio.KeenEventWriter(10, 60)
+        writer.add_events("collection", [{"index": 0}, {"index": 1}])
+        writer.close()
+
+        self.assertEqual(0, writer.sent_events)
+        self.assertEqual(2, writer.failed_events)
+        self.assertEqual(0, writer.get_pending())
+
+    @mock.patch('keen.add_events')
+    def test_send_build_data_service(self, add_events_func):
+        """Test sending the data of many build jobs in a few batches"""
+        self.assertEqual(None, keenio.get_event_writer())
+
+        Settings().add_setting(
+            "keen_batch", {"enabled": True, "max_events": 500}
+        )
+        writer = keenio.get_event_writer()
+        self.assertEqual(500, writer.max_events)
+        self.assertTrue(writer is keenio.get_event_writer())
+
+        keen.project_id = "1234abcd"
+        keen.write_key = "1234abcd5678efgh"
+        buildjob = BuildJob()
+        for _ in range(4):
+            stage = Stage()
+            stage.set_name("stage1")
+            stage.set_duration(1)
+            buildjob.add_stage(stage)
+
+        for _ in range(100):
+            keenio.send_build_data_service(buildjob)
+        writer.flush()
+
+        # 100 jobs with 4 stages in 1 or 2 batches
+        self.assertEqual(500, writer.sent_events)
+        self.assertTrue(add_events_func.call_count <= 2)
+
+        keen.project_id = None
+        keen.write_key = None
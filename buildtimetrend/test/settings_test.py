@@ -47,6 +47,23 @@ DEFAULT_SETTINGS = {
         "max_builds": 100,
         "delay": 3
     },
+    "travis_cache": {
+        "enabled": False,
+        "path": ".buildtimetrend_cache",
+        "max_size": 500,
+        "revalidate": True
+    },
+    "keen_batch": {
+        "enabled": False,
+        "max_events": 500,
+        "max_delay": 5
+    },
+    "keen_spool": {
+        "enabled": False,
+        "path": ".buildtimetrend_spool",
+        "max_segment_size": 1,
+        "max_segment_age": 10
+    },
     "dashboard_configfile": "dashboard/config.js"
 }
 
@@ -228,7 +245,10 @@ class TestSettings(unittest.TestCase):
                 "multi_import": {
                     "max_builds": 150,
                     "delay": 6
-                }
+                },
+                "travis_cache": DEFAULT_SETTINGS["travis_cache"],
+                "keen_batch": DEFAULT_SETTINGS["keen_batch"],
+                "keen_spool": DEFAULT_SETTINGS["keen_spool"]
             },
             self.settings.settings.get_items())
 
@@ -264,6 +284,75 @@ class TestSettings(unittest.TestCase):
 
         del os.environ["BTT_MULTI_MAX_BUILDS"]
 
+    def test_load_travis_cache_settings(self):
+        """Test travis_cache setting"""
+        self.assertDictEqual(
+            DEFAULT_SETTINGS["travis_cache"],
+            self.settings.get_setting("travis_cache")
+        )
+
+        os.environ["BTT_TRAVIS_CACHE_DIR"] = "/tmp/cache"
+        os.environ["BTT_TRAVIS_CACHE_MAX_SIZE"] = "20"
+
+        self.settings.load_env_vars()
+        self.assertDictEqual(
+            {
+                "enabled": True,
+                "path": "/tmp/cache",
+                "max_size": 20,
+                "revalidate": True
+            },
+            self.settings.get_setting("travis_cache")
+        )
+
+        del os.environ["BTT_TRAVIS_CACHE_DIR"]
+        del os.environ["BTT_TRAVIS_CACHE_MAX_SIZE"]
+
+    def test_load_keen_batch_settings(self):
+        """Test keen_batch setting"""
+        self.assertDictEqual(
+            DEFAULT_SETTINGS["keen_batch"],
+            self.settings.get_setting("keen_batch")
+        )
+
+        os.environ["BTT_KEEN_BATCH_MAX_EVENTS"] = "100"
+        os.environ["BTT_KEEN_BATCH_MAX_DELAY"] = "2"
+
+        self.settings.load_env_vars()
+        self.assertDictEqual(
+            {
+                "enabled": True,
+                "max_events": 100,
+                "max_delay": 2
+            },
+            self.settings.get_setting("keen_batch")
+        )
+
+        del os.environ["BTT_KEEN_BATCH_MAX_EVENTS"]
+        del os.environ["BTT_KEEN_BATCH_MAX_DELAY"]
+
+    def test_load_keen_spool_settings(self):
+        """Test keen_spool setting"""
+        self.assertDictEqual(
+            DEFAULT_SETTINGS["keen_spool"],
+            self.settings.get_setting("keen_spool")
+        )
+
+        os.environ["BTT_KEEN_SPOOL_DIR"] = "/tmp/spool"
+
+        self.settings.load_env_vars()
+        self.assertDictEqual(
+            {
+                "enabled": True,
+                "path": "/tmp/spool",
+                "max_segment_size": 1,
+                "max_segment_age": 10
+            },
+            self.settings.get_setting("keen_spool")
+        )
+
+        del os.environ["BTT_KEEN_SPOOL_DIR"]
+
     def test_load_settings(self):
         """Test Settings.load_settings()"""
         # checking if Keen.io configuration is not set (yet)
@@ -315,7 +404,10 @@ class TestSettings(unittest.TestCase):
                 "multi_import": {
                     "max_builds": 150,
                     "delay": 6
-                }
+                },
+                "travis_cache": DEFAULT_SETTINGS["travis_cache"],
+                "keen_batch": DEFAULT_SETTINGS["keen_batch"],
+                "keen_spool": DEFAULT_SETTINGS["keen_spool"]
             },
             self.settings.settings.get_items())
 
@@ -0,0 +1,430 @@
+# vim: set expandtab sw=4 ts=4:
+#
+# Unit tests for the spool of Keen.io events
+#
+# Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+#
+# This file is part of buildtimetrend/python-lib
+# <https://github.com/buildtimetrend/python-lib/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import keen
+import mock
+from buildtimetrend import keenio
+from buildtimetrend.buildjob import BuildJob
+from buildtimetrend.settings import Settings
+from buildtimetrend.spool import EventSpool
+from buildtimetrend.spool import LOCK_FILENAME
+from buildtimetrend.spool import REJECTED_FILENAME
+from buildtimetrend.spool import SpoolDrainWorker
+from buildtimetrend.spool import get_process_spool_path
+from buildtimetrend.spool import get_rejected_events
+from buildtimetrend.spool import send_events
+import unittest
+
+
+class FailingSender(object):
+
+    """
+    Send function recording batches, failing on selected calls.
+
+    Selected events are rejected, like Keen.io rejects invalid events.
+    """
+
+    def __init__(self, failures=(), rejected=()):
+        """
+        Constructor.
+
+        Parameters:
+        - failures : numbers of the calls that fail (starting at 1)
+        - rejected : events that are rejected
+        """
+        self.failures = failures
+        self.rejected = rejected
+        self.calls = 0
+        self.batches = []
+
+    def __call__(self, batch):
+        """
+        Record a batch, raise an error if the call should fail.
+
+        Returns list of (collection, event, error) tuples of rejected events.
+        """
+        self.calls += 1
+        if self.calls in self.failures:
+            raise IOError("Keen.io is unavailable")
+        self.batches.append(batch)
+
+        return [
+            (collection, event, "invalid")
+            for collection in sorted(batch)
+            for event in batch[collection]
+            if event in self.rejected
+        ]
+
+    def get_events(self):
+        """Return list of (collection, event) tuples of all batches."""
+        return [
+            (collection, event)
+            for batch in self.batches
+            for collection in sorted(batch)
+            for event in batch[collection]
+        ]
+
+
+class TestEventSpool(unittest.TestCase):
+
+    """Unit tests for EventSpool and SpoolDrainWorker"""
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        self.path = tempfile.mkdtemp()
+        self.spool = EventSpool(self.path, 200, 60, sync=False)
+
+    def tearDown(self):
+        """Release and remove spool directory."""
+        self.spool.release()
+        shutil.rmtree(self.path)
+
+    def test_append(self):
+        """Test appending events and closing segments"""
+        self.spool.append("collection", [])
+        self.assertRaises(TypeError, self.spool.append, "collection", {})
+        self.assertListEqual([LOCK_FILENAME], os.listdir(self.path))
+
+        self.spool.append("collection", [{"index": 0}])
+        # segment is open
+        self.assertListEqual([], self.spool.get_segments())
+        self.assertEqual(
+            ["000000000001.open", LOCK_FILENAME], sorted(os.listdir(self.path))
+        )
+
+        # segment is closed when max size is exceeded
+        self.spool.append("collection", [{"index": i} for i in range(1, 10)])
+        self.assertListEqual(
+            [os.path.join(self.path, '000000000001.jsonl')],
+            self.spool.get_segments()
+        )
+
+        # segment is closed when it is too old
+        self.spool.append("collection", [{"index": 10}])
+        self.spool.rotate()
+        self.assertEqual(1, len(self.spool.get_segments()))
+        self.spool.max_segment_age = 0
+        self.spool.rotate()
+        self.assertEqual(2, len(self.spool.get_segments()))
+
+        # open segment of a previous process is closed, sequence continues
+        self.spool.append("collection", [{"index": 11}])
+        self.spool._segment_file.close()
+        self.spool._segment_file = None
+        self.spool._spool_lock.release()
+        spool = EventSpool(self.path, 200, 60, sync=False)
+        segments = spool.get_segments()
+        self.assertEqual(3, len(segments))
+        spool.append("collection", [{"index": 12}])
+        spool.close()
+        self.assertEqual(
+            os.path.join(self.path, '000000000004.jsonl'),
+            spool.get_segments()[-1]
+        )
+
+        events = []
+        for segment in spool.get_segments():
+            events.extend(spool.read_segment(segment))
+        self.assertListEqual(
+            [("collection", {"index": i}) for i in range(13)], events
+        )
+        spool.release()
+
+    def test_lock(self):
+        """Test spool directory is used by one process at a time"""
+        self.spool.append("collection", [{"index": 0}])
+
+        # open segment of a running process is not closed
+        self.assertRaises(IOError, EventSpool, self.path)
+        self.assertListEqual([], self.spool.get_segments())
+
+        # spool can be used when it is released
+        self.spool.release()
+        spool = EventSpool(self.path, sync=False)
+        self.assertEqual(1, len(spool.get_segments()))
+        spool.release()
+
+    def test_drain_orphans(self):
+        """Test replaying spools of stopped processes"""
+        spool_path = get_process_spool_path(self.path)
+        orphan_path = os.path.join(self.path, "host-1")
+        running_path = os.path.join(self.path, "host-2")
+
+        orphan = EventSpool(orphan_path, sync=False)
+        orphan.append("collection", [{"index": 0}])
+        orphan._segment_file.close()
+        orphan._spool_lock.release()
+        running = EventSpool(running_path, sync=False)
+        running.append("collection", [{"index": 1}])
+        running.close()
+
+        spool = EventSpool(spool_path, sync=False)
+        sender = FailingSender()
+        worker = SpoolDrainWorker(spool, sender, orphans_path=self.path)
+        self.assertTrue(worker.drain())
+
+        # spool of the stopped process is replayed and removed,
+        # spool of the running process is not replayed
+        self.assertListEqual(
+            [("collection", {"index": 0})], sender.get_events()
+        )
+        self.assertFalse(os.path.exists(orphan_path))
+        self.assertEqual(1, len(running.get_segments()))
+        self.assertTrue(os.path.isdir(spool_path))
+
+        running.release()
+        spool.release()
+
+    @mock.patch('keen.add_events')
+    def test_send_events(self, add_events_func):
+        """Test sending a batch, rejected events are returned"""
+        batch = {"collection": [{"index": 0}, {"index": 1}]}
+        add_events_func.return_value = {
+            "collection": [{"success": True}, {"success": True}]
+        }
+        self.assertListEqual([], send_events(batch))
+        add_events_func.assert_called_once_with(batch)
+
+        add_events_func.return_value = {
+            "collection": [
+                {"success": True},
+                {"success": False, "error": {"message": "invalid"}}
+            ]
+        }
+        self.assertListEqual(
+            [("collection", {"index": 1}, {"message": "invalid"})],
+            send_events(batch)
+        )
+
+        # failed request raises an error
+        add_events_func.side_effect = IOError
+        self.assertRaises(IOError, send_events, batch)
+
+    def test_get_rejected_events(self):
+        """Test get_rejected_events()"""
+        batch = {
+            "collection1": [{"index": 0}],
+            "collection2": [{"index": 1}, {"index": 2}]
+        }
+        self.assertListEqual([], get_rejected_events(batch, None))
+        self.assertListEqual([], get_rejected_events(batch, {}))
+        self.assertListEqual([], get_rejected_events(None, {}))
+        self.assertListEqual([], get_rejected_events(
+            batch, {"collection1": [{"success": True}]}
+        ))
+        self.assertListEqual(
+            [("collection2", {"index": 2}, "error")],
+            get_rejected_events(batch, {
+                "collection1": [{"success": True}],
+                "collection2": [{"success": True},
+                                {"success": False, "error": "error"}]
+            })
+        )
+
+    def test_drain_segment_rejected(self):
+        """Test rejected events are acknowledged and stored"""
+        rejected_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, rejected_dir)
+        rejected_path = os.path.join(rejected_dir, REJECTED_FILENAME)
+        self.spool.max_segment_size = 10000
+        self.spool.append("collection", [{"index": i} for i in range(5)])
+        self.spool.close()
+
+        sender = FailingSender(rejected=[{"index": 1}, {"index": 3}])
+        worker = SpoolDrainWorker(
+            self.spool, sender, batch_size=2, rejected_path=rejected_path
+        )
+        self.assertTrue(worker.drain())
+
+        # accepted events are sent once, rejected events are not retried
+        self.assertEqual(3, sender.calls)
+        self.assertEqual(3, worker.sent_events)
+        self.assertEqual(2, worker.rejected_events)
+        self.assertListEqual([], self.spool.get_segments())
+        self.assertTrue(worker.drain())
+        self.assertEqual(3, sender.calls)
+
+        with open(rejected_path, 'rb') as rejected_file:
+            self.assertListEqual(
+                [
+                    {"collection": "collection", "event": {"index": 1},
+                     "error": "invalid"},
+                    {"collection": "collection", "event": {"index": 3},
+                     "error": "invalid"},
+                ],
+                [json.loads(line.decode('utf-8')) for line in rejected_file]
+            )
+
+        # rejected events are discarded if rejected_path isn't set
+        self.spool.append("collection", [{"index": 1}])
+        self.spool.close()
+        worker = SpoolDrainWorker(self.spool, sender)
+        self.assertTrue(worker.drain())
+        self.assertEqual(1, worker.rejected_events)
+        self.assertListEqual([], self.spool.get_segments())
+
+    def test_read_segment_incomplete(self):
+        """Test reading a segment with an incomplete line"""
+        self.spool.append("collection", [{"index": 0}])
+        self.spool.close()
+        segment = self.spool.get_segments()[0]
+        with open(segment, 'ab') as segment_file:
+            segment_file.write(b'{"collection": "coll')
+
+        self.assertListEqual(
+            [("collection", {"index": 0})], self.spool.read_segment(segment)
+        )
+
+    def test_drain_segment(self):
+        """Test replaying a segment, resuming after a failure"""
+        self.spool.max_segment_size = 10000
+        self.spool.append("collection1", [{"index": i} for i in range(5)])
+        self.spool.append("collection2", [{"index": i} for i in range(3)])
+        self.spool.close()
+        segment = self.spool.get_segments()[0]
+
+        # second batch fails
+        sender = FailingSender([2])
+        worker = SpoolDrainWorker(self.spool, sender, batch_size=3)
+        self.assertFalse(worker.drain())
+        self.assertEqual(3, self.spool.get_acknowledged(segment))
+        self.assertEqual(3, worker.sent_events)
+
+        # replay is resumed after the acknowledged events
+        self.assertTrue(worker.drain())
+        self.assertEqual(8, worker.sent_events)
+        self.assertListEqual([], self.spool.get_segments())
+        self.assertListEqual([LOCK_FILENAME], os.listdir(self.path))
+
+        self.assertEqual(4, sender.calls)
+        self.assertListEqual(
+            [{"collection1": [{"index": 3}, {"index": 4}],
+              "collection2": [{"index": 0}]}],
+            sender.batches[1:2]
+        )
+        self.assertListEqual(
+            [("collection1", {"index": i}) for i in range(5)] +
+            [("collection2", {"index": i}) for i in range(3)],
+            sender.get_events()
+        )
+
+    def test_backoff(self):
+        """Test exponential backoff"""
+        worker = SpoolDrainWorker(self.spool, backoff_factor=1, max_backoff=5)
+        self.assertEqual(0, worker.get_backoff())
+        delays = []
+        for failures in range(1, 6):
+            worker.failures = failures
+            delays.append(worker.get_backoff())
+        self.assertListEqual([1, 2, 4, 5, 5], delays)
+
+    def test_worker(self):
+        """Test replaying segments in a thread"""
+        sender = FailingSender([1])
+        worker = SpoolDrainWorker(
+            self.spool, sender, backoff_factor=0.01
+        )
+        worker.start()
+
+        self.spool.append("collection", [{"index": i} for i in range(20)])
+        worker.notify()
+
+        # wait until all events are sent, first call fails
+        for _ in range(200):
+            if worker.sent_events == 20:
+                break
+            time.sleep(0.01)
+
+        worker.stop()
+        self.assertEqual(20, worker.sent_events)
+        self.assertEqual(20, len(sender.get_events()))
+        self.assertListEqual([], self.spool.get_segments())
+
+    def test_worker_stop(self):
+        """Test events stay in the spool when the worker is stopped"""
+        worker = SpoolDrainWorker(self.spool, FailingSender(range(1, 100)))
+        worker.start()
+        self.spool.append("collection", [{"index": 0}])
+        worker.stop()
+
+        self.assertEqual(1, len(self.spool.get_segments()))
+
+        # replayed by a new worker
+        sender = FailingSender()
+        self.assertTrue(SpoolDrainWorker(self.spool, sender).drain())
+        self.assertListEqual(
+            [("collection", {"index": 0})], sender.get_events()
+        )
+
+
+class TestKeenSpool(unittest.TestCase):
+
+    """Unit tests for spooling Keen.io events"""
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        self.path = tempfile.mkdtemp()
+        Settings().__init__()
+        keenio._SPOOL_WORKER = None
+        keen.project_id = "1234abcd"
+        keen.write_key = "1234abcd5678efgh"
+
+    def tearDown(self):
+        """Stop drain worker, remove spool directory."""
+        if keenio._SPOOL_WORKER is not None:
+            keenio._SPOOL_WORKER.stop()
+        keenio._SPOOL_WORKER = None
+        keen.project_id = None
+        keen.write_key = None
+        Settings().__init__()
+        shutil.rmtree(self.path)
+
+    @mock.patch('keen.add_events')
+    def test_send_build_data_service(self, add_events_func):
+        """Test spooling build job data"""
+        self.assertEqual(None, keenio.get_spool_worker())
+
+        Settings().add_setting(
+            "keen_spool", {"enabled": True, "path": self.path}
+        )
+        worker = keenio.get_spool_worker()
+        self.assertTrue(worker is keenio.get_spool_worker())
+        self.assertEqual(
+            os.path.join(self.path, REJECTED_FILENAME), worker.rejected_path
+        )
+
+        keenio.send_build_data_service(BuildJob())
+        self.assertFalse(add_events_func.called)
+
+        # events are replayed when the segment is closed
+        worker.spool.close()
+        self.assertTrue(worker.drain())
+        add_events_func.assert_called_once_with({
+            "build_jobs": [keenio.add_project_info_dict(
+                {"job": BuildJob().to_dict()}
+            )]
+        })
@@ -21,10 +21,12 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import unittest
+import mock
 from formencode.doctest_xml_compare import xml_compare
 from lxml import etree
 from buildtimetrend.stages import Stages
 from buildtimetrend.stages import Stage
+from buildtimetrend.stages import ColumnarStages
 from buildtimetrend.test import constants
 
 STAGES_RESULT = [{
@@ -34,6 +36,15 @@ STAGES_RESULT = [{
     'started_at': constants.SPLIT_TIMESTAMP1
 }]
 
+# name, started_at and finished_at of stages
+COLUMNAR_STAGES = [
+    ("stage1", 0, 1),
+    ("stage2", 1, 3),
+    ("stage1", 0.5, 2.5),
+    ("stage3", 3, 4),
+    ("stage2", 4, 6)
+]
+
 
 class TestStages(unittest.TestCase):
 
@@ -459,6 +470,144 @@ class TestStages(unittest.TestCase):
             self.stages.stages)
 
 
+class TestColumnarStages(unittest.TestCase):
+
+    """Unit tests for ColumnarStages class"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up test fixture."""
+        # show full diff in case of assert mismatch
+        cls.maxDiff = None
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        self.stages = Stages()
+        for name, started_at, finished_at in COLUMNAR_STAGES:
+            stage = Stage()
+            stage.set_name(name)
+            stage.set_command(name + ".sh")
+            stage.set_started_at(started_at)
+            stage.set_finished_at(finished_at)
+            stage.set_duration(finished_at - started_at)
+            self.stages.add_stage(stage)
+
+        # stage without timestamps
+        stage = Stage()
+        stage.set_name("stage4")
+        stage.set_duration(0)
+        stage.set_timestamp("event1", 0)
+        self.stages.add_stage(stage)
+
+        self.columnar = ColumnarStages.from_stages(self.stages)
+
+    def test_novalue(self):
+        """Test initial state the function and class instances."""
+        stages = ColumnarStages()
+        self.assertEqual(0, len(stages))
+        self.assertListEqual([], stages.stages)
+        self.assertEqual(0, stages.total_duration())
+        self.assertDictEqual({}, stages.get_duration_by_name())
+        self.assertEqual(None, stages.get_duration_percentile(50))
+        self.assertListEqual([], stages.get_critical_path())
+        self.assertEqual(None, stages.started_at)
+        self.assertEqual(None, stages.finished_at)
+        self.assertTrue(
+            xml_compare(etree.fromstring(b"<stages/>"), stages.to_xml())
+        )
+
+    def test_add_stage(self):
+        """Test add_stage()"""
+        self.assertRaises(TypeError, self.columnar.add_stage, None)
+
+        self.assertEqual(6, len(self.columnar))
+        self.assertListEqual(self.stages.stages, self.columnar.stages)
+        self.assertEqual(self.stages.started_at, self.columnar.started_at)
+        self.assertEqual(self.stages.finished_at, self.columnar.finished_at)
+        self.assertTrue(
+            xml_compare(self.stages.to_xml(), self.columnar.to_xml())
+        )
+        self.assertListEqual(
+            [stage.to_dict() for stage in self.stages.stage_list],
+            [stage.to_dict() for stage in self.columnar.stage_list]
+        )
+
+    def test_concatenate(self):
+        """Test concatenate()"""
+        stages = ColumnarStages.concatenate([self.columnar, self.stages])
+
+        self.assertEqual(12, len(stages))
+        self.assertListEqual(self.stages.stages * 2, stages.stages)
+        self.assertEqual(16, stages.total_duration())
+
+    def test_concatenate_names(self):
+        """Test concatenate() with stage names interned per instance"""
+        other = ColumnarStages()
+        for name in ("other", "stage2"):
+            stage = Stage()
+            stage.set_name(name)
+            stage.set_duration(5)
+            other.add_stage(stage)
+
+        self.assertListEqual(["other", "stage2"], other.names)
+        self.assertListEqual(
+            ["stage1", "stage2", "stage3", "stage4"], self.columnar.names
+        )
+
+        stages = ColumnarStages.concatenate([other, self.columnar])
+
+        self.assertListEqual(
+            ["other", "stage2", "stage1", "stage3", "stage4"], stages.names
+        )
+        self.assertListEqual(
+            ["other", "stage2", "stage1", "stage2", "stage1", "stage3",
+             "stage2", "stage4"],
+            [stage.name for stage in stages.stage_list]
+        )
+        self.assertDictEqual(
+            {"other": 5, "stage1": 3, "stage2": 9, "stage3": 1, "stage4": 0},
+            stages.get_duration_by_name()
+        )
+        self.assertEqual(5, stages.get_duration_percentile(50, "other"))
+
+    def test_aggregates(self):
+        """Test aggregates"""
+        self.assertEqual(8, self.columnar.total_duration())
+        self.assertDictEqual(
+            {"stage1": 3, "stage2": 4, "stage3": 1, "stage4": 0},
+            self.columnar.get_duration_by_name()
+        )
+
+        self.assertEqual(0, self.columnar.get_duration_percentile(0))
+        self.assertEqual(1, self.columnar.get_duration_percentile(50))
+        self.assertEqual(2, self.columnar.get_duration_percentile(95))
+        self.assertEqual(
+            1, self.columnar.get_duration_percentile(50, "stage1")
+        )
+        self.assertEqual(
+            None, self.columnar.get_duration_percentile(50, "unknown")
+        )
+
+    def test_critical_path(self):
+        """Test get_critical_path()"""
+        self.assertListEqual(
+            ["stage1", "stage2", "stage3", "stage2"],
+            [stage.name for stage in self.columnar.get_critical_path()]
+        )
+
+
+class TestColumnarStagesPython(TestColumnarStages):
+
+    """Unit tests for ColumnarStages class, without NumPy"""
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        patcher = mock.patch('buildtimetrend.stages.numpy', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super(TestColumnarStagesPython, self).setUp()
+
+
 class TestStage(unittest.TestCase):
 
     """Unit tests for Stage class"""
@@ -637,6 +786,45 @@ class TestStage(unittest.TestCase):
                 "event1": constants.SPLIT_TIMESTAMP_TESTDATE},
             self.stage.to_dict())
 
+    def test_set_timestamp_nano_exact(self):
+        """Test timestamps set in nanoseconds are kept as integers"""
+        timestamp = str(constants.TIMESTAMP_NANO_TESTDATE)
+        self.assertTrue(self.stage.set_started_at_nano(timestamp))
+        self.assertEqual(
+            constants.TIMESTAMP_NANO_TESTDATE, self.stage.started_at_nano
+        )
+        self.assertAlmostEqual(
+            constants.TIMESTAMP_TESTDATE, self.stage.started_at, 5
+        )
+        self.assertDictEqual(
+            constants.SPLIT_TIMESTAMP_TESTDATE,
+            self.stage.get_split_timestamp("started_at")
+        )
+        self.assertEqual(None, self.stage.get_split_timestamp("finished_at"))
+
+        # setting a timestamp in seconds replaces the nanoseconds timestamp
+        self.assertTrue(self.stage.set_started_at(0))
+        self.assertEqual(None, self.stage.started_at_nano)
+        self.assertDictEqual(
+            constants.SPLIT_TIMESTAMP_EPOCH,
+            self.stage.get_split_timestamp("started_at")
+        )
+
+        # nanoseconds timestamps are kept by columnar stages
+        self.assertTrue(
+            self.stage.set_finished_at_nano(constants.TIMESTAMP_NANO_TESTDATE)
+        )
+        columnar_stages = ColumnarStages()
+        columnar_stages.add_stage(self.stage)
+        self.assertListEqual(
+            [self.stage.to_dict()], columnar_stages.stages
+        )
+        self.assertEqual(
+            constants.TIMESTAMP_NANO_TESTDATE,
+            columnar_stages.get_stage(0).finished_at_nano
+        )
+        self.assertEqual(None, columnar_stages.get_stage(0).started_at_nano)
+
     def test_set_started_at(self):
         """Test set_started_at()"""
         # timestamp should be valid
@@ -763,3 +951,35 @@ class TestStage(unittest.TestCase):
             },
             self.stage.to_dict()
         )
+
+    def test_compact(self):
+        """Test compact stage record"""
+        # stage has no instance dictionary
+        self.assertRaises(AttributeError, setattr, self.stage, "event1", 0)
+
+        self.assertTrue(self.stage.set_name("stage.1"))
+        self.assertTrue(self.stage.set_started_at(constants.TIMESTAMP_STARTED))
+        self.assertTrue(self.stage.set_timestamp("event1", 0))
+
+        # timestamps are stored in seconds, split when converted to dict
+        self.assertEqual("stage.1", self.stage.name)
+        self.assertEqual(constants.TIMESTAMP_STARTED, self.stage.started_at)
+        self.assertEqual(None, self.stage.finished_at)
+        self.assertDictEqual({"event1": 0}, self.stage.timestamps)
+        self.assertDictEqual(
+            {
+                "name": "stage.1",
+                "duration": 0,
+                "started_at": constants.SPLIT_TIMESTAMP_STARTED,
+                "event1": constants.SPLIT_TIMESTAMP_EPOCH
+            },
+            self.stage.data
+        )
+
+        # stages stores the stage instance
+        stages = Stages()
+        stages.add_stage(self.stage)
+        self.assertEqual(1, len(stages))
+        self.assertListEqual([self.stage], stages.stage_list)
+        self.assertEqual(self.stage, stages.started_at_stage)
+        self.assertEqual(None, stages.finished_at_stage)
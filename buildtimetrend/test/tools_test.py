@@ -32,11 +32,47 @@ from buildtimetrend.tools import get_repo_slug
 from buildtimetrend.settings import Settings
 from datetime import datetime
 from decimal import Decimal
+from decimal import getcontext
 from dateutil.tz import tzutc
+from dateutil.tz import tzoffset
+from dateutil.parser import parse
+import random
 import unittest
+from buildtimetrend.benchmark.split_datetime import split_datetime_strftime
 from buildtimetrend.test import constants
 
 
+def get_random_datetimes(count):
+    """
+    Return a list of random datetime instances.
+
+    Naive and timezone aware instances, with UTC and other offsets.
+
+    Parameters :
+    - count : number of datetime instances
+    """
+    timezones = [
+        None, tzutc(), tzoffset("CET", 3600), tzoffset("EST", -5 * 3600),
+        tzoffset("IST", 19800), tzoffset("LMT", 45)
+    ]
+    rnd = random.Random(42)
+    timestamps = []
+    for _ in range(count):
+        timestamp = datetime.utcfromtimestamp(
+            rnd.randint(0, 4102444800)
+        ).replace(
+            microsecond=rnd.choice([0, rnd.randint(0, 999999)]),
+            tzinfo=rnd.choice(timezones)
+        )
+        timestamps.append(timestamp)
+
+    # edge cases : year before 1000, noon and midnight
+    timestamps.append(datetime(999, 3, 1, 0, 0, 0))
+    timestamps.append(datetime(2016, 2, 29, 12, 0, 0, 1, tzutc()))
+    timestamps.append(datetime(2016, 12, 31, 23, 59, 59, 999999))
+    return timestamps
+
+
 class TestTools(unittest.TestCase):
 
     """Unit tests for tools related functions"""
@@ -122,6 +158,52 @@ class TestTools(unittest.TestCase):
             tools.split_isotimestamp(constants.ISOTIMESTAMP_TESTDATE)
         )
 
+    def test_parse_isotimestamp(self):
+        """Test parse_isotimestamp() is equal to dateutil parsing"""
+        isotimestamps = [
+            "1970-01-01T00:00:00Z",
+            "2016-01-01T12:00:00Z",
+            "2016-01-01T12:00:00",
+            "2014-07-09T13:38:33.456789+00:00",
+            "2014-07-09T13:38:33.456-00:00",
+            "2014-07-09T13:38:33.1234567Z",
+            "2014-07-09T13:38:33.5+0000",
+            # parsed by dateutil
+            "2014-07-09 13:38:33",
+            "2014-07-09T13:38:33 UTC",
+            "2014-07-09"
+        ]
+        for isotimestamp in isotimestamps:
+            expected = parse(isotimestamp, tzinfos={"UTC": +0})
+            result = tools.parse_isotimestamp(isotimestamp)
+            self.assertEqual(expected, result)
+            self.assertEqual(expected.isoformat(), result.isoformat())
+            self.assertEqual(expected.tzname(), result.tzname())
+            self.assertDictEqual(
+                split_datetime_strftime(expected),
+                tools.split_isotimestamp(isotimestamp)
+            )
+
+        # invalid dates are parsed by dateutil
+        self.assertRaises(
+            ValueError, tools.parse_isotimestamp, "2016-02-30T12:00:00Z"
+        )
+
+    def test_split_isotimestamp_cache(self):
+        """Test split_isotimestamp() caches timestamps"""
+        tools.SPLIT_ISOTIMESTAMP_CACHE.clear()
+
+        result = tools.split_isotimestamp(constants.ISOTIMESTAMP_TESTDATE)
+        self.assertEqual(1, len(tools.SPLIT_ISOTIMESTAMP_CACHE))
+
+        # changing a result doesn't change the cached timestamp
+        result["year"] = "1999"
+        self.assertDictEqual(
+            constants.SPLIT_TIMESTAMP_TESTDATE,
+            tools.split_isotimestamp(constants.ISOTIMESTAMP_TESTDATE)
+        )
+        self.assertEqual(1, len(tools.SPLIT_ISOTIMESTAMP_CACHE))
+
     def test_split_datetime(self):
         """Test split_datetime()"""
         # error is thrown when called without parameters
@@ -154,6 +236,52 @@ class TestTools(unittest.TestCase):
             tools.split_datetime(timestamp_dt)
         )
 
+    def test_split_datetime_strftime(self):
+        """Test split_datetime() is equal to strftime() formatting"""
+        timestamps = get_random_datetimes(5000)
+
+        tools.SPLIT_DATETIME_CACHE.clear()
+        # second run uses cached values
+        for _ in range(2):
+            for timestamp in timestamps:
+                self.assertDictEqual(
+                    split_datetime_strftime(timestamp),
+                    tools.split_datetime(timestamp)
+                )
+
+        self.assertEqual(
+            tools.SPLIT_DATETIME_CACHE_SIZE, len(tools.SPLIT_DATETIME_CACHE)
+        )
+
+        # timezone aware, without timezone name
+        timestamp = datetime(2016, 1, 1, tzinfo=tzoffset(None, 3600))
+        self.assertRaises(TypeError, split_datetime_strftime, timestamp)
+        self.assertRaises(TypeError, tools.split_datetime, timestamp)
+
+    def test_split_timestamp_nano(self):
+        """Test split_timestamp_nano()"""
+        # error is thrown when called with an invalid parameter
+        self.assertRaises(TypeError, tools.split_timestamp_nano, None)
+        self.assertRaises(TypeError, tools.split_timestamp_nano, "string")
+        self.assertRaises(TypeError, tools.split_timestamp_nano, 1.5)
+
+        self.assertDictEqual(
+            constants.SPLIT_TIMESTAMP_EPOCH, tools.split_timestamp_nano(0)
+        )
+        self.assertDictEqual(
+            constants.SPLIT_TIMESTAMP_TESTDATE,
+            tools.split_timestamp_nano(constants.TIMESTAMP_NANO_TESTDATE)
+        )
+
+        # equal to splitting a Decimal timestamp
+        rnd = random.Random(42)
+        for _ in range(1000):
+            timestamp = rnd.randint(0, 4102444800 * 1000000000)
+            self.assertDictEqual(
+                tools.split_timestamp(nano2sec(timestamp)),
+                tools.split_timestamp_nano(timestamp)
+            )
+
     def test_nano2sec(self):
         """Test nano2sec()"""
         # error is thrown when called without parameters
@@ -178,6 +306,19 @@ class TestTools(unittest.TestCase):
             Decimal(123.456789123), nano2sec("123456789123"), 9
         )
 
+        # decimal context of the thread isn't changed
+        context = getcontext()
+        precision = context.prec
+        context.prec = 5
+        try:
+            self.assertEqual(
+                Decimal("1408282815.329854000"),
+                nano2sec(1408282815329854000)
+            )
+            self.assertEqual(5, getcontext().prec)
+        finally:
+            context.prec = precision
+
     def test_check_file(self):
         """Test check_file()"""
         # function should return false when file doesn't exist
@@ -23,16 +23,47 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 from __future__ import division
 from builtins import str
+from builtins import object
 import os
+import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from decimal import Decimal
-from decimal import getcontext
+from decimal import Context
 from numbers import Number
+from numbers import Integral
 from six import string_types
 from dateutil.parser import parse
 from dateutil.tz import tzutc
 from buildtimetrend import logger
 
+NANOSECONDS_PER_SECOND = 1000000000
+# decimal precision of nano2sec()
+NANO2SEC_CONTEXT = Context(prec=20)
+# epoch = 1 Jan 1970, without and with timezone info
+TZ_UTC = tzutc()
+EPOCH = datetime.utcfromtimestamp(0)
+EPOCH_UTC = EPOCH.replace(tzinfo=TZ_UTC)
+# ISO timestamp, in UTC or without timezone : YYYY-MM-DDTHH:MM:SS[.ffffff]
+ISOTIMESTAMP_REGEX = re.compile(
+    r"^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?"
+    r"(Z|[+-]00:?00)?$"
+)
+# english month and day names, like strftime() in the C locale
+MONTH_NAMES_EN = (
+    "January", "February", "March", "April", "May", "June", "July",
+    "August", "September", "October", "November", "December"
+)
+DAY_NAMES_EN = (
+    "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday",
+    "Sunday"
+)
+# maximum number of seconds in the split_datetime cache
+SPLIT_DATETIME_CACHE_SIZE = 4096
+# maximum number of timestamps in the split_isotimestamp cache
+SPLIT_ISOTIMESTAMP_CACHE_SIZE = 1024
+
 
 def format_timestamp(timestamp):
     """
@@ -65,7 +96,34 @@ def split_timestamp(timestamp):
     ts_seconds = int(timestamp)
     ts_microseconds = int((timestamp - ts_seconds) * 1000000)
     dt_utc = datetime.utcfromtimestamp(ts_seconds).replace(
-        tzinfo=tzutc(), microsecond=ts_microseconds
+        tzinfo=TZ_UTC, microsecond=ts_microseconds
+    )
+    return split_datetime(dt_utc)
+
+
+def split_timestamp_nano(timestamp):
+    """
+    Split a timestamp in nanoseconds in seperate components.
+
+    The timestamp is split with integer arithmetic, the result is equal
+    to split_timestamp(nano2sec(timestamp)).
+
+    Parameters :
+    - timestamp : timestamp, nanoseconds since epoch (integer)
+    """
+    if not isinstance(timestamp, Integral):
+        raise TypeError(
+            "param timestamp should be an integer {0!s}".format(
+                type(timestamp)
+            )
+        )
+
+    if timestamp < 0:
+        return split_timestamp(nano2sec(timestamp))
+
+    ts_seconds, ts_nanoseconds = divmod(timestamp, NANOSECONDS_PER_SECOND)
+    dt_utc = datetime.utcfromtimestamp(ts_seconds).replace(
+        tzinfo=TZ_UTC, microsecond=ts_nanoseconds // 1000
     )
     return split_datetime(dt_utc)
 
@@ -83,8 +141,45 @@ def split_isotimestamp(isotimestamp):
     - isotimestamp : timestamp in ISO format YYYY-MM-DDTHH:MM:SS
     """
     if is_string(isotimestamp, "isotimestamp"):
-        # use dateutil.parser.parse to parse the timestamp
-        return split_datetime(parse(isotimestamp, tzinfos={"UTC": +0}))
+        timestamp_dict = SPLIT_ISOTIMESTAMP_CACHE.get(isotimestamp)
+        if timestamp_dict is None:
+            timestamp_dict = split_datetime(parse_isotimestamp(isotimestamp))
+            SPLIT_ISOTIMESTAMP_CACHE.set(isotimestamp, timestamp_dict)
+
+        return dict(timestamp_dict)
+
+
+def parse_isotimestamp(isotimestamp):
+    """
+    Parse a ISO formatted timestamp, return a datetime instance.
+
+    Timestamps in UTC or without timezone, as formatted by Travis CI
+    and Keen.io (fe. 2016-01-01T12:00:00Z, 2016-01-01T12:00:00.123+00:00)
+    are parsed directly, other timestamps are parsed by dateutil.
+
+    Parameters :
+    - isotimestamp : timestamp in ISO format YYYY-MM-DDTHH:MM:SS
+    """
+    match = ISOTIMESTAMP_REGEX.match(isotimestamp)
+    if match is not None:
+        year, month, day, hour, minute, second, fraction, timezone = \
+            match.groups()
+        microsecond = 0
+        if fraction is not None:
+            microsecond = int(fraction[:6].ljust(6, "0"))
+
+        try:
+            return datetime(
+                int(year), int(month), int(day), int(hour), int(minute),
+                int(second), microsecond,
+                None if timezone is None else TZ_UTC
+            )
+        except ValueError:
+            # invalid date, let dateutil handle it
+            pass
+
+    # use dateutil.parser.parse to parse the timestamp
+    return parse(isotimestamp, tzinfos={"UTC": +0})
 
 
 def split_datetime(timestamp_datetime):
@@ -96,6 +191,9 @@ def split_datetime(timestamp_datetime):
       year, month, day of month, day of week,
       hour (12 and 24 hour), minute, second
 
+    Components that don't depend on the microseconds are cached
+    per second, neighbouring timestamps often share the same second.
+
     Parameters :
 
     - timestamp_datetime : timestamp in datetime class format
@@ -107,39 +205,163 @@ def split_datetime(timestamp_datetime):
             )
         )
 
-    timestamp_dict = {}
-    timestamp_dict["isotimestamp"] = timestamp_datetime.isoformat()
+    timezone = timestamp_datetime.tzname()
+    utcoffset = timestamp_datetime.utcoffset()
+    key = (
+        timestamp_datetime.year, timestamp_datetime.month,
+        timestamp_datetime.day, timestamp_datetime.hour,
+        timestamp_datetime.minute, timestamp_datetime.second,
+        timezone, utcoffset
+    )
 
-    # epoch = 1 Jan 1970
-    epoch = datetime.utcfromtimestamp(0)
-    # add timezone info to epoch if timestamp is timezone aware
-    if timestamp_datetime.tzname() is not None:
-        epoch = datetime.utcfromtimestamp(0).replace(tzinfo=tzutc())
+    second_dict = SPLIT_DATETIME_CACHE.get(key)
+    if second_dict is None:
+        second_dict = split_datetime_second(
+            timestamp_datetime, timezone, utcoffset
+        )
+        SPLIT_DATETIME_CACHE.set(key, second_dict)
 
+    timestamp_dict = dict(second_dict)
+    del timestamp_dict["epoch_seconds"]
+    timestamp_dict["isotimestamp"] = timestamp_datetime.isoformat()
     # seconds since epoch
-    timestamp_dict["timestamp_seconds"] = \
-        (timestamp_datetime - epoch).total_seconds()
-
-    timestamp_dict["year"] = timestamp_datetime.strftime("%Y")
-    timestamp_dict["month"] = timestamp_datetime.strftime("%m")
-    timestamp_dict["month_short_en"] = timestamp_datetime.strftime("%b")
-    timestamp_dict["month_full_en"] = timestamp_datetime.strftime("%B")
-    timestamp_dict["day_of_month"] = timestamp_datetime.strftime("%d")
-    timestamp_dict["day_of_week"] = timestamp_datetime.strftime("%w")
-    timestamp_dict["day_of_week_short_en"] = timestamp_datetime.strftime("%a")
-    timestamp_dict["day_of_week_full_en"] = timestamp_datetime.strftime("%A")
-    timestamp_dict["hour_12"] = timestamp_datetime.strftime("%I")
-    timestamp_dict["hour_ampm"] = timestamp_datetime.strftime("%p")
-    timestamp_dict["hour_24"] = timestamp_datetime.strftime("%H")
-    timestamp_dict["minute"] = timestamp_datetime.strftime("%M")
-    timestamp_dict["second"] = timestamp_datetime.strftime("%S")
-    timestamp_dict["microsecond"] = timestamp_datetime.strftime("%f")
-    timestamp_dict["timezone"] = timestamp_datetime.strftime("%Z")
-    timestamp_dict["timezone_offset"] = timestamp_datetime.strftime("%z")
+    timestamp_dict["timestamp_seconds"] = (
+        second_dict["epoch_seconds"] * 1000000 +
+        timestamp_datetime.microsecond
+    ) / 1000000
+    timestamp_dict["microsecond"] = \
+        "{0:06d}".format(timestamp_datetime.microsecond)
 
     return timestamp_dict
 
 
+def split_datetime_second(timestamp_datetime, timezone, utcoffset):
+    """
+    Split the components of a datetime timestamp, up to the second.
+
+    The components are equal to the strftime() formatted values
+    (in the C locale), the number of seconds since epoch is
+    added as epoch_seconds.
+
+    Parameters :
+    - timestamp_datetime : timestamp in datetime class format
+    - timezone : timezone name of the timestamp (tzname())
+    - utcoffset : offset to UTC of the timestamp (utcoffset())
+    """
+    # epoch = 1 Jan 1970,
+    # with timezone info if timestamp is timezone aware
+    epoch = EPOCH if timezone is None else EPOCH_UTC
+    delta = timestamp_datetime.replace(microsecond=0) - epoch
+
+    year = timestamp_datetime.year
+    month = timestamp_datetime.month
+    weekday = timestamp_datetime.weekday()
+    hour = timestamp_datetime.hour
+
+    return {
+        "epoch_seconds": delta.days * 86400 + delta.seconds,
+        "year": (
+            str(year) if year >= 1000 else timestamp_datetime.strftime("%Y")
+        ),
+        "month": "{0:02d}".format(month),
+        "month_short_en": MONTH_NAMES_EN[month - 1][:3],
+        "month_full_en": MONTH_NAMES_EN[month - 1],
+        "day_of_month": "{0:02d}".format(timestamp_datetime.day),
+        # 0 is Sunday
+        "day_of_week": str((weekday + 1) % 7),
+        "day_of_week_short_en": DAY_NAMES_EN[weekday][:3],
+        "day_of_week_full_en": DAY_NAMES_EN[weekday],
+        "hour_12": "{0:02d}".format(hour % 12 or 12),
+        "hour_ampm": "AM" if hour < 12 else "PM",
+        "hour_24": "{0:02d}".format(hour),
+        "minute": "{0:02d}".format(timestamp_datetime.minute),
+        "second": "{0:02d}".format(timestamp_datetime.second),
+        "timezone": timezone or "",
+        "timezone_offset": format_utcoffset(timestamp_datetime, utcoffset)
+    }
+
+
+def format_utcoffset(timestamp_datetime, utcoffset):
+    """
+    Format offset to UTC, as strftime("%z") : +HHMM or -HHMM.
+
+    Parameters :
+    - timestamp_datetime : timestamp in datetime class format
+    - utcoffset : offset to UTC of the timestamp (utcoffset())
+    """
+    if utcoffset is None:
+        return ""
+
+    offset_seconds = utcoffset.days * 86400 + utcoffset.seconds
+    # offset with seconds or microseconds is formatted differently
+    # depending on the Python version
+    if offset_seconds % 60 or utcoffset.microseconds:
+        return timestamp_datetime.strftime("%z")
+
+    sign = "-" if offset_seconds < 0 else "+"
+    offset_minutes = abs(offset_seconds) // 60
+    return "{0!s}{1:02d}{2:02d}".format(
+        sign, offset_minutes // 60, offset_minutes % 60
+    )
+
+
+class LRUCache(object):
+
+    """Thread safe cache, the least recently used item is removed first."""
+
+    def __init__(self, max_size):
+        """
+        Constructor.
+
+        Parameters :
+        - max_size : maximum number of cached items
+        """
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """Return number of cached items."""
+        return len(self.items)
+
+    def get(self, key):
+        """
+        Return a cached item, None if it isn't cached.
+
+        Parameters :
+        - key : item key
+        """
+        with self.lock:
+            value = self.items.pop(key, None)
+            if value is not None:
+                # mark as recently used
+                self.items[key] = value
+            return value
+
+    def set(self, key, value):
+        """
+        Cache an item, remove least recently used item if cache is full.
+
+        Parameters :
+        - key : item key
+        - value : item
+        """
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            if len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached items."""
+        with self.lock:
+            self.items.clear()
+
+
+SPLIT_DATETIME_CACHE = LRUCache(SPLIT_DATETIME_CACHE_SIZE)
+SPLIT_ISOTIMESTAMP_CACHE = LRUCache(SPLIT_ISOTIMESTAMP_CACHE_SIZE)
+
+
 def nano2sec(time):
     """
     Convert time from nanoseconds to seconds.
@@ -147,8 +369,10 @@ def nano2sec(time):
     Parameters:
     - time : time in nanoseconds
     """
-    getcontext().prec = 20
-    return Decimal(int(time)) / Decimal(1000000000)
+    # use a local context, changing the thread's context isn't thread safe
+    return NANO2SEC_CONTEXT.divide(
+        Decimal(int(time)), Decimal(NANOSECONDS_PER_SECOND)
+    )
 
 
 def check_file(filename):
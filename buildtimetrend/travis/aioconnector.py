@@ -0,0 +1,267 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Asynchronous connector to the Travis CI API, using asyncio.
+
+The requests are coroutines, so many builds and jobs can be retrieved
+concurrently by one event loop, without a thread per request.
+A minimal HTTP/1.0 client is built on asyncio streams,
+so no additional dependencies are needed. Connections are not kept
+alive : each request (and each redirect) opens a new TCP connection,
+and for https a new TLS session, which adds a round trip or more
+to the latency of every request.
+This module requires Python 3.5 or later.
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+import asyncio
+import io
+import json
+import ssl
+import tempfile
+from email.parser import BytesHeaderParser
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin, urlsplit
+from buildtimetrend import logger
+from buildtimetrend.tools import check_dict
+from buildtimetrend.travis.connector import BaseTravisConnector
+from buildtimetrend.travis.connector import TRAVIS_ORG_API_URL
+
+# maximum number of concurrent requests
+DEFAULT_MAX_CONNECTIONS = 20
+# timeout of a request, in seconds
+DEFAULT_TIMEOUT = 60
+# maximum number of redirects followed
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+# job logs smaller than this size (bytes) are kept in memory when received
+LOG_SPOOL_MAX_MEMORY = 1024 * 1024
+# size of the chunks (bytes) read from a response body
+CHUNK_SIZE = 64 * 1024
+
+
+class AsyncTravisConnector(BaseTravisConnector):
+
+    """
+    Base class to connect to Travis CI API asynchronously.
+
+    json_request() and download_job_log() are coroutines.
+    Responses are not cached, the travis_cache setting is not used.
+    """
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 timeout=DEFAULT_TIMEOUT):
+        """
+        Constructor.
+
+        Parameters:
+        - max_connections : maximum number of concurrent requests
+        - timeout : timeout of a request, in seconds
+        """
+        super(AsyncTravisConnector, self).__init__()
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._semaphore = None
+
+    async def download_job_log(self, job_id):
+        """
+        Retrieve Travis CI job log.
+
+        Returns a stream with the contents of the job log.
+        The job log is received in chunks and copied to a temporary file,
+        it is kept in memory if it is smaller than LOG_SPOOL_MAX_MEMORY.
+
+        Parameters:
+        - job_id : ID of the job to process
+        """
+        request = 'jobs/{}/log'.format(str(job_id))
+        logger.info("Request build job log #%s", str(job_id))
+        log_file = tempfile.SpooledTemporaryFile(LOG_SPOOL_MAX_MEMORY)
+        try:
+            await self._handle_request(request, output=log_file)
+        except BaseException:
+            log_file.close()
+            raise
+
+        log_file.seek(0)
+        return log_file
+
+    async def json_request(self, json_request):
+        """
+        Retrieve Travis CI data using API.
+
+        Parameters:
+        - json_request : json_request to be sent to API
+        """
+        result = await self._handle_request(
+            json_request,
+            {
+                'accept': 'application/vnd.travis-ci.2+json'
+            }
+        )
+
+        return json.loads(result.decode('utf-8'))
+
+    async def _handle_request(self, request, params=None, output=None):
+        """
+        Retrieve Travis CI data using API.
+
+        The number of concurrent requests is limited to max_connections.
+        Returns the body of the response (bytes), or None if it was
+        written to output.
+
+        Parameters:
+        - request : request to be sent to API
+        - params : HTTP request parameters
+        - output : file the body of the response is written to
+        """
+        request_url = self.api_url + request
+
+        request_params = self.request_params.copy()
+        if params is not None and check_dict(params, "params"):
+            request_params.update(params)
+
+        # semaphore is created when used, to bind it to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+
+        logger.info("Request from Travis CI API : %s", request_url)
+        async with self._semaphore:
+            return await asyncio.wait_for(
+                self._get(request_url, request_params, output), self.timeout
+            )
+
+    async def _get(self, url, headers, output=None):
+        """
+        Send a GET request, following redirects.
+
+        Raises HTTPError if the response has an error status code,
+        URLError if the connection fails.
+
+        Parameters:
+        - url : url of the request
+        - headers : dictionary with HTTP request headers
+        - output : file the body of a successful response is written to
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            status, reason, response_headers, body = \
+                await self._send_request(url, headers, output)
+
+            if status in REDIRECT_CODES and "location" in response_headers:
+                url = urljoin(url, response_headers["location"])
+                continue
+
+            if status >= 400:
+                raise HTTPError(
+                    url, status, reason, response_headers, io.BytesIO(body)
+                )
+
+            return body
+
+        raise HTTPError(url, status, "Too many redirects",
+                        response_headers, io.BytesIO(body))
+
+    async def _send_request(self, url, headers, output=None):
+        """
+        Send an HTTP/1.0 GET request and read the response.
+
+        Returns a tuple (status, reason, headers, body).
+        If output is set, the body of a successful response is written
+        to it in chunks of CHUNK_SIZE bytes, body is None.
+
+        Parameters:
+        - url : url of the request
+        - headers : dictionary with HTTP request headers
+        - output : file the body of a successful response is written to
+        """
+        url_parts = urlsplit(url)
+        use_ssl = url_parts.scheme == 'https'
+        port = url_parts.port or (443 if use_ssl else 80)
+        path = url_parts.path or '/'
+        if url_parts.query:
+            path += '?' + url_parts.query
+
+        try:
+            reader, writer = await asyncio.open_connection(
+                url_parts.hostname, port,
+                ssl=ssl.create_default_context() if use_ssl else None
+            )
+        except OSError as msg:
+            raise URLError(msg)
+
+        try:
+            request_lines = ['GET {} HTTP/1.0'.format(path)]
+            request_lines.append('host: {}'.format(url_parts.netloc))
+            for name, value in headers.items():
+                request_lines.append('{}: {}'.format(name, value))
+            writer.write(
+                ('\r\n'.join(request_lines) + '\r\n\r\n').encode('latin-1')
+            )
+
+            response_head = await reader.readuntil(b'\r\n\r\n')
+
+            status_line, _, header_lines = response_head.partition(b'\r\n')
+            # status line : HTTP-version status-code [reason]
+            status_parts = status_line.decode('latin-1').split(' ', 2)
+            reason = status_parts[2] if len(status_parts) > 2 else ''
+            try:
+                status = int(status_parts[1])
+            except (IndexError, ValueError):
+                raise URLError(
+                    "Invalid HTTP response : {}".format(status_line)
+                )
+
+            if output is not None and 200 <= status < 300:
+                # the body ends when the connection is closed (HTTP/1.0)
+                body = None
+                chunk = await reader.read(CHUNK_SIZE)
+                while chunk:
+                    output.write(chunk)
+                    chunk = await reader.read(CHUNK_SIZE)
+            else:
+                body = await reader.read()
+        except URLError:
+            raise
+        except (OSError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError) as msg:
+            raise URLError(msg)
+        finally:
+            writer.close()
+            # wait_closed() is available in Python 3.7 and later
+            if hasattr(writer, 'wait_closed'):
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    # connection was reset, the response was read
+                    pass
+
+        response_headers = BytesHeaderParser().parsebytes(header_lines)
+        return status, reason, response_headers, body
+
+
+class AsyncTravisOrgConnector(AsyncTravisConnector):
+
+    """Connects to Travis.org API asynchronously."""
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 timeout=DEFAULT_TIMEOUT):
+        """Constructor."""
+        super(AsyncTravisOrgConnector, self).__init__(
+            max_connections, timeout
+        )
+        self.api_url = TRAVIS_ORG_API_URL
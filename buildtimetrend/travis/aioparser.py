@@ -0,0 +1,193 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Gather build data from Travis CI asynchronously, using asyncio.
+
+Build and job data is retrieved with an AsyncTravisConnector,
+the jobs of a build are retrieved and parsed concurrently.
+This module requires Python 3.5 or later.
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+import asyncio
+import json
+from urllib.error import HTTPError, URLError
+from buildtimetrend import logger
+from buildtimetrend.buildjob import BuildJob
+from buildtimetrend.travis.aioconnector import AsyncTravisConnector
+from buildtimetrend.travis.aioconnector import AsyncTravisOrgConnector
+from buildtimetrend.travis.parser import BaseTravisData
+
+
+class AsyncTravisData(BaseTravisData):
+
+    """
+    Gather data from Travis CI using the API, asynchronously.
+
+    get_build_data(), process_build_job(), process_build_jobs(),
+    get_job_data() and parse_job_log() are coroutines.
+    Processing job data and parsing job logs is shared with TravisData
+    (see BaseTravisData).
+    """
+
+    def __init__(self, repo, build_id, connector=None):
+        """
+        Retrieve Travis CI build data using the API.
+
+        Parameters:
+        - repo : github repository slug (fe. buildtimetrend/python-lib)
+        - build_id : Travis CI build id (fe. 158)
+        - connector : AsyncTravisConnector instance
+        """
+        super(AsyncTravisData, self).__init__(repo, build_id, connector)
+        # use async Travis Org connector by default
+        if not isinstance(self.connector, AsyncTravisConnector):
+            self.connector = AsyncTravisOrgConnector()
+
+    async def get_build_data(self):
+        """
+        Retrieve Travis CI build data.
+
+        Returns true if retrieving data was succesful, false on error.
+        """
+        request = 'repos/{repo}/builds?number={build_id}'.format(
+            repo=self.repo, build_id=self.build_id
+        )
+        try:
+            self.builds_data = await self.connector.json_request(request)
+        except (HTTPError, URLError, asyncio.TimeoutError) as msg:
+            logger.error("Error getting build data from Travis CI: %s", msg)
+            return False
+
+        # log builds_data
+        logger.debug(
+            "Build #%s data : %s",
+            str(self.build_id),
+            json.dumps(self.builds_data, sort_keys=True, indent=2)
+        )
+
+        return True
+
+    async def process_build_jobs(self, workers=None):
+        """
+        Retrieve and parse Travis CI build jobs concurrently.
+
+        Each job is processed by a separate AsyncTravisData instance
+        (see create_job_parser()), the number of concurrent requests
+        is limited by the connector.
+        Returns a list of processed build jobs, in job order.
+
+        Parameters:
+        - workers : number of build jobs processed concurrently,
+                    not limited by default
+        """
+        if len(self.builds_data) == 0 or "builds" not in self.builds_data:
+            return []
+
+        semaphore = None
+        if workers is not None and workers > 0:
+            semaphore = asyncio.Semaphore(workers)
+
+        tasks = []
+        for build in self.builds_data['builds']:
+            if "job_ids" in build:
+                for job_id in build['job_ids']:
+                    tasks.append(self._process_job((build, job_id), semaphore))
+
+        build_jobs = []
+        for job_id, build_job in await asyncio.gather(*tasks):
+            if build_job is not None:
+                self.build_jobs[str(job_id)] = build_job
+            build_jobs.append(build_job)
+
+        return build_jobs
+
+    async def _process_job(self, job, semaphore=None):
+        """
+        Process a build job with a separate AsyncTravisData instance.
+
+        Returns a tuple (job_id, processed build job).
+
+        Parameters:
+        - job : tuple (build data, job ID)
+        - semaphore : asyncio.Semaphore limiting the concurrent build jobs
+        """
+        build, job_id = job
+        job_parser = self.create_job_parser(build)
+        if semaphore is None:
+            return job_id, await job_parser.process_build_job(job_id)
+
+        async with semaphore:
+            return job_id, await job_parser.process_build_job(job_id)
+
+    async def process_build_job(self, job_id):
+        """
+        Retrieve Travis CI build job data.
+
+        Parameters:
+        - job_id : ID of the job to process
+        """
+        if job_id is None:
+            return None
+
+        # retrieve job data from Travis CI
+        job_data = await self.get_job_data(job_id)
+        # process build/job data
+        self.process_job_data(job_data)
+        # parse Travis CI job log file
+        await self.parse_job_log(job_id)
+
+        # store build job
+        self.build_jobs[str(job_id)] = self.current_job
+        # create new build job instance
+        self.current_job = BuildJob()
+
+        # return processed build job
+        return self.build_jobs[str(job_id)]
+
+    async def get_job_data(self, job_id):
+        """
+        Retrieve Travis CI job data.
+
+        Parameters:
+        - job_id : ID of the job to process
+        """
+        request = 'jobs/{:s}'.format(str(job_id))
+        job_data = await self.connector.json_request(request)
+
+        # log job_data
+        logger.debug(
+            "Job #%s data : %s",
+            str(job_id),
+            json.dumps(job_data, sort_keys=True, indent=2)
+        )
+
+        return job_data
+
+    async def parse_job_log(self, job_id):
+        """
+        Parse Travis CI job log.
+
+        Parameters:
+        - job_id : ID of the job to process
+        """
+        job_log = await self.connector.download_job_log(job_id)
+        try:
+            self.parse_job_log_stream(job_log)
+        finally:
+            job_log.close()
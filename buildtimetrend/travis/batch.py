@@ -0,0 +1,218 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Parse many local Travis CI job log files with a pool of processes.
+
+Each worker process parses a log file with TravisData and returns
+a compact result (worker and stage tuples, timestamps in seconds)
+instead of a BuildJob instance, to keep pickling cheap.
+Results are returned in the order of the files.
+
+Usage : python -m buildtimetrend.travis.batch [-j <processes>] [-v] <files>
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import print_function
+from __future__ import division
+import sys
+import time
+import getopt
+import threading
+import multiprocessing
+from collections import namedtuple
+from buildtimetrend import logger
+from buildtimetrend.travis.connector import TravisOrgConnector
+from buildtimetrend.travis.parser import TravisData
+
+# job start time used to enable parsing Travis CI timing tags,
+# they were introduced on 2014-08-07
+TIMING_TAGS_STARTED_AT = "2014-08-08T00:00:00Z"
+# number of files sent to a worker process at once
+MAX_CHUNK_SIZE = 64
+
+# result of parsing a job log file, stages is None if it can't be read
+ParsedJobLog = namedtuple('ParsedJobLog', 'filename worker stages')
+# parsed stage, timestamps and duration in seconds
+ParsedStage = namedtuple(
+    'ParsedStage', 'name command started_at finished_at duration'
+)
+
+# connector shared by the parsers of a process
+_CONNECTOR = None
+_CONNECTOR_LOCK = threading.Lock()
+
+
+def get_connector():
+    """Return the Travis connector shared by the parsers of a process."""
+    global _CONNECTOR
+
+    with _CONNECTOR_LOCK:
+        if _CONNECTOR is None:
+            _CONNECTOR = TravisOrgConnector()
+
+        return _CONNECTOR
+
+
+def parse_log_file(filename):
+    """
+    Parse a Travis CI job log file, return a ParsedJobLog tuple.
+
+    Stages are None if the file doesn't exist or can't be read,
+    so other files of a batch are still parsed.
+
+    Parameters:
+    - filename : Travis CI job log file
+    """
+    travis_data = TravisData("", 0, get_connector())
+    # enable parsing timing tags
+    travis_data.current_job.set_started_at(TIMING_TAGS_STARTED_AT)
+
+    try:
+        if not travis_data.parse_job_log_file(filename):
+            return ParsedJobLog(filename, None, None)
+    except (IOError, OSError) as msg:
+        logger.error("Error reading job log file %s : %s", filename, msg)
+        return ParsedJobLog(filename, None, None)
+
+    stages = [
+        ParsedStage(
+            stage.name, stage.command, get_seconds(stage.started_at),
+            get_seconds(stage.finished_at), stage.duration
+        )
+        for stage in travis_data.current_job.stages.stage_list
+    ]
+
+    return ParsedJobLog(
+        filename, travis_data.current_job.get_property("worker"), stages
+    )
+
+
+def get_seconds(timestamp):
+    """
+    Return timestamp as float, None if it isn't set.
+
+    Parameters:
+    - timestamp : seconds since epoch
+    """
+    if timestamp is None:
+        return None
+
+    return float(timestamp)
+
+
+def parse_log_files(filenames, processes=None, chunk_size=None):
+    """
+    Parse Travis CI job log files with a pool of processes.
+
+    Method is a generator, iterate result to get a ParsedJobLog tuple
+    of each file, in the order of filenames.
+
+    Parameters:
+    - filenames : list of Travis CI job log files
+    - processes : number of worker processes, defaults to number of cpu's
+    - chunk_size : number of files sent to a worker at once
+    """
+    filenames = list(filenames)
+    if not filenames:
+        return
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(min(processes, len(filenames)), 1)
+
+    if chunk_size is None:
+        # a few chunks per process, to balance the load
+        chunk_size = min(
+            max(len(filenames) // (processes * 4), 1), MAX_CHUNK_SIZE
+        )
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap(parse_log_file, filenames, chunk_size):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main(argv):
+    """
+    Parse log files given as command line arguments, print results.
+
+    Returns exit code : 0 if all files were parsed, 1 otherwise.
+
+    Parameters:
+    - argv : command line arguments
+    """
+    usage_string = '{0!s} -h -v -j <processes> <log files>'.format(argv[0])
+
+    try:
+        opts, filenames = getopt.getopt(
+            argv[1:], "hvj:", ["help", "verbose", "jobs="]
+        )
+    except getopt.GetoptError:
+        print(usage_string)
+        return 1
+
+    processes = None
+    verbose = False
+    for opt, arg in opts:
+        if opt in ('-h', "--help"):
+            print(usage_string)
+            return 0
+        elif opt in ('-v', "--verbose"):
+            verbose = True
+        elif opt in ('-j', "--jobs"):
+            processes = int(arg)
+
+    start = time.time()
+    failed = 0
+
+    for result in parse_log_files(filenames, processes):
+        if result.stages is None:
+            failed += 1
+            print("{0!s} : can't be read".format(result.filename))
+            continue
+
+        print("{0!s} : {1:d} stages, duration {2:.3f}s".format(
+            result.filename,
+            len(result.stages),
+            sum(stage.duration for stage in result.stages)
+        ))
+        if verbose:
+            for stage in result.stages:
+                print("  Substage {0!s}, duration {1!s}s, "
+                      "command : {2!s}".format(
+                          stage.name, stage.duration, stage.command
+                      ))
+
+    duration = time.time() - start
+    print(
+        "Parsed {0:d} files in {1:.2f}s ({2:.1f} files/s)".format(
+            len(filenames), duration,
+            len(filenames) / duration if duration > 0 else 0
+        ),
+        file=sys.stderr
+    )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,346 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+On-disk cache of Travis CI API responses.
+
+Responses (build and job data, job logs) are stored compressed,
+keyed by request url, with their ETag and Last-Modified headers,
+so a cached response can be revalidated with a conditional request,
+or used without contacting the API if it is final (a response of finished
+builds and jobs, that doesn't change anymore).
+The least recently used responses are removed when the size of the cache
+exceeds the maximum size.
+The cache is enabled with the travis_cache setting.
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from builtins import object
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from buildtimetrend import logger
+from buildtimetrend.settings import Settings
+
+# extensions of the cached response and its metadata
+CACHE_DATA_EXTENSION = '.gz'
+CACHE_META_EXTENSION = '.json'
+# number of bytes copied at once when storing a response stream
+CACHE_CHUNK_SIZE = 64 * 1024
+
+
+def get_response_cache():
+    """
+    Return a ResponseCache instance if the Travis CI cache is enabled.
+
+    The cache is configured with the travis_cache setting :
+    - enabled : enable cache
+    - path : cache directory
+    - max_size : maximum size of the cache, in MB
+    - revalidate : revalidate cached responses with a conditional request
+    """
+    cache_settings = Settings().get_setting("travis_cache")
+
+    if not cache_settings or not cache_settings.get("enabled"):
+        return None
+
+    return ResponseCache(
+        cache_settings.get("path"),
+        int(cache_settings.get("max_size", 0)) * 1024 * 1024,
+        cache_settings.get("revalidate", True)
+    )
+
+
+class ResponseCache(object):
+
+    """
+    Size-bounded on-disk cache of Travis CI API responses.
+
+    Each response is stored in a gzip compressed file,
+    with a json file containing the request url, ETag and Last-Modified
+    headers, and if the response is final. The modification time
+    of the metadata file is updated when a response is used,
+    least recently used responses are removed first.
+    """
+
+    def __init__(self, path, max_size=0, revalidate=True):
+        """
+        Constructor.
+
+        Parameters:
+        - path : cache directory
+        - max_size : maximum size of the cache (bytes), 0 means unlimited
+        - revalidate : revalidate cached responses with a conditional request,
+                       responses that aren't final are always revalidated
+        """
+        self.path = path
+        self.max_size = max_size
+        self.revalidate = revalidate
+        # cache entries (key : size), least recently used first
+        self._entries = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_key(self, url):
+        """
+        Return cache key of a request url.
+
+        Parameters:
+        - url : request url
+        """
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def get_filename(self, key, extension=CACHE_DATA_EXTENSION):
+        """
+        Return filename of a cache entry.
+
+        Parameters:
+        - key : cache key
+        - extension : file extension
+        """
+        return os.path.join(self.path, key + extension)
+
+    def get(self, url):
+        """
+        Return metadata of a cached response, None if it isn't cached.
+
+        Metadata is a dictionary with the request url, etag,
+        last_modified, final and size of the response.
+
+        Parameters:
+        - url : request url
+        """
+        key = self.get_key(url)
+
+        with self._lock:
+            entries = self._load_entries()
+            if key not in entries:
+                return None
+
+            try:
+                with open(self.get_filename(key, CACHE_META_EXTENSION)) \
+                        as meta_file:
+                    metadata = json.load(meta_file)
+                # mark as recently used
+                os.utime(self.get_filename(key, CACHE_META_EXTENSION), None)
+            except (IOError, OSError, ValueError) as msg:
+                logger.warning("Error reading Travis CI cache : %s", msg)
+                self._remove_entry(key)
+                return None
+
+            del entries[key]
+            entries[key] = metadata["size"]
+
+        return metadata
+
+    def open(self, url):
+        """
+        Open the cached response of a request, returns a stream.
+
+        The file is opened while the cache is locked, so it can't be
+        removed in between, an opened file can be read after it is removed.
+        Returns None if the response isn't cached or can't be opened.
+
+        Parameters:
+        - url : request url
+        """
+        key = self.get_key(url)
+
+        with self._lock:
+            if key not in self._load_entries():
+                return None
+
+            try:
+                return gzip.open(self.get_filename(key), 'rb')
+            except (IOError, OSError) as msg:
+                logger.warning("Error opening Travis CI cache : %s", msg)
+                self._remove_entry(key)
+                return None
+
+    def read(self, url):
+        """
+        Return the cached response of a request, as bytes.
+
+        Returns None if the response isn't cached.
+
+        Parameters:
+        - url : request url
+        """
+        cache_file = self.open(url)
+        if cache_file is None:
+            return None
+
+        with cache_file:
+            return cache_file.read()
+
+    def store(self, url, stream, etag=None, last_modified=None,
+              final=False):
+        """
+        Store a response in the cache.
+
+        The response is copied in chunks, so a large response doesn't
+        have to fit in memory. Least recently used responses are removed
+        if the cache exceeds the maximum size.
+
+        Parameters:
+        - url : request url
+        - stream : response stream, supporting read()
+        - etag : ETag header of the response
+        - last_modified : Last-Modified header of the response
+        - final : response doesn't change anymore (finished build or job)
+        """
+        key = self.get_key(url)
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        # write to a temporary file, rename when complete
+        handle, temp_filename = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                with gzip.GzipFile(fileobj=temp_file, mode='wb') \
+                        as cache_file:
+                    while True:
+                        chunk = stream.read(CACHE_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        cache_file.write(chunk)
+            size = os.path.getsize(temp_filename)
+            metadata = {
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "final": final,
+                "size": size
+            }
+
+            with self._lock:
+                entries = self._load_entries()
+                if key in entries:
+                    self._remove_entry(key)
+
+                os.rename(temp_filename, self.get_filename(key))
+                with open(self.get_filename(key, CACHE_META_EXTENSION),
+                          'w') as meta_file:
+                    json.dump(metadata, meta_file)
+
+                entries[key] = size
+                self._size += size
+                self._evict()
+        finally:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+
+        return metadata
+
+    def set_final(self, url):
+        """
+        Mark a cached response as final, it doesn't change anymore.
+
+        Returns false if the response isn't cached.
+
+        Parameters:
+        - url : request url
+        """
+        key = self.get_key(url)
+        meta_filename = self.get_filename(key, CACHE_META_EXTENSION)
+
+        with self._lock:
+            if key not in self._load_entries():
+                return False
+
+            try:
+                with open(meta_filename) as meta_file:
+                    metadata = json.load(meta_file)
+                if not metadata.get("final"):
+                    metadata["final"] = True
+                    with open(meta_filename, 'w') as meta_file:
+                        json.dump(metadata, meta_file)
+            except (IOError, OSError, ValueError) as msg:
+                logger.warning("Error updating Travis CI cache : %s", msg)
+                self._remove_entry(key)
+                return False
+
+        return True
+
+    def get_size(self):
+        """Return size of the cached responses, in bytes."""
+        with self._lock:
+            self._load_entries()
+            return self._size
+
+    def _load_entries(self):
+        """
+        Load cache entries from the cache directory.
+
+        Entries are sorted by modification time of their metadata file,
+        least recently used first.
+        """
+        if self._entries is not None:
+            return self._entries
+
+        entries = []
+        if os.path.isdir(self.path):
+            for filename in os.listdir(self.path):
+                key, extension = os.path.splitext(filename)
+                if extension != CACHE_META_EXTENSION:
+                    continue
+
+                try:
+                    entries.append((
+                        os.path.getmtime(os.path.join(self.path, filename)),
+                        key,
+                        os.path.getsize(self.get_filename(key))
+                    ))
+                except OSError:
+                    continue
+
+        self._entries = OrderedDict(
+            (key, size) for _, key, size in sorted(entries)
+        )
+        self._size = sum(self._entries.values())
+        return self._entries
+
+    def _remove_entry(self, key):
+        """
+        Remove a cache entry.
+
+        Parameters:
+        - key : cache key
+        """
+        if key in self._entries:
+            self._size -= self._entries.pop(key)
+
+        for extension in (CACHE_DATA_EXTENSION, CACHE_META_EXTENSION):
+            try:
+                os.remove(self.get_filename(key, extension))
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Remove least recently used entries exceeding the maximum size."""
+        if not self.max_size:
+            return
+
+        while self._size > self.max_size and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            logger.debug("Remove %s from Travis CI cache", key)
+            self._remove_entry(key)
@@ -21,24 +21,100 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 from builtins import str
-import codecs
+import io
 import json
+import requests
+from requests.adapters import HTTPAdapter
 from buildtimetrend import logger
 from buildtimetrend.tools import check_dict
+from buildtimetrend.tools import is_list
+from buildtimetrend.travis.cache import get_response_cache
 import buildtimetrend
+try:
+    from urllib3.util.retry import Retry
+except ImportError:
+    # urllib3 vendored by older versions of requests
+    from requests.packages.urllib3.util.retry import Retry
 try:
     # For Python 3.0 and later
-    from urllib.request import Request, build_opener
+    from urllib.error import HTTPError, URLError
 except ImportError:
     # Fall back to Python 2's urllib2
-    from urllib2 import Request, build_opener
+    from urllib2 import HTTPError, URLError
 
 TRAVIS_ORG_API_URL = 'https://api.travis-ci.org/'
+# number of connections kept alive in the connection pool
+DEFAULT_POOL_SIZE = 10
+# connect and read timeout, in seconds
+DEFAULT_TIMEOUT = (10, 60)
+# number of retries of a failed request, and backoff factor (seconds) :
+# delay before each retry is backoff_factor * 2 ** (retry number - 1)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+# HTTP response codes of requests that are retried
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# states of finished builds and jobs
+FINISHED_STATES = ("passed", "failed", "errored", "canceled")
+
+
+def skip_bytes(stream, count, chunk_size=64 * 1024):
+    """
+    Read and discard the first bytes of a stream.
+
+    Parameters:
+    - stream : stream, supporting read()
+    - count : number of bytes to skip
+    - chunk_size : number of bytes read at once
+    """
+    while count > 0:
+        chunk = stream.read(min(count, chunk_size))
+        if not chunk:
+            break
+        count -= len(chunk)
+
+
+def is_finished(data):
+    """
+    Check if build or job data describes a finished build or job.
+
+    Parameters:
+    - data : dictionary with build or job data
+    """
+    return check_dict(data) and data.get("finished_at") is not None and \
+        data.get("state") in FINISHED_STATES
+
+
+def is_finished_response(data):
+    """
+    Check if all builds and jobs in a Travis CI API response are finished.
 
+    Returns false if the response contains no builds or jobs.
 
-class TravisConnector(object):
+    Parameters:
+    - data : dictionary with a Travis CI API response
+    """
+    if not check_dict(data):
+        return False
 
-    """Base class to connect to Travis CI API."""
+    items = [data[name] for name in ("build", "job") if name in data]
+    for name in ("builds", "jobs"):
+        if name in data:
+            if not is_list(data[name]):
+                return False
+            items.extend(data[name])
+
+    return len(items) > 0 and all(is_finished(item) for item in items)
+
+
+class BaseTravisConnector(object):
+
+    """
+    Base class of connectors to Travis CI API.
+
+    It holds the API url and the HTTP request headers, requests are sent
+    by subclasses, synchronously (TravisConnector) or asynchronously
+    (travis.aioconnector.AsyncTravisConnector).
+    """
 
     def __init__(self):
         """Constructor."""
@@ -47,16 +123,111 @@ class TravisConnector(object):
             'user-agent': buildtimetrend.USER_AGENT
         }
 
+
+class TravisConnector(BaseTravisConnector):
+
+    """
+    Base class to connect to Travis CI API.
+
+    Requests share a session with a pool of keep-alive connections,
+    failed requests (connection errors and responses with
+    a status code in RETRY_STATUS_CODES) are retried with backoff.
+    If the travis_cache setting is enabled, responses are cached
+    (see travis.cache). Responses of builds or jobs that are not finished
+    are always revalidated, job logs are only cached if the job is known
+    to be finished (its job data was retrieved with this connector).
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR):
+        """
+        Constructor.
+
+        Parameters:
+        - pool_size : number of connections kept alive per host
+        - timeout : request timeout in seconds,
+                    or a tuple (connect timeout, read timeout)
+        - retries : number of retries of a failed request
+        - backoff_factor : factor of the delay between retries, in seconds
+        """
+        super(TravisConnector, self).__init__()
+        self.timeout = timeout
+        self.cache = get_response_cache()
+        # IDs of finished jobs, their job logs don't change anymore
+        self.finished_jobs = set()
+        self.session = requests.Session()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
     def download_job_log(self, job_id):
         """
         Retrieve Travis CI job log.
 
+        Returns a stream with the contents of the job log,
+        the connection is returned to the pool when the stream is read.
+
         Parameters:
         - job_id : ID of the job to process
         """
         request = 'jobs/{}/log'.format(str(job_id))
         logger.info("Request build job log #%s", str(job_id))
-        return self._handle_request(request)
+        # the log of a running job grows, it isn't cached
+        if self.cache is not None and str(job_id) in self.finished_jobs:
+            return self._cached_request(request, final=True)
+
+        response = self._handle_request(request, stream=True)
+        # decode compressed content when reading the stream
+        response.raw.decode_content = True
+        return response.raw
+
+    def download_job_log_part(self, job_id, offset=0):
+        """
+        Retrieve the part of a Travis CI job log after offset.
+
+        The log of a running job grows, so the response cache isn't used.
+        The part is requested with a Range header, if the API ignores it
+        and returns the complete log, the first offset bytes are skipped.
+        Returns a stream with the contents of the job log after offset,
+        it is empty if the log didn't grow.
+
+        Parameters:
+        - job_id : ID of the job to process
+        - offset : number of bytes of the job log that were received before
+        """
+        request = 'jobs/{}/log'.format(str(job_id))
+        logger.debug(
+            "Request build job log #%s from byte %d", str(job_id), offset
+        )
+        # ranges apply to the content as sent, request uncompressed content
+        params = {'accept-encoding': 'identity'}
+        if offset > 0:
+            params['range'] = 'bytes={:d}-'.format(offset)
+
+        try:
+            response = self._handle_request(request, params, stream=True)
+        except HTTPError as msg:
+            # range starts at the end of the log : no new content
+            if msg.code == 416:
+                return io.BytesIO()
+            raise
+
+        if offset > 0 and response.status_code != 206:
+            skip_bytes(response.raw, offset)
+
+        return response.raw
 
     def json_request(self, json_request):
         """
@@ -65,23 +236,121 @@ class TravisConnector(object):
         Parameters:
         - json_request : json_request to be sent to API
         """
-        result = self._handle_request(
-            json_request,
-            {
-                'accept': 'application/vnd.travis-ci.2+json'
-            }
-        )
+        params = {
+            'accept': 'application/vnd.travis-ci.2+json'
+        }
+
+        if self.cache is not None:
+            with self._cached_request(json_request, params) as result:
+                data = json.loads(result.read().decode('utf-8'))
+
+            # a list of builds is only final if it is a specific build
+            if is_finished_response(data) and \
+                    ("builds" not in data or "number=" in json_request):
+                self.cache.set_final(self.api_url + json_request)
+        else:
+            result = self._handle_request(json_request, params)
+            data = json.loads(result.content.decode('utf-8'))
+
+        self.add_finished_jobs(data)
+        return data
+
+    def add_finished_jobs(self, data):
+        """
+        Register the finished jobs of a Travis CI API response.
+
+        Parameters:
+        - data : dictionary with a Travis CI API response
+        """
+        if not check_dict(data):
+            return
+
+        jobs = [data["job"]] if "job" in data else []
+        if is_list(data.get("jobs")):
+            jobs.extend(data["jobs"])
+
+        for job in jobs:
+            if is_finished(job) and "id" in job:
+                self.finished_jobs.add(str(job["id"]))
+
+    def _cached_request(self, request, params=None, final=False):
+        """
+        Retrieve Travis CI data using the response cache.
+
+        A cached response is revalidated with a conditional request
+        (using its ETag and Last-Modified headers) if the cache is set
+        to revalidate or if the response isn't final, otherwise it is used
+        without contacting the API.
+        If the cached response was removed by another thread or process
+        before it was opened, the request is sent without using the cache.
+        Returns a stream with the (cached) response.
+
+        Parameters:
+        - request : request to be sent to API
+        - params : HTTP request parameters
+        - final : response doesn't change anymore (finished build or job)
+        """
+        request_url = self.api_url + request
+        cached = self.cache.get(request_url)
+
+        if cached is not None and cached.get("final") and \
+                not self.cache.revalidate:
+            logger.info("Use cached Travis CI response : %s", request_url)
+            cache_file = self.cache.open(request_url)
+            if cache_file is not None:
+                return cache_file
+            cached = None
+
+        request_params = {}
+        if params is not None and check_dict(params, "params"):
+            request_params.update(params)
+        if cached is not None:
+            if cached["etag"]:
+                request_params["if-none-match"] = cached["etag"]
+            if cached["last_modified"]:
+                request_params["if-modified-since"] = cached["last_modified"]
+
+        response = self._handle_request(request, request_params, stream=True)
 
-        reader = codecs.getreader('utf-8')
-        return json.load(reader(result))
+        if cached is not None and response.status_code == 304:
+            logger.info("Cached Travis CI response is valid : %s", request_url)
+            response.close()
+            if final:
+                self.cache.set_final(request_url)
+        else:
+            # decode compressed content when reading the stream
+            response.raw.decode_content = True
+            self.cache.store(
+                request_url,
+                response.raw,
+                response.headers.get("etag"),
+                response.headers.get("last-modified"),
+                final
+            )
+            response.close()
 
-    def _handle_request(self, request, params=None):
+        cache_file = self.cache.open(request_url)
+        if cache_file is not None:
+            return cache_file
+
+        logger.warning(
+            "Travis CI response was removed from cache : %s", request_url
+        )
+        response = self._handle_request(request, params, stream=True)
+        response.raw.decode_content = True
+        return response.raw
+
+    def _handle_request(self, request, params=None, stream=False):
         """
         Retrieve Travis CI data using API.
 
+        Raises HTTPError if the response has an error status code,
+        URLError if the connection fails, like urllib does.
+
         Parameters:
         - request : request to be sent to API
         - params : HTTP request parameters
+        - stream : don't read the response content immediately
         """
         request_url = self.api_url + request
 
@@ -89,21 +358,36 @@ class TravisConnector(object):
         if params is not None and check_dict(params, "params"):
             request_params.update(params)
 
-        req = Request(
-            request_url,
-            None,
-            request_params
-        )
-        opener = build_opener()
         logger.info("Request from Travis CI API : %s", request_url)
-        return opener.open(req)
+        try:
+            response = self.session.get(
+                request_url,
+                headers=request_params,
+                timeout=self.timeout,
+                stream=stream
+            )
+        except requests.RequestException as msg:
+            raise URLError(msg)
+
+        if response.status_code >= 400:
+            response.close()
+            raise HTTPError(
+                request_url, response.status_code, response.reason,
+                response.headers, None
+            )
+
+        return response
 
 
 class TravisOrgConnector(TravisConnector):
 
     """Connects to Travis.org API."""
 
-    def __init__(self):
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR):
         """Constructor."""
-        super(TravisOrgConnector, self).__init__()
+        super(TravisOrgConnector, self).__init__(
+            pool_size, timeout, retries, backoff_factor
+        )
         self.api_url = TRAVIS_ORG_API_URL
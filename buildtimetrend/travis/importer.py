@@ -0,0 +1,256 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Import a range of Travis CI builds of a repo (backfill).
+
+Builds are retrieved and parsed with TravisData by a pool of threads,
+the start of each build is spaced by the multi_import delay setting,
+the number of builds processed in one run is limited by the
+multi_import max_builds setting.
+Progress is saved to a state file after each build,
+so an interrupted import can be resumed.
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from builtins import str
+from builtins import object
+import os
+import json
+import time
+import tempfile
+import threading
+from multiprocessing.pool import ThreadPool
+from buildtimetrend import logger
+from buildtimetrend import keenio
+from buildtimetrend.settings import Settings
+from buildtimetrend.service import get_repo_data_detail
+from buildtimetrend.travis.connector import TravisOrgConnector
+from buildtimetrend.travis.parser import TravisData
+
+# number of builds processed concurrently
+DEFAULT_IMPORT_WORKERS = 4
+
+
+class BuildImporter(object):
+
+    """
+    Import a range of Travis CI builds of a repo.
+
+    Builds that were imported before (according to the state file)
+    or that exist in the Keen.io database (retrieved with one query)
+    are skipped.
+    """
+
+    def __init__(self, repo, first_build, last_build, state_file=None,
+                 connector=None, workers=DEFAULT_IMPORT_WORKERS):
+        """
+        Constructor.
+
+        Parameters:
+        - repo : github repository slug (fe. buildtimetrend/python-lib)
+        - first_build : number of the first build to import
+        - last_build : number of the last build to import
+        - state_file : file to save progress, no progress is saved if None
+        - connector : Travis Connector instance, shared by all builds,
+                      a TravisOrgConnector is created by default
+        - workers : number of builds processed concurrently
+        """
+        self.repo = repo
+        self.builds = [
+            str(build)
+            for build in range(int(first_build), int(last_build) + 1)
+        ]
+        self.state_file = state_file
+        self.connector = connector or TravisOrgConnector()
+        self.workers = max(int(workers), 1)
+
+        multi_import = Settings().get_setting("multi_import")
+        self.max_builds = multi_import["max_builds"]
+        self.delay = multi_import["delay"]
+
+        # imported and failed builds
+        self.state = {"repo": repo, "imported": [], "failed": []}
+        self.load_state()
+
+        self._lock = threading.Lock()
+        self._next_start = 0
+
+    def load_state(self):
+        """Load progress of a previous import from the state file."""
+        if self.state_file is None or not os.path.isfile(self.state_file):
+            return
+
+        with open(self.state_file, 'r') as state_file:
+            state = json.load(state_file)
+
+        if state.get("repo") != self.repo:
+            logger.warning(
+                "State file %s belongs to repo %s, it is ignored",
+                self.state_file, state.get("repo")
+            )
+            return
+
+        self.state["imported"] = state.get("imported", [])
+        self.state["failed"] = state.get("failed", [])
+
+    def save_state(self):
+        """Save progress to the state file."""
+        if self.state_file is None:
+            return
+
+        # write to a temporary file, rename when complete
+        state_dir = os.path.dirname(os.path.abspath(self.state_file))
+        handle, temp_filename = tempfile.mkstemp(dir=state_dir)
+        with os.fdopen(handle, 'w') as state_file:
+            json.dump(self.state, state_file, sort_keys=True, indent=2)
+        os.rename(temp_filename, self.state_file)
+
+    def get_known_builds(self):
+        """
+        Return set of builds that don't need to be imported.
+
+        Builds imported before and builds that exist in Keen.io
+        (if Keen.io is readable) are known.
+        """
+        known_builds = set(self.state["imported"])
+
+        if keenio.is_readable():
+            try:
+                known_builds.update(keenio.get_build_ids(self.repo))
+            except SystemError as msg:
+                logger.warning("Builds in Keen.io can't be checked : %s", msg)
+
+        return known_builds
+
+    def get_pending_builds(self):
+        """Return list of builds that are not imported yet."""
+        known_builds = self.get_known_builds()
+
+        return [build for build in self.builds if build not in known_builds]
+
+    def run(self):
+        """
+        Import builds, at most max_builds in one run.
+
+        Returns a dictionary with the number of imported and failed builds,
+        skipped builds (imported before) and remaining builds
+        (exceeding max_builds, to be imported in a next run).
+        """
+        pending_builds = self.get_pending_builds()
+        batch = pending_builds
+        if self.max_builds:
+            batch = pending_builds[:self.max_builds]
+
+        result = {
+            "imported": 0,
+            "failed": 0,
+            "skipped": len(self.builds) - len(pending_builds),
+            "remaining": len(pending_builds) - len(batch)
+        }
+
+        if not batch:
+            return result
+
+        logger.info("Import %d builds of %s", len(batch), self.repo)
+
+        pool = ThreadPool(min(self.workers, len(batch)))
+        try:
+            for build, success in pool.imap_unordered(
+                    self._import_build, batch
+            ):
+                self._update_state(build, success)
+                result["imported" if success else "failed"] += 1
+        finally:
+            pool.terminate()
+
+        return result
+
+    def import_build(self, build):
+        """
+        Retrieve, parse and store all jobs of a build.
+
+        Returns true if the build was imported succesfully.
+
+        Parameters:
+        - build : build number
+        """
+        travis_data = TravisData(self.repo, build, self.connector)
+
+        if not travis_data.get_build_data():
+            return False
+
+        data_detail = get_repo_data_detail(self.repo)
+        for build_job in travis_data.process_build_jobs():
+            self.store_build_job(build_job, data_detail)
+
+        return True
+
+    def store_build_job(self, build_job, data_detail):
+        """
+        Store a build job in Keen.io.
+
+        Parameters:
+        - build_job : BuildJob instance
+        - data_detail : Data storage detail level
+        """
+        keenio.send_build_data_service(build_job, data_detail)
+
+    def wait_for_start(self):
+        """Wait until the next build can be started (rate limit)."""
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next_start)
+            self._next_start = start + self.delay
+
+        if start > now:
+            time.sleep(start - now)
+
+    def _import_build(self, build):
+        """
+        Import a build, catching errors.
+
+        Returns a tuple (build, success).
+
+        Parameters:
+        - build : build number
+        """
+        self.wait_for_start()
+
+        try:
+            return build, self.import_build(build)
+        except Exception as msg:
+            logger.error("Error importing build #%s : %s", build, msg)
+            return build, False
+
+    def _update_state(self, build, success):
+        """
+        Add build to imported or failed builds and save state.
+
+        Parameters:
+        - build : build number
+        - success : true if build was imported succesfully
+        """
+        if build in self.state["failed"]:
+            self.state["failed"].remove(build)
+
+        if success:
+            self.state["imported"].append(build)
+        else:
+            self.state["failed"].append(build)
+
+        self.save_state()
@@ -0,0 +1,366 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Read Travis CI job logs, returning only the lines containing Travis CI tags.
+
+Most lines of a Travis CI job log are build output that is ignored
+by the parser. The log is scanned as bytes for the tag markers,
+only the lines containing a marker are decoded.
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from builtins import object
+import mmap
+from buildtimetrend import logger
+
+# markers of lines with Travis CI timing tags and worker tag
+TRAVIS_LOG_MARKER_TIMING = b'travis_'
+TRAVIS_LOG_MARKER_WORKER = b'Using worker:'
+TRAVIS_LOG_MARKERS = [TRAVIS_LOG_MARKER_TIMING, TRAVIS_LOG_MARKER_WORKER]
+# number of bytes read from a job log stream at once
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# maximum length of a line (bytes), longer lines are skipped or truncated
+DEFAULT_MAX_LINE_LENGTH = 64 * 1024
+# number of bytes of a memory mapped job log scanned at once
+DEFAULT_MMAP_WINDOW = 4 * 1024 * 1024
+
+
+def get_markers(timing_tags=True):
+    """
+    Return list of markers of lines that should be parsed.
+
+    Parameters:
+    - timing_tags : include marker of Travis CI timing tags
+    """
+    if timing_tags:
+        return TRAVIS_LOG_MARKERS
+
+    return [TRAVIS_LOG_MARKER_WORKER]
+
+
+def decode_line(line):
+    """
+    Decode a job log line to str.
+
+    Invalid UTF-8 characters are replaced instead of raising an error.
+
+    Parameters:
+    - line : line of a job log, as bytes
+    """
+    return line.decode('utf-8', 'replace')
+
+
+def find_tagged_lines(buffer, markers=None, start=0, end=None):
+    """
+    Find lines containing a marker in a buffer.
+
+    The buffer (bytes or mmap) is searched for the markers with find(),
+    the text between the lines containing a marker is skipped.
+    The buffer between start and end is considered to contain only
+    complete lines.
+    The method is a generator, it returns the position (start, end)
+    of each line that contains a marker, end includes the newline.
+
+    Parameters:
+    - buffer : bytes like object supporting find() and rfind()
+    - markers : list of markers (bytes), defaults to TRAVIS_LOG_MARKERS
+    - start : position in buffer to start searching
+    - end : position in buffer to end searching, defaults to end of buffer
+    """
+    if markers is None:
+        markers = TRAVIS_LOG_MARKERS
+    if end is None:
+        end = len(buffer)
+
+    # position of next occurence of each marker
+    positions = {}
+    for marker in markers:
+        position = buffer.find(marker, start, end)
+        if position >= 0:
+            positions[marker] = position
+
+    while positions:
+        marker_position = min(positions.values())
+
+        line_start = buffer.rfind(b'\n', start, marker_position) + 1
+        if line_start < start:
+            line_start = start
+        line_end = buffer.find(b'\n', marker_position, end) + 1
+        if line_end <= 0:
+            line_end = end
+
+        yield line_start, line_end
+
+        # find next occurence of markers after this line
+        for marker, position in list(positions.items()):
+            if position < line_end:
+                position = buffer.find(marker, line_end, end)
+                if position >= 0:
+                    positions[marker] = position
+                else:
+                    del positions[marker]
+
+
+def find_first_marker(buffer, markers=None):
+    """
+    Return position of the first marker in a buffer, -1 if none is found.
+
+    Parameters:
+    - buffer : bytes like object supporting find()
+    - markers : list of markers (bytes), defaults to TRAVIS_LOG_MARKERS
+    """
+    if markers is None:
+        markers = TRAVIS_LOG_MARKERS
+
+    positions = [buffer.find(marker) for marker in markers]
+    positions = [position for position in positions if position >= 0]
+
+    if positions:
+        return min(positions)
+
+    return -1
+
+
+def truncate_line(line, markers=None,
+                  max_line_length=DEFAULT_MAX_LINE_LENGTH):
+    """
+    Truncate an incomplete line that exceeds the maximum line length.
+
+    The line (a bytearray) is truncated in place :
+    - without markers, the line is skipped : it is discarded, except for
+      the last bytes that could contain the beginning of a marker.
+    - with markers, the part before the first marker is discarded.
+      If the remaining part is still too long, the first max_line_length
+      bytes are removed from the line and returned.
+
+    Returns the truncated part of a line with markers, or None.
+
+    Parameters:
+    - line : incomplete line (bytearray)
+    - markers : list of markers (bytes), defaults to TRAVIS_LOG_MARKERS
+    - max_line_length : maximum length of a line (bytes)
+    """
+    if markers is None:
+        markers = TRAVIS_LOG_MARKERS
+
+    # bytes that are kept to find a marker spanning two chunks
+    overlap = max(len(marker) for marker in markers) - 1
+    marker_position = find_first_marker(line, markers)
+
+    if marker_position < 0:
+        logger.debug("Skip job log line exceeding %d bytes", max_line_length)
+        del line[:max(len(line) - overlap, 0)]
+        return None
+
+    del line[:marker_position]
+    if len(line) <= max_line_length:
+        return None
+
+    logger.warning(
+        "Job log line with tags exceeds %d bytes, line is truncated",
+        max_line_length
+    )
+    truncated = bytes(line[:max_line_length])
+    del line[:max_line_length]
+    return truncated
+
+
+class TaggedLineReader(object):
+
+    """
+    Incrementally find the lines containing a marker in job log chunks.
+
+    Chunks are passed to feed() as they are received, the last incomplete
+    line of a chunk is kept until the rest of the line is received,
+    so a log can be parsed while it is growing (fe. of a running job).
+    Only lines containing a marker are decoded to str.
+    Memory use is bounded by max_line_length : incomplete lines exceeding
+    max_line_length are skipped if they don't contain a marker,
+    or truncated if they do (see truncate_line()).
+    """
+
+    def __init__(self, markers=None,
+                 max_line_length=DEFAULT_MAX_LINE_LENGTH):
+        """
+        Constructor.
+
+        Parameters:
+        - markers : list of markers (bytes), defaults to TRAVIS_LOG_MARKERS
+        - max_line_length : maximum length of a line (bytes)
+        """
+        if markers is None:
+            markers = TRAVIS_LOG_MARKERS
+
+        self.markers = markers
+        self.max_line_length = max_line_length
+        # last incomplete line, it doesn't contain a newline
+        self.pending = bytearray()
+
+    def feed(self, chunk):
+        """
+        Add a chunk of a job log and return the completed tagged lines.
+
+        The method is a generator, iterate result to get each line.
+
+        Parameters:
+        - chunk : part of a job log (bytes or str)
+        """
+        # convert to bytes if stream was opened in text mode
+        if not isinstance(chunk, bytes):
+            chunk = chunk.encode('utf-8')
+
+        # only scan complete lines, keep the last incomplete line
+        lines_end = chunk.rfind(b'\n') + 1
+        if lines_end > 0:
+            if self.pending:
+                self.pending += chunk
+                lines_end += len(self.pending) - len(chunk)
+                buffer = self.pending
+            else:
+                buffer = chunk
+
+            for line_start, line_end in find_tagged_lines(
+                    buffer, self.markers, 0, lines_end
+            ):
+                yield decode_line(buffer[line_start:line_end])
+
+            self.pending = bytearray(buffer[lines_end:])
+        else:
+            self.pending += chunk
+
+        # limit length of the incomplete line
+        if len(self.pending) > self.max_line_length:
+            truncated = truncate_line(
+                self.pending, self.markers, self.max_line_length
+            )
+            if truncated is not None:
+                yield decode_line(truncated)
+
+    def flush(self):
+        """
+        Return the last line if it contains a marker, when the log is complete.
+
+        The method is a generator, iterate result to get the line.
+        """
+        pending = self.pending
+        self.pending = bytearray()
+
+        # last line, without newline
+        for line_start, line_end in find_tagged_lines(pending, self.markers):
+            yield decode_line(pending[line_start:line_end])
+
+
+def iter_tagged_lines(stream, markers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                      max_line_length=DEFAULT_MAX_LINE_LENGTH):
+    """
+    Read a job log stream and return the lines containing a marker.
+
+    The stream is read in chunks, only lines containing a marker
+    are decoded to str.
+    Memory use is bounded by chunk_size and max_line_length :
+    lines exceeding max_line_length are skipped if they don't contain
+    a marker, or truncated if they do (see truncate_line()).
+    The method is a generator, iterate result to get each line.
+
+    Parameters:
+    - stream : job log stream, supporting read()
+    - markers : list of markers (bytes), defaults to TRAVIS_LOG_MARKERS
+    - chunk_size : number of bytes read at once
+    - max_line_length : maximum length of a line (bytes)
+    """
+    reader = TaggedLineReader(markers, max_line_length)
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+
+        for line in reader.feed(chunk):
+            yield line
+
+    for line in reader.flush():
+        yield line
+
+
+def iter_mapped_tagged_lines(file_stream, markers=None,
+                             window=DEFAULT_MMAP_WINDOW):
+    """
+    Memory map a job log file and return the lines containing a marker.
+
+    The file is scanned for markers with find() in windows,
+    only lines containing a marker are copied and decoded.
+    The pages of each scanned window are released (if supported),
+    so resident memory doesn't grow with the size of the file.
+    The method is a generator, iterate result to get each line.
+
+    Parameters:
+    - file_stream : job log file, opened in binary mode
+    - markers : list of markers (bytes), defaults to TRAVIS_LOG_MARKERS
+    - window : number of bytes scanned before pages are released
+    """
+    try:
+        log_map = mmap.mmap(
+            file_stream.fileno(), 0, access=mmap.ACCESS_READ
+        )
+    except ValueError:
+        # empty files can't be mapped
+        return
+
+    try:
+        size = len(log_map)
+        # window should be a multiple of the page size
+        window = max(window // mmap.PAGESIZE, 1) * mmap.PAGESIZE
+        window_start = 0
+
+        while window_start < size:
+            # extend window to the end of the last line in the window
+            window_end = log_map.find(b'\n', window_start + window) + 1
+            if window_end <= 0:
+                window_end = size
+
+            for line_start, line_end in find_tagged_lines(
+                    log_map, markers, window_start, window_end
+            ):
+                yield decode_line(log_map[line_start:line_end])
+
+            release_pages(log_map, window_start, window_end)
+            window_start = window_end
+    finally:
+        log_map.close()
+
+
+def release_pages(log_map, start, end):
+    """
+    Release resident pages of a memory mapped file.
+
+    Only complete pages are released, if the platform supports it.
+
+    Parameters:
+    - log_map : mmap instance
+    - start : start of the scanned part
+    - end : end of the scanned part
+    """
+    if not hasattr(log_map, 'madvise') or \
+            not hasattr(mmap, 'MADV_DONTNEED'):
+        return
+
+    # align to page boundaries
+    start = start // mmap.PAGESIZE * mmap.PAGESIZE
+    end = end // mmap.PAGESIZE * mmap.PAGESIZE
+    if end > start:
+        log_map.madvise(mmap.MADV_DONTNEED, start, end - start)
@@ -24,6 +24,8 @@ from builtins import str
 from builtins import object
 import re
 import json
+import logging
+from multiprocessing.pool import ThreadPool
 from buildtimetrend import logger
 from buildtimetrend import tools
 from buildtimetrend.buildjob import BuildJob
@@ -31,6 +33,14 @@ from buildtimetrend.collection import Collection
 from buildtimetrend.travis.connector import TravisOrgConnector
 from buildtimetrend.travis.connector import TravisConnector
 from buildtimetrend.travis.substage import TravisSubstage
+from buildtimetrend.travis.logreader import TRAVIS_LOG_MARKER_TIMING
+from buildtimetrend.travis.logreader import TRAVIS_LOG_MARKER_WORKER
+from buildtimetrend.travis.logreader import DEFAULT_CHUNK_SIZE
+from buildtimetrend.travis.logreader import DEFAULT_MAX_LINE_LENGTH
+from buildtimetrend.travis.logreader import decode_line
+from buildtimetrend.travis.logreader import get_markers
+from buildtimetrend.travis.logreader import iter_tagged_lines
+from buildtimetrend.travis.logreader import iter_mapped_tagged_lines
 try:
     # For Python 3.0 and later
     from urllib.error import HTTPError, URLError
@@ -50,57 +60,127 @@ TRAVIS_LOG_PARSE_TIMING_STRINGS = [
 ]
 TRAVIS_LOG_PARSE_WORKER_STRING = r'Using worker:\ (?P<hostname>.*):(?P<os>.*)'
 
+# Travis CI timing tag types, in the order they are processed,
+# and the names of the values parsed from each tag type
+TRAVIS_LOG_PARSE_TIMING_TAGS = [
+    ('time_end',
+     ['end_hash', 'start_timestamp', 'finish_timestamp', 'duration']),
+    ('fold_end', ['end_stage', 'end_substage']),
+    ('fold_start', ['start_stage', 'start_substage']),
+    ('time_start', ['start_hash']),
+    ('shell_command', ['command']),
+]
+# single pass alternative for TRAVIS_LOG_PARSE_TIMING_STRINGS :
+# each tag is wrapped in a group named after the tag type,
+# values are captured with the same group names,
+# but they are bound to a single tag, so they can't swallow the next tag.
+# The common 'travis_' prefix is shared to speed up scanning.
+TRAVIS_LOG_PARSE_TIMING_REGEX = re.compile(
+    r'travis_(?:time:(?:'
+    r'(?P<time_end>end:(?P<end_hash>[^\x0d\x1b]*?):'
+    r'start=(?P<start_timestamp>\d+),finish=(?P<finish_timestamp>\d+),'
+    r'duration=(?P<duration>\d+)\x0d\x1b)'
+    r'|(?P<time_start>start:(?P<start_hash>[^\x0d\x1b]*)\x0d\x1b\[0K)'
+    r')|fold:(?:'
+    r'(?P<fold_end>end:(?P<end_stage>\w+)\.(?P<end_substage>\d+)\x0d\x1b)'
+    r'|(?P<fold_start>start:'
+    r'(?P<start_stage>\w+)\.(?P<start_substage>\d+)\x0d\x1b)'
+    r'))'
+    r'|(?P<shell_command>\$\ (?P<command>[^\x0d]*)\x0d)'
+)
+
+
+def scan_travis_time_tags(line):
+    """
+    Scan a line of a Travis CI log file for timing tags.
+
+    The line is scanned once for all tag types.
+    Returns a list of (tag type, tags dictionary) tuples, containing
+    the first tag of each type that was found, in the order
+    of TRAVIS_LOG_PARSE_TIMING_TAGS.
+
+    Parameters:
+    - line : line from logfile containing Travis CI tags
+    """
+    matches = {}
+    for match in TRAVIS_LOG_PARSE_TIMING_REGEX.finditer(line):
+        # the outer group of the matching alternative is closed last
+        if match.lastgroup not in matches:
+            matches[match.lastgroup] = match
+
+    tags = []
+    for tag_type, tag_names in TRAVIS_LOG_PARSE_TIMING_TAGS:
+        if tag_type in matches:
+            match = matches[tag_type]
+            tags.append(
+                (tag_type, {name: match.group(name) for name in tag_names})
+            )
 
-class TravisData(object):
+    return tags
 
-    """Gather data from Travis CI using the API."""
+
+def create_substage_index(build_config):
+    """
+    Create index of the commands in a Travis CI build config.
+
+    Returns a dictionary with the substage name (fe. script.2)
+    of each command. If a command is used in several stages,
+    the first stage in the build config is used.
+
+    Parameters:
+    - build_config : dictionary with Travis CI build config
+    """
+    substage_index = {}
+
+    # check if build_config collection is empty
+    if not build_config:
+        return substage_index
+
+    for stage_name, commands in build_config.items():
+        if not tools.is_list(commands):
+            continue
+
+        for substage_number, command in enumerate(commands, 1):
+            if tools.is_string(command) and command not in substage_index:
+                substage_index[command] = "{stage}.{substage:d}".format(
+                    stage=stage_name, substage=substage_number
+                )
+
+    return substage_index
+
+
+class BaseTravisData(object):
+
+    """
+    Process Travis CI build and job data, parse Travis CI job logs.
+
+    Retrieving data from the Travis CI API is implemented by subclasses,
+    with a synchronous (TravisData) or asynchronous connector
+    (travis.aioparser.AsyncTravisData).
+    """
 
     def __init__(self, repo, build_id, connector=None):
         """
-        Retrieve Travis CI build data using the API.
+        Initialise Travis CI build data.
 
         Parameters:
         - repo : github repository slug (fe. buildtimetrend/python-lib)
         - build_id : Travis CI build id (fe. 158)
-        - connector : Travis Connector instance
+        - connector : connector to the Travis CI API
         """
         self.builds_data = {}
         self.build_jobs = {}
         self.current_build_data = {}
         self.current_job = BuildJob()
         self.travis_substage = None
+        # index of commands in the build config : (build config, index)
+        self.substage_index = None
+        # job log stream is read in chunks, long lines are skipped
+        self.log_chunk_size = DEFAULT_CHUNK_SIZE
+        self.log_max_line_length = DEFAULT_MAX_LINE_LENGTH
         self.repo = repo
         self.build_id = str(build_id)
-        # set TravisConnector if it is defined
-        if isinstance(connector, TravisConnector):
-            self.connector = connector
-        # use Travis Org connector by default
-        else:
-            self.connector = TravisOrgConnector()
-
-    def get_build_data(self):
-        """
-        Retrieve Travis CI build data.
-
-        Returns true if retrieving data was succesful, false on error.
-        """
-        request = 'repos/{repo}/builds?number={build_id}'.format(
-            repo=self.repo, build_id=self.build_id
-        )
-        try:
-            self.builds_data = self.connector.json_request(request)
-        except (HTTPError, URLError) as msg:
-            logger.error("Error getting build data from Travis CI: %s", msg)
-            return False
-
-        # log builds_data
-        logger.debug(
-            "Build #%s data : %s",
-            str(self.build_id),
-            json.dumps(self.builds_data, sort_keys=True, indent=2)
-        )
-
-        return True
+        self.connector = connector
 
     def get_substage_name(self, command):
         """
@@ -112,91 +192,65 @@ class TravisData(object):
         if not tools.is_string(command):
             return ""
 
-        if len(self.current_build_data) > 0 and \
-                "config" in self.current_build_data:
-            build_config = self.current_build_data["config"]
-        else:
+        if len(self.current_build_data) == 0 or \
+                "config" not in self.current_build_data:
             logger.warning(
                 "Travis CI build config is not set"
             )
             return ""
 
-        # check if build_config collection is empty
-        if build_config:
-            for stage_name, commands in build_config.items():
-                if tools.is_list(commands) and command in commands:
-                    substage_number = commands.index(command) + 1
-                    substage_name = "{stage}.{substage:d}".format(
-                        stage=stage_name, substage=substage_number
-                    )
-                    logger.debug(
-                        "Substage %s corresponds to '%s'",
-                        substage_name, command
-                    )
-                    return substage_name
+        substage_name = self.get_substage_index().get(command, "")
+        if substage_name:
+            logger.debug(
+                "Substage %s corresponds to '%s'", substage_name, command
+            )
 
-        return ""
+        return substage_name
 
-    def process_build_jobs(self):
+    def get_substage_index(self, build_data=None):
         """
-        Retrieve Travis CI build job data.
+        Return index of commands in the config of a build.
 
-        Method is a generator, iterate result to get each processed build job.
-        """
-        if len(self.builds_data) > 0 and "builds" in self.builds_data:
-            for build in self.builds_data['builds']:
-                self.current_build_data = build
-
-                if "job_ids" in build:
-                    for job_id in build['job_ids']:
-                        yield self.process_build_job(job_id)
-
-            # reset current_build_data after builds are processed
-            self.current_build_data = {}
-
-    def process_build_job(self, job_id):
-        """
-        Retrieve Travis CI build job data.
+        The index is created once for a build and reused,
+        until the index of another build is requested.
 
         Parameters:
-        - job_id : ID of the job to process
+        - build_data : dictionary with Travis CI build data,
+                       current build data is used if not set
         """
-        if job_id is None:
-            return None
-
-        # retrieve job data from Travis CI
-        job_data = self.get_job_data(job_id)
-        # process build/job data
-        self.process_job_data(job_data)
-        # parse Travis CI job log file
-        self.parse_job_log(job_id)
-
-        # store build job
-        self.build_jobs[str(job_id)] = self.current_job
-        # create new build job instance
-        self.current_job = BuildJob()
+        if build_data is None:
+            build_data = self.current_build_data
+        build_config = build_data.get("config")
+
+        substage_index = self.substage_index
+        if substage_index is None or substage_index[0] is not build_config:
+            substage_index = (
+                build_config, create_substage_index(build_config)
+            )
+            self.substage_index = substage_index
 
-        # return processed build job
-        return self.build_jobs[str(job_id)]
+        return substage_index[1]
 
-    def get_job_data(self, job_id):
+    def create_job_parser(self, build_data):
         """
-        Retrieve Travis CI job data.
+        Create a TravisData instance to process a job of a build.
+
+        The instance shares connector and settings, but has its own
+        job state, so jobs can be processed concurrently.
 
         Parameters:
-        - job_id : ID of the job to process
+        - build_data : dictionary with Travis CI build data
         """
-        request = 'jobs/{:s}'.format(str(job_id))
-        job_data = self.connector.json_request(request)
-
-        # log job_data
-        logger.debug(
-            "Job #%s data : %s",
-            str(job_id),
-            json.dumps(job_data, sort_keys=True, indent=2)
+        job_parser = type(self)(self.repo, self.build_id, self.connector)
+        job_parser.builds_data = self.builds_data
+        job_parser.current_build_data = build_data
+        # share the command index of the build with all jobs
+        job_parser.substage_index = (
+            build_data.get("config"), self.get_substage_index(build_data)
         )
-
-        return job_data
+        job_parser.log_chunk_size = self.log_chunk_size
+        job_parser.log_max_line_length = self.log_max_line_length
+        return job_parser
 
     def process_job_data(self, job_data):
         """
@@ -335,21 +389,14 @@ class TravisData(object):
 
             self.current_job.add_property("pull_request", pull_request_data)
 
-    def parse_job_log(self, job_id):
-        """
-        Parse Travis CI job log.
-
-        Parameters:
-        - job_id : ID of the job to process
-        """
-        self.parse_job_log_stream(self.connector.download_job_log(job_id))
-
-    def parse_job_log_file(self, filename):
+    def parse_job_log_file(self, filename, use_mmap=False):
         """
         Open a Travis CI log file and parse it.
 
         Parameters :
         - filename : filename of Travis CI log
+        - use_mmap : memory map the file instead of reading it,
+                     resident memory use doesn't depend on the file size
         Returns false if file doesn't exist, true if it was read successfully.
         """
         # load timestamps file
@@ -358,65 +405,168 @@ class TravisData(object):
 
         # read timestamps, calculate stage duration
         with open(filename, 'rb') as file_stream:
-            self.parse_job_log_stream(file_stream)
+            if use_mmap:
+                self.parse_job_log_mmap(file_stream)
+            else:
+                self.parse_job_log_stream(file_stream)
 
         return True
 
+    def parse_job_log_mmap(self, file_stream):
+        """
+        Parse a memory mapped Travis CI job log file.
+
+        Parameters:
+        - file_stream : job log file, opened in binary mode
+        """
+        self.travis_substage = TravisSubstage()
+        check_timing_tags = self.has_timing_tags()
+
+        for line in iter_mapped_tagged_lines(
+                file_stream, get_markers(check_timing_tags)
+        ):
+            self.parse_job_log_line(line, check_timing_tags)
+
     def parse_job_log_stream(self, stream):
         """
         Parse Travis CI job log stream.
 
+        Finished substages are added to the current job.
+        See iter_job_log_stages() to retrieve the substages one at a time,
+        without keeping them.
+
+        Parameters:
+        - stream : stream of job log file
+        """
+        for stage in self.iter_job_log_stages(stream):
+            self.current_job.add_stage(stage)
+
+    def iter_job_log_stages(self, stream):
+        """
+        Parse Travis CI job log stream and return each finished substage.
+
+        If the stream supports read(), it is scanned in chunks of bytes
+        (of log_chunk_size) and only the lines containing Travis CI tags
+        are decoded, lines exceeding log_max_line_length are skipped,
+        or truncated if they contain tags.
+        Otherwise, the stream is iterated line by line.
+        The method is a generator, iterate result to get the Stage instance
+        of each substage, as soon as it is parsed. The substages are not
+        added to the current job, so memory use doesn't grow with
+        the number of substages. Other job properties (fe. worker)
+        are set on the current job.
+
         Parameters:
         - stream : stream of job log file
         """
         self.travis_substage = TravisSubstage()
         check_timing_tags = self.has_timing_tags()
 
-        for line in stream:
-            # convert to str if line is bytes type
+        if hasattr(stream, 'read'):
+            lines = iter_tagged_lines(
+                stream,
+                get_markers(check_timing_tags),
+                self.log_chunk_size,
+                self.log_max_line_length
+            )
+        else:
+            lines = stream
+
+        for line in lines:
+            # convert to str if line is bytes type and contains tags
             if isinstance(line, bytes):
-                line = line.decode('utf-8')
-            # parse Travis CI timing tags
-            if check_timing_tags and 'travis_' in line:
-                self.parse_travis_time_tag(line)
-            # parse Travis CI worker tag
-            if 'Using worker:' in line:
-                self.parse_travis_worker_tag(line)
+                if TRAVIS_LOG_MARKER_TIMING not in line and \
+                        TRAVIS_LOG_MARKER_WORKER not in line:
+                    continue
+                line = decode_line(line)
+            for stage in self.iter_job_log_line_stages(
+                    line, check_timing_tags
+            ):
+                yield stage
+
+    def parse_job_log_line(self, line, check_timing_tags=True):
+        """
+        Parse a line of a Travis CI job log.
+
+        Finished substages are added to the current job.
+
+        Parameters:
+        - line : line of job log file (str)
+        - check_timing_tags : parse Travis CI timing tags
+        """
+        for stage in self.iter_job_log_line_stages(line, check_timing_tags):
+            self.current_job.add_stage(stage)
+
+    def iter_job_log_line_stages(self, line, check_timing_tags=True):
+        """
+        Parse a line of a Travis CI job log, return finished substages.
+
+        The method is a generator, iterate result to get the Stage instance
+        of each substage that finished on this line.
+
+        Parameters:
+        - line : line of job log file (str)
+        - check_timing_tags : parse Travis CI timing tags
+        """
+        # parse Travis CI timing tags
+        if check_timing_tags and 'travis_' in line:
+            for stage in self.iter_travis_time_tag_stages(line):
+                yield stage
+        # parse Travis CI worker tag
+        if 'Using worker:' in line:
+            self.parse_travis_worker_tag(line)
 
     def parse_travis_time_tag(self, line):
         """
         Parse and process Travis CI timing tags.
 
+        Finished substages are added to the current job.
+
+        Parameters:
+        - line : line from logfile containing Travis CI tags
+        """
+        for stage in self.iter_travis_time_tag_stages(line):
+            self.current_job.add_stage(stage)
+
+    def iter_travis_time_tag_stages(self, line):
+        """
+        Parse Travis CI timing tags, return finished substages.
+
+        The method is a generator, iterate result to get the Stage instance
+        of each complete substage that finished on this line.
+
         Parameters:
         - line : line from logfile containing Travis CI tags
         """
         if self.travis_substage is None:
             self.travis_substage = TravisSubstage()
 
-        escaped_line = line.replace('\x0d', '*').replace('\x1b', 'ESC')
-        logger.debug('line : %s', escaped_line)
+        if logger.isEnabledFor(logging.DEBUG):
+            escaped_line = line.replace('\x0d', '*').replace('\x1b', 'ESC')
+            logger.debug('line : %s', escaped_line)
 
         # parse Travis CI timing tags
-        for parse_string in TRAVIS_LOG_PARSE_TIMING_STRINGS:
-            result = re.search(parse_string, line)
-            if result:
-                self.travis_substage.process_parsed_tags(result.groupdict())
-
-                # when finished : log stage and create a new instance
-                if self.travis_substage.has_finished():
-                    # set substage name, if it is not set
-                    if not self.travis_substage.has_name() and \
-                            self.travis_substage.has_command():
-                        self.travis_substage.set_name(
-                            self.get_substage_name(
-                                self.travis_substage.get_command()
-                            )
+        for tag_type, tags_dict in scan_travis_time_tags(line):
+            self.travis_substage.process_parsed_tags(tags_dict, tag_type)
+
+            # when finished : return stage and create a new instance
+            if self.travis_substage.has_finished():
+                # set substage name, if it is not set
+                if not self.travis_substage.has_name() and \
+                        self.travis_substage.has_command():
+                    self.travis_substage.set_name(
+                        self.get_substage_name(
+                            self.travis_substage.get_command()
                         )
+                    )
+
+                stage = self.travis_substage.stage
+                finished_incomplete = self.travis_substage.finished_incomplete
+                self.travis_substage = TravisSubstage()
 
-                    # only log complete substages
-                    if not self.travis_substage.finished_incomplete:
-                        self.current_job.add_stage(self.travis_substage.stage)
-                    self.travis_substage = TravisSubstage()
+                # only return complete substages
+                if not finished_incomplete:
+                    yield stage
 
     def parse_travis_worker_tag(self, line):
         """
@@ -480,3 +630,188 @@ class TravisData(object):
             return self.current_build_data['finished_at']
         else:
             return None
+
+
+class TravisData(BaseTravisData):
+
+    """Gather data from Travis CI using the API."""
+
+    def __init__(self, repo, build_id, connector=None):
+        """
+        Retrieve Travis CI build data using the API.
+
+        Parameters:
+        - repo : github repository slug (fe. buildtimetrend/python-lib)
+        - build_id : Travis CI build id (fe. 158)
+        - connector : Travis Connector instance
+        """
+        super(TravisData, self).__init__(repo, build_id, connector)
+        # number of build jobs processed concurrently
+        self.job_workers = 1
+        # use Travis Org connector by default
+        if not isinstance(self.connector, TravisConnector):
+            self.connector = TravisOrgConnector()
+
+    def get_build_data(self):
+        """
+        Retrieve Travis CI build data.
+
+        Returns true if retrieving data was succesful, false on error.
+        """
+        request = 'repos/{repo}/builds?number={build_id}'.format(
+            repo=self.repo, build_id=self.build_id
+        )
+        try:
+            self.builds_data = self.connector.json_request(request)
+        except (HTTPError, URLError) as msg:
+            logger.error("Error getting build data from Travis CI: %s", msg)
+            return False
+
+        # log builds_data
+        logger.debug(
+            "Build #%s data : %s",
+            str(self.build_id),
+            json.dumps(self.builds_data, sort_keys=True, indent=2)
+        )
+
+        return True
+
+    def process_build_jobs(self, workers=None):
+        """
+        Retrieve Travis CI build job data.
+
+        Method is a generator, iterate result to get each processed build job.
+        If more than one worker is used, build jobs are retrieved and parsed
+        concurrently by a pool of threads, each job is processed by a
+        separate TravisData instance (see create_job_parser()).
+        Build jobs are returned in job order.
+
+        Parameters:
+        - workers : number of build jobs processed concurrently,
+                    defaults to job_workers
+        """
+        if workers is None:
+            workers = self.job_workers
+
+        if len(self.builds_data) > 0 and "builds" in self.builds_data:
+            if workers is not None and workers > 1:
+                for build_job in self.process_build_jobs_concurrent(workers):
+                    yield build_job
+                return
+
+            for build in self.builds_data['builds']:
+                self.current_build_data = build
+
+                if "job_ids" in build:
+                    for job_id in build['job_ids']:
+                        yield self.process_build_job(job_id)
+
+            # reset current_build_data after builds are processed
+            self.current_build_data = {}
+
+    def process_build_jobs_concurrent(self, workers):
+        """
+        Retrieve and parse Travis CI build jobs using a pool of threads.
+
+        Method is a generator, iterate result to get each processed build job,
+        build jobs are returned in job order.
+
+        Parameters:
+        - workers : number of build jobs processed concurrently
+        """
+        jobs = []
+        for build in self.builds_data['builds']:
+            if "job_ids" in build:
+                for job_id in build['job_ids']:
+                    jobs.append((build, job_id))
+
+        if not jobs:
+            return
+
+        pool = ThreadPool(min(workers, len(jobs)))
+        try:
+            for job_id, build_job in pool.imap(self._process_job, jobs):
+                if build_job is not None:
+                    self.build_jobs[str(job_id)] = build_job
+                yield build_job
+        finally:
+            pool.terminate()
+
+    def _process_job(self, job):
+        """
+        Process a build job with a separate TravisData instance.
+
+        Returns a tuple (job_id, processed build job).
+
+        Parameters:
+        - job : tuple (build data, job ID)
+        """
+        build, job_id = job
+        job_parser = self.create_job_parser(build)
+        return job_id, job_parser.process_build_job(job_id)
+
+    def process_build_job(self, job_id):
+        """
+        Retrieve Travis CI build job data.
+
+        Parameters:
+        - job_id : ID of the job to process
+        """
+        if job_id is None:
+            return None
+
+        # retrieve job data from Travis CI
+        job_data = self.get_job_data(job_id)
+        # process build/job data
+        self.process_job_data(job_data)
+        # parse Travis CI job log file
+        self.parse_job_log(job_id)
+
+        # store build job
+        self.build_jobs[str(job_id)] = self.current_job
+        # create new build job instance
+        self.current_job = BuildJob()
+
+        # return processed build job
+        return self.build_jobs[str(job_id)]
+
+    def get_job_data(self, job_id):
+        """
+        Retrieve Travis CI job data.
+
+        Parameters:
+        - job_id : ID of the job to process
+        """
+        request = 'jobs/{:s}'.format(str(job_id))
+        job_data = self.connector.json_request(request)
+
+        # log job_data
+        logger.debug(
+            "Job #%s data : %s",
+            str(job_id),
+            json.dumps(job_data, sort_keys=True, indent=2)
+        )
+
+        return job_data
+
+    def parse_job_log(self, job_id):
+        """
+        Parse Travis CI job log.
+
+        Parameters:
+        - job_id : ID of the job to process
+        """
+        self.parse_job_log_stream(self.connector.download_job_log(job_id))
+
+    def iter_job_stages(self, job_id):
+        """
+        Download and parse Travis CI job log, return each finished substage.
+
+        The method is a generator, see iter_job_log_stages().
+
+        Parameters:
+        - job_id : ID of the job to process
+        """
+        return self.iter_job_log_stages(
+            self.connector.download_job_log(job_id)
+        )
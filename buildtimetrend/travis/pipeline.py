@@ -0,0 +1,329 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Pipeline to retrieve, parse and store Travis CI builds.
+
+Builds go through three stages, each with its own pool of threads :
+- fetch : retrieve build data, job data and job logs from Travis CI
+- parse : process job data and parse job logs with TravisData
+- upload : store build jobs (in Keen.io by default)
+Stages are joined by bounded queues, a stage blocks when the queue
+of the next stage is full (backpressure), so network waits and parsing
+overlap. Job logs are spooled to temporary files before they are
+queued for the parse stage, so memory use doesn't grow with the log size.
+Throughput and queue depth of each stage are counted, to size the pools.
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import division
+from builtins import object
+import time
+import shutil
+import tempfile
+import threading
+from six.moves import queue
+from buildtimetrend import logger
+from buildtimetrend import keenio
+from buildtimetrend.service import get_repo_data_detail
+from buildtimetrend.travis.connector import TravisOrgConnector
+from buildtimetrend.travis.parser import TravisData
+
+# default pool sizes and queue size
+DEFAULT_FETCHERS = 4
+DEFAULT_PARSERS = 2
+DEFAULT_UPLOADERS = 1
+DEFAULT_QUEUE_SIZE = 10
+# job logs up to this size (bytes) are kept in memory, larger logs
+# are written to a temporary file (see BuildPipeline.fetch())
+LOG_SPOOL_MAX_MEMORY = 1024 * 1024
+# size of the chunks (bytes) copied from the job log stream
+LOG_SPOOL_CHUNK_SIZE = 64 * 1024
+# stage names, in pipeline order
+PIPELINE_STAGES = ("fetch", "parse", "upload")
+
+
+def upload_build_job(build_job):
+    """
+    Store a build job in Keen.io.
+
+    Parameters:
+    - build_job : BuildJob instance
+    """
+    keenio.send_build_data_service(
+        build_job, get_repo_data_detail(build_job.get_property("repo"))
+    )
+
+
+def spool_job_log(job_log):
+    """
+    Copy a job log stream to a temporary file, return the file.
+
+    The file is kept in memory if it is smaller than LOG_SPOOL_MAX_MEMORY,
+    it is removed when it is closed.
+
+    Parameters:
+    - job_log : job log stream
+    """
+    log_file = tempfile.SpooledTemporaryFile(LOG_SPOOL_MAX_MEMORY)
+    try:
+        shutil.copyfileobj(job_log, log_file, LOG_SPOOL_CHUNK_SIZE)
+    except Exception:
+        log_file.close()
+        raise
+
+    log_file.seek(0)
+    return log_file
+
+
+class StageCounter(object):
+
+    """Thread safe counters of a pipeline stage."""
+
+    def __init__(self, work_queue):
+        """
+        Constructor.
+
+        Parameters:
+        - work_queue : input queue of the stage
+        """
+        self.queue = work_queue
+        self.processed = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self.max_queue_depth = 0
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+
+    def count_put(self):
+        """Record depth of the input queue, after an item was added."""
+        with self._lock:
+            self.max_queue_depth = max(
+                self.max_queue_depth, self.queue.qsize()
+            )
+
+    def count_item(self, duration, error=False):
+        """
+        Count a processed item.
+
+        Parameters:
+        - duration : time spent processing the item, in seconds
+        - error : true if processing the item failed
+        """
+        with self._lock:
+            self.processed += 1
+            self.busy_time += duration
+            if error:
+                self.errors += 1
+
+    def get_stats(self):
+        """
+        Return dictionary with the counters of the stage.
+
+        - processed : number of processed items
+        - errors : number of items that failed
+        - busy_time : time spent processing items (s), summed over threads
+        - throughput : processed items per second, since the start
+        - queue_depth : number of items waiting in the input queue
+        - max_queue_depth : maximum number of items in the input queue
+        """
+        with self._lock:
+            elapsed = time.time() - self.start_time
+            return {
+                "processed": self.processed,
+                "errors": self.errors,
+                "busy_time": self.busy_time,
+                "throughput": self.processed / elapsed if elapsed > 0 else 0,
+                "queue_depth": self.queue.qsize(),
+                "max_queue_depth": self.max_queue_depth
+            }
+
+
+class BuildPipeline(object):
+
+    """
+    Retrieve, parse and store Travis CI builds in a pipeline.
+
+    Usage :
+        pipeline = BuildPipeline()
+        pipeline.start()
+        pipeline.add_build(repo, build)  # blocks if fetch queue is full
+        pipeline.join()  # waits until all builds are processed
+    """
+
+    def __init__(self, connector=None, fetchers=DEFAULT_FETCHERS,
+                 parsers=DEFAULT_PARSERS, uploaders=DEFAULT_UPLOADERS,
+                 queue_size=DEFAULT_QUEUE_SIZE, upload=upload_build_job):
+        """
+        Constructor.
+
+        Parameters:
+        - connector : Travis Connector instance, shared by all builds,
+                      a TravisOrgConnector is created by default
+        - fetchers : number of threads retrieving data from Travis CI
+        - parsers : number of threads parsing job data and logs
+        - uploaders : number of threads storing build jobs
+        - queue_size : maximum number of items waiting for each stage
+        - upload : function storing a build job
+        """
+        self.connector = connector or TravisOrgConnector()
+        self.upload = upload
+        self.pool_sizes = {
+            "fetch": fetchers,
+            "parse": parsers,
+            "upload": uploaders
+        }
+        self.queues = {}
+        self.counters = {}
+        for stage in PIPELINE_STAGES:
+            self.queues[stage] = queue.Queue(queue_size)
+            self.counters[stage] = StageCounter(self.queues[stage])
+        self.threads = {}
+
+    def start(self):
+        """Start the threads of each stage."""
+        handlers = {
+            "fetch": self.fetch,
+            "parse": self.parse,
+            "upload": self.upload
+        }
+
+        for stage in PIPELINE_STAGES:
+            self.threads[stage] = []
+            for _ in range(self.pool_sizes[stage]):
+                thread = threading.Thread(
+                    target=self._run_stage, args=(stage, handlers[stage])
+                )
+                thread.daemon = True
+                thread.start()
+                self.threads[stage].append(thread)
+
+    def add_build(self, repo, build):
+        """
+        Add a build to the pipeline.
+
+        Blocks if the fetch queue is full.
+
+        Parameters:
+        - repo : github repository slug (fe. buildtimetrend/python-lib)
+        - build : Travis CI build number
+        """
+        self._put("fetch", (repo, build))
+
+    def join(self):
+        """Wait until all builds are processed, stop the threads."""
+        for stage in PIPELINE_STAGES:
+            # stop threads of a stage when all items are processed
+            for _ in self.threads.get(stage, []):
+                self.queues[stage].put(None)
+            for thread in self.threads.get(stage, []):
+                thread.join()
+            self.threads[stage] = []
+
+    def get_stats(self):
+        """Return dictionary with counters of each stage."""
+        return dict(
+            (stage, self.counters[stage].get_stats())
+            for stage in PIPELINE_STAGES
+        )
+
+    def fetch(self, item):
+        """
+        Retrieve build data, job data and job logs of a build.
+
+        Each job is passed to the parse stage, its job log is spooled
+        to a temporary file, which is kept in memory if it is smaller
+        than LOG_SPOOL_MAX_MEMORY.
+
+        Parameters:
+        - item : tuple (repo, build number)
+        """
+        repo, build = item
+        travis_data = TravisData(repo, build, self.connector)
+
+        if not travis_data.get_build_data():
+            raise ValueError("build data of build #{} is not available".format(
+                build
+            ))
+
+        for build_data in travis_data.builds_data.get("builds", []):
+            for job_id in build_data.get("job_ids", []):
+                job_data = travis_data.get_job_data(job_id)
+                # read complete log, to release the connection
+                job_log = spool_job_log(
+                    travis_data.connector.download_job_log(job_id)
+                )
+                self._put(
+                    "parse", (travis_data, build_data, job_data, job_log)
+                )
+
+    def parse(self, item):
+        """
+        Process job data and parse job log of a job.
+
+        The build job is passed to the upload stage.
+
+        Parameters:
+        - item : tuple (TravisData instance, build data, job data,
+                        spooled job log file)
+        """
+        travis_data, build_data, job_data, job_log = item
+
+        job_parser = travis_data.create_job_parser(build_data)
+        job_parser.process_job_data(job_data)
+        try:
+            job_parser.parse_job_log_stream(job_log)
+        finally:
+            job_log.close()
+
+        self._put("upload", job_parser.current_job)
+
+    def _put(self, stage, item):
+        """
+        Add an item to the queue of a stage, blocks if the queue is full.
+
+        Parameters:
+        - stage : stage name
+        - item : item to process
+        """
+        self.queues[stage].put(item)
+        self.counters[stage].count_put()
+
+    def _run_stage(self, stage, handler):
+        """
+        Process items of a stage, until None is received.
+
+        Parameters:
+        - stage : stage name
+        - handler : function processing an item
+        """
+        work_queue = self.queues[stage]
+        counter = self.counters[stage]
+
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+
+            start = time.time()
+            error = False
+            try:
+                handler(item)
+            except Exception as msg:
+                error = True
+                logger.error("Error in %s stage of pipeline : %s", stage, msg)
+            counter.count_item(time.time() - start, error)
@@ -24,6 +24,15 @@ from buildtimetrend import logger
 from buildtimetrend.stages import Stage
 from buildtimetrend.tools import check_dict
 
+# handler method for each type of Travis CI timing tag
+TRAVIS_TAG_HANDLERS = {
+    'fold_start': 'process_start_stage',
+    'time_start': 'process_start_time',
+    'shell_command': 'process_command',
+    'time_end': 'process_end_time',
+    'fold_end': 'process_end_stage',
+}
+
 
 class TravisSubstage(object):
 
@@ -40,15 +49,22 @@ class TravisSubstage(object):
         self.finished_incomplete = False
         self.finished = False
 
-    def process_parsed_tags(self, tags_dict):
+    def process_parsed_tags(self, tags_dict, tag_type=None):
         """
         Process parsed tags and calls the corresponding handler method.
 
+        If the tag type is known, the handler is called directly,
+        otherwise the handler is derived from the parsed tags.
+
         Parameters:
         - tags_dict : dictionary with parsed tags
+        - tag_type : type of the parsed tag (see TRAVIS_TAG_HANDLERS)
         """
         result = False
 
+        if tag_type in TRAVIS_TAG_HANDLERS:
+            return getattr(self, TRAVIS_TAG_HANDLERS[tag_type])(tags_dict)
+
         # check if parameter tags_dict is a dictionary
         if check_dict(tags_dict, "tags_dict"):
             if 'start_stage' in tags_dict:
@@ -173,20 +189,17 @@ class TravisSubstage(object):
 
             # Set started timestamp
             if self.stage.set_started_at_nano(tags_dict['start_timestamp']):
-                logger.info("Stage started at %s",
-                            self.stage.data["started_at"]["isotimestamp"])
+                logger.info("Stage started at %s", self.stage.started_at)
                 set_started = True
 
             # Set finished timestamp
             if self.stage.set_finished_at_nano(tags_dict['finish_timestamp']):
-                logger.info("Stage finished at %s",
-                            self.stage.data["finished_at"]["isotimestamp"])
+                logger.info("Stage finished at %s", self.stage.finished_at)
                 set_finished = True
 
             # Set duration
             if self.stage.set_duration_nano(tags_dict['duration']):
-                logger.info("Stage duration : %ss",
-                            self.stage.data['duration'])
+                logger.info("Stage duration : %ss", self.stage.duration)
                 set_duration = True
 
             result = set_started and set_finished and set_duration
@@ -216,7 +229,7 @@ class TravisSubstage(object):
 
         # check if stage was started
         # and if substage name matches
-        if not self.has_name() or self.stage.data["name"] != end_stagename:
+        if not self.has_name() or self.stage.name != end_stagename:
             logger.info("Substage was not started or name doesn't match")
             self.finished_incomplete = True
             return False
@@ -234,9 +247,9 @@ class TravisSubstage(object):
         If name is not set, return the command.
         """
         if self.has_name():
-            return self.stage.data["name"]
+            return self.stage.name
         elif self.has_command():
-            return self.stage.data["command"]
+            return self.stage.command
         else:
             return ""
 
@@ -255,9 +268,8 @@ class TravisSubstage(object):
 
         Returns true if substage has a name
         """
-        return "name" in self.stage.data and \
-            self.stage.data["name"] is not None and \
-            len(self.stage.data["name"]) > 0
+        return self.stage.name is not None and \
+            len(self.stage.name) > 0
 
     def has_timing_hash(self):
         """
@@ -273,14 +285,13 @@ class TravisSubstage(object):
 
         Returns true if a command is set
         """
-        return "command" in self.stage.data and \
-            self.stage.data["command"] is not None and \
-            len(self.stage.data["command"]) > 0
+        return self.stage.command is not None and \
+            len(self.stage.command) > 0
 
     def get_command(self):
         """Return substage command."""
         if self.has_command():
-            return self.stage.data["command"]
+            return self.stage.command
         else:
             return ""
 
@@ -304,6 +315,6 @@ class TravisSubstage(object):
         return self.finished_incomplete or \
             self.has_name() and self.finished or \
             not self.has_name() and self.has_timing_hash() and \
-            "finished_at" in self.stage.data or \
+            self.stage.finished_at is not None or \
             not self.has_name() and not self.has_timing_hash() and \
             self.has_command()
@@ -0,0 +1,184 @@
+# vim: set expandtab sw=4 ts=4:
+"""
+Follow the job log of a running Travis CI job.
+
+The log is polled, each poll only retrieves the part of the log
+after the last received byte (using a Range request).
+The substage state of TravisData and the incomplete last line
+are kept between polls, so each substage is available
+as soon as its end tags are received, without parsing the log again.
+
+Usage :
+    tail = JobLogTail(TravisData(repo, build), job_id)
+    for stage in tail.follow():
+        print(stage.name, stage.duration)
+
+Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+
+This file is part of buildtimetrend/python-lib
+<https://github.com/buildtimetrend/python-lib/>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+from builtins import str
+from builtins import object
+import time
+from buildtimetrend import logger
+from buildtimetrend.travis.substage import TravisSubstage
+from buildtimetrend.travis.logreader import TaggedLineReader
+from buildtimetrend.travis.logreader import get_markers
+
+# delay between two polls of the job log, in seconds
+DEFAULT_POLL_INTERVAL = 10
+
+
+class JobLogTail(object):
+
+    """
+    Parse the job log of a running Travis CI job, while it grows.
+
+    The parsed substages are added to the current job
+    of the TravisData instance.
+    """
+
+    def __init__(self, travis_data, job_id):
+        """
+        Constructor.
+
+        Parameters:
+        - travis_data : TravisData instance, parsing the job
+        - job_id : ID of the job to follow
+        """
+        self.travis_data = travis_data
+        self.job_id = job_id
+        # number of bytes of the job log that were received
+        self.offset = 0
+        self.reader = None
+        self.check_timing_tags = True
+        self.finished = False
+
+    def start(self, job_data=None):
+        """
+        Process job data and prepare parsing the job log.
+
+        Parameters:
+        - job_data : dictionary with Travis CI job data,
+                     it is retrieved if it is None
+        """
+        if job_data is None:
+            job_data = self.travis_data.get_job_data(self.job_id)
+        self.travis_data.process_job_data(job_data)
+
+        # a running job is recent, so it has timing tags
+        self.check_timing_tags = self.travis_data.has_timing_tags() or \
+            job_data['job']['finished_at'] is None
+
+        self.travis_data.travis_substage = TravisSubstage()
+        self.reader = TaggedLineReader(
+            get_markers(self.check_timing_tags),
+            self.travis_data.log_max_line_length
+        )
+        self.offset = 0
+        self.finished = False
+
+    def poll(self):
+        """
+        Retrieve and parse the part of the job log received since last poll.
+
+        Returns a list of the Stage instances of the substages that finished.
+        """
+        if self.reader is None:
+            self.start()
+
+        stages = self.travis_data.current_job.stages
+        stage_count = len(stages)
+
+        stream = self.travis_data.connector.download_job_log_part(
+            self.job_id, self.offset
+        )
+        try:
+            while True:
+                chunk = stream.read(self.travis_data.log_chunk_size)
+                if not chunk:
+                    break
+
+                self.offset += len(chunk)
+                self._parse_lines(self.reader.feed(chunk))
+        finally:
+            stream.close()
+
+        return stages.stage_list[stage_count:]
+
+    def finish(self, job_data=None):
+        """
+        Parse the last line of the job log, when the job is finished.
+
+        Job data is processed again, to update the result
+        and the finished timestamp of the job.
+        Returns a list of the Stage instances of the substages that finished.
+
+        Parameters:
+        - job_data : dictionary with Travis CI job data
+        """
+        stages = self.travis_data.current_job.stages
+        stage_count = len(stages)
+
+        self._parse_lines(self.reader.flush())
+        if job_data is not None:
+            self.travis_data.process_job_data(job_data)
+        self.finished = True
+
+        return stages.stage_list[stage_count:]
+
+    def follow(self, interval=DEFAULT_POLL_INTERVAL):
+        """
+        Poll the job log until the job is finished.
+
+        Job data is checked before each poll, the log is complete
+        when it is polled after the job finished.
+        The method is a generator, iterate result to get the Stage instance
+        of each substage, as soon as it finished.
+
+        Parameters:
+        - interval : delay between two polls, in seconds
+        """
+        if self.reader is None:
+            self.start()
+
+        while not self.finished:
+            job_data = self.travis_data.get_job_data(self.job_id)
+            job_finished = job_data['job']['finished_at'] is not None
+
+            for stage in self.poll():
+                yield stage
+
+            if job_finished:
+                for stage in self.finish(job_data):
+                    yield stage
+            else:
+                logger.debug(
+                    "Job #%s is running, %d bytes of log received",
+                    str(self.job_id), self.offset
+                )
+                time.sleep(interval)
+
+    def _parse_lines(self, lines):
+        """
+        Parse job log lines containing Travis CI tags.
+
+        Parameters:
+        - lines : iterable of job log lines (str)
+        """
+        for line in lines:
+            self.travis_data.parse_job_log_line(line, self.check_timing_tags)
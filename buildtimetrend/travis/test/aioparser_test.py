@@ -0,0 +1,214 @@
+# vim: set expandtab sw=4 ts=4:
+#
+# Unit tests for asynchronous Travis CI connector and parser
+#
+# Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+#
+# This file is part of buildtimetrend/python-lib
+# <https://github.com/buildtimetrend/python-lib/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import unittest
+import mock
+from buildtimetrend.travis import connector
+from buildtimetrend.travis.parser import BaseTravisData
+from buildtimetrend.travis.parser import TravisData
+try:
+    # asyncio modules require Python 3.5 or later
+    import asyncio
+    from urllib.error import HTTPError
+    from buildtimetrend.benchmark.stub_server import StubTravisServer
+    from buildtimetrend.benchmark.stub_server import STUB_REPO
+    from buildtimetrend.benchmark.travis_api import percentile
+    from buildtimetrend.benchmark.travis_api import retrieve_builds
+    from buildtimetrend.travis.aioconnector import AsyncTravisConnector
+    from buildtimetrend.travis.aioconnector import AsyncTravisOrgConnector
+    from buildtimetrend.travis.aioparser import AsyncTravisData
+except (ImportError, SyntaxError):
+    pass
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "requires Python 3.5")
+class TestAsyncTravis(unittest.TestCase):
+
+    """Unit tests for AsyncTravisConnector and AsyncTravisData"""
+
+    def setUp(self):
+        """Initialise event loop and stub Travis CI API server."""
+        self.loop = asyncio.new_event_loop()
+        self.server = StubTravisServer(jobs_per_build=3, log_size=4096)
+        self.run_loop(self.server.start())
+
+        self.connector = AsyncTravisConnector(max_connections=2)
+        self.connector.api_url = self.server.url
+
+    def tearDown(self):
+        """Stop stub server and close event loop."""
+        self.run_loop(self.server.close())
+        self.loop.close()
+
+    def run_loop(self, coroutine):
+        """Run a coroutine in the event loop."""
+        return self.loop.run_until_complete(coroutine)
+
+    def test_novalue(self):
+        """Test freshly initialised connector and parser"""
+        self.assertEqual(
+            connector.TRAVIS_ORG_API_URL, AsyncTravisOrgConnector().api_url
+        )
+
+        # use async Travis Org connector by default
+        travis_data = AsyncTravisData(STUB_REPO, 1)
+        self.assertTrue(
+            isinstance(travis_data.connector, AsyncTravisOrgConnector)
+        )
+        travis_data = AsyncTravisData(
+            STUB_REPO, 1, connector.TravisOrgConnector()
+        )
+        self.assertTrue(
+            isinstance(travis_data.connector, AsyncTravisOrgConnector)
+        )
+
+        travis_data = AsyncTravisData(STUB_REPO, 1, self.connector)
+        self.assertEqual(self.connector, travis_data.connector)
+
+        # async classes share a base class with the sync classes
+        self.assertTrue(isinstance(travis_data, BaseTravisData))
+        self.assertFalse(isinstance(travis_data, TravisData))
+        self.assertTrue(
+            isinstance(self.connector, connector.BaseTravisConnector)
+        )
+        self.assertFalse(
+            isinstance(self.connector, connector.TravisConnector)
+        )
+        # async connector has no session, response cache or sync requests
+        self.assertFalse(hasattr(self.connector, "session"))
+        self.assertFalse(hasattr(self.connector, "cache"))
+        self.assertFalse(hasattr(self.connector, "download_job_log_part"))
+
+        # sync parser doesn't use an async connector
+        self.assertTrue(isinstance(
+            TravisData(STUB_REPO, 1, self.connector).connector,
+            connector.TravisOrgConnector
+        ))
+
+    def test_json_request(self):
+        """Test AsyncTravisConnector.json_request()"""
+        self.assertDictEqual(
+            {"branch": "master"},
+            self.run_loop(self.connector.json_request('jobs/2001'))["commit"]
+        )
+
+        with self.assertRaises(HTTPError) as context:
+            self.run_loop(self.connector.json_request('unknown'))
+        self.assertEqual(404, context.exception.code)
+
+    def test_download_job_log(self):
+        """Test AsyncTravisConnector.download_job_log(), with redirect"""
+        job_log = self.run_loop(self.connector.download_job_log(2001))
+        self.assertEqual(self.server.log, job_log.read())
+        # small log is kept in memory
+        self.assertFalse(job_log._rolled)
+        job_log.close()
+        # job log request is redirected
+        self.assertEqual(2, self.server.requests)
+
+        # large log is received in chunks and written to a temporary file
+        with mock.patch(
+            'buildtimetrend.travis.aioconnector.LOG_SPOOL_MAX_MEMORY', 1024
+        ), mock.patch('buildtimetrend.travis.aioconnector.CHUNK_SIZE', 512):
+            job_log = self.run_loop(self.connector.download_job_log(2001))
+        self.assertTrue(job_log._rolled)
+        self.assertEqual(self.server.log, job_log.read())
+        job_log.close()
+
+        # error response
+        with self.assertRaises(HTTPError) as context:
+            self.run_loop(self.connector.download_job_log("unknown"))
+        self.assertEqual(404, context.exception.code)
+
+    def test_get_build_data(self):
+        """Test AsyncTravisData.get_build_data()"""
+        travis_data = AsyncTravisData(STUB_REPO, 2, self.connector)
+        self.assertTrue(self.run_loop(travis_data.get_build_data()))
+        self.assertListEqual(
+            [2001, 2002, 2003],
+            travis_data.builds_data["builds"][0]["job_ids"]
+        )
+
+        # error response
+        travis_data = AsyncTravisData(STUB_REPO, "unknown", self.connector)
+        self.assertFalse(self.run_loop(travis_data.get_build_data()))
+        self.assertDictEqual({}, travis_data.builds_data)
+
+    def test_process_build_jobs(self):
+        """Test AsyncTravisData.process_build_jobs()"""
+        travis_data = AsyncTravisData(STUB_REPO, 2, self.connector)
+        self.assertListEqual(
+            [], self.run_loop(travis_data.process_build_jobs())
+        )
+
+        self.run_loop(travis_data.get_build_data())
+        build_jobs = self.run_loop(travis_data.process_build_jobs())
+
+        # build jobs are returned in job order
+        self.assertListEqual(
+            ["2.1", "2.2", "2.3"],
+            [build_job.get_property("job") for build_job in build_jobs]
+        )
+        self.assertListEqual(
+            ["2001", "2002", "2003"], sorted(travis_data.build_jobs.keys())
+        )
+        for build_job in build_jobs:
+            self.assertEqual("push", build_job.get_property("build_trigger"))
+            self.assertEqual(
+                self.server.substages, len(build_job.stages.stages)
+            )
+        self.assertEqual(
+            "script.1", build_jobs[0].stages.stages[0]["name"]
+        )
+
+        # number of concurrent requests is limited
+        self.assertLessEqual(self.server.max_active_requests, 2)
+
+    def test_process_build_jobs_workers(self):
+        """Test AsyncTravisData.process_build_jobs() with workers"""
+        travis_data = AsyncTravisData(STUB_REPO, 2, self.connector)
+        self.run_loop(travis_data.get_build_data())
+        build_jobs = self.run_loop(travis_data.process_build_jobs(workers=1))
+
+        self.assertListEqual(
+            ["2.1", "2.2", "2.3"],
+            [build_job.get_property("job") for build_job in build_jobs]
+        )
+        # jobs are processed one by one
+        self.assertEqual(1, self.server.max_active_requests)
+
+    def test_retrieve_builds(self):
+        """Test processing several builds concurrently with benchmark"""
+        duration, job_count, timed_connector = self.run_loop(
+            retrieve_builds(self.server, 10, 5)
+        )
+
+        self.assertEqual(30, job_count)
+        # 1 build request, 3 requests per job (job, log, redirected log)
+        self.assertEqual(100, self.server.requests)
+        self.assertLessEqual(self.server.max_active_requests, 5)
+        # latency is recorded per request, redirects included
+        self.assertEqual(70, len(timed_connector.latencies))
+        self.assertTrue(duration > 0)
+        self.assertEqual(2, percentile([3, 1, 2], 50))
+        self.assertEqual(3, percentile([3, 1, 2], 99))
@@ -0,0 +1,124 @@
+# vim: set expandtab sw=4 ts=4:
+#
+# Unit tests for parsing Travis CI job log files with a process pool
+#
+# Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+#
+# This file is part of buildtimetrend/python-lib
+# <https://github.com/buildtimetrend/python-lib/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from buildtimetrend.travis.batch import get_connector
+from buildtimetrend.travis.batch import parse_log_file
+from buildtimetrend.travis.batch import parse_log_files
+from buildtimetrend.travis.batch import ParsedStage
+from buildtimetrend.travis.connector import TravisOrgConnector
+from buildtimetrend.travis.parser import TravisData
+import mock
+import unittest
+
+TRAVIS_LOG_FILE = "buildtimetrend/test/test_sample_travis_log"
+TRAVIS_TIMING_TAGS_FILE = "buildtimetrend/test/test_sample_travis_time_tags"
+MISSING_LOG_FILE = "buildtimetrend/test/no_such_log_file"
+
+
+class TestBatch(unittest.TestCase):
+
+    """Unit tests for parsing job log files with a process pool"""
+
+    def test_get_connector(self):
+        """Test get_connector()"""
+        connector = get_connector()
+        self.assertTrue(isinstance(connector, TravisOrgConnector))
+        # connector is shared
+        self.assertEqual(connector, get_connector())
+
+        with mock.patch(
+                'buildtimetrend.travis.batch.TravisOrgConnector'
+        ) as connector_class:
+            parse_log_file(TRAVIS_LOG_FILE)
+            parse_log_file(TRAVIS_LOG_FILE)
+        connector_class.assert_not_called()
+
+    def test_parse_log_file(self):
+        """Test parse_log_file()"""
+        result = parse_log_file(MISSING_LOG_FILE)
+        self.assertEqual(MISSING_LOG_FILE, result.filename)
+        self.assertEqual(None, result.stages)
+
+        # file can't be read
+        with mock.patch('buildtimetrend.travis.batch.TravisData.'
+                        'parse_job_log_file', side_effect=IOError):
+            result = parse_log_file(TRAVIS_LOG_FILE)
+        self.assertEqual(TRAVIS_LOG_FILE, result.filename)
+        self.assertEqual(None, result.stages)
+
+        result = parse_log_file(TRAVIS_LOG_FILE)
+        self.assertEqual(TRAVIS_LOG_FILE, result.filename)
+        self.assertEqual(18, len(result.stages))
+        self.assertEqual("worker-linux-12-1.bb.travis-ci.org",
+                         result.worker["hostname"])
+
+        stage = result.stages[0]
+        self.assertTrue(isinstance(stage, ParsedStage))
+        self.assertEqual("git.1", stage.name)
+        self.assertAlmostEqual(1408282815.3, stage.started_at, 1)
+        self.assertTrue(stage.finished_at > stage.started_at)
+        self.assertAlmostEqual(
+            stage.finished_at - stage.started_at, stage.duration, 2
+        )
+
+    def test_parse_log_files(self):
+        """Test parse_log_files()"""
+        self.assertListEqual([], list(parse_log_files([])))
+
+        filenames = [TRAVIS_LOG_FILE, MISSING_LOG_FILE,
+                     TRAVIS_TIMING_TAGS_FILE] * 3
+        results = list(parse_log_files(filenames, processes=2, chunk_size=2))
+
+        # results are returned in order of the files
+        self.assertListEqual(
+            filenames, [result.filename for result in results]
+        )
+        self.assertListEqual(
+            [18, None, 4] * 3,
+            [
+                len(result.stages) if result.stages is not None else None
+                for result in results
+            ]
+        )
+        self.assertEqual(parse_log_file(TRAVIS_LOG_FILE), results[3])
+
+    def test_parse_log_files_unreadable(self):
+        """Test parse_log_files() with a file that can't be read"""
+        parse_job_log_file = TravisData.parse_job_log_file
+
+        def parse_or_fail(travis_data, filename, use_mmap=False):
+            """Fail reading the timing tags file."""
+            if filename == TRAVIS_TIMING_TAGS_FILE:
+                raise IOError("Permission denied")
+            return parse_job_log_file(travis_data, filename, use_mmap)
+
+        filenames = [TRAVIS_TIMING_TAGS_FILE, TRAVIS_LOG_FILE]
+        with mock.patch.object(
+                TravisData, 'parse_job_log_file', parse_or_fail):
+            results = list(parse_log_files(filenames, processes=2))
+
+        # other files are parsed
+        self.assertListEqual(
+            filenames, [result.filename for result in results]
+        )
+        self.assertEqual(None, results[0].stages)
+        self.assertEqual(18, len(results[1].stages))
@@ -0,0 +1,142 @@
+# vim: set expandtab sw=4 ts=4:
+#
+# Unit tests for Travis CI API response cache
+#
+# Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+#
+# This file is part of buildtimetrend/python-lib
+# <https://github.com/buildtimetrend/python-lib/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import shutil
+import tempfile
+from buildtimetrend.settings import Settings
+from buildtimetrend.travis.cache import get_response_cache
+from buildtimetrend.travis.cache import ResponseCache
+import unittest
+
+URL1 = "https://api.travis-ci.org/jobs/1"
+URL2 = "https://api.travis-ci.org/jobs/2"
+URL3 = "https://api.travis-ci.org/jobs/3"
+
+
+class TestResponseCache(unittest.TestCase):
+
+    """Unit tests for ResponseCache"""
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        self.path = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.path, "cache"))
+
+    def tearDown(self):
+        """Remove cache directory."""
+        shutil.rmtree(self.path)
+        Settings().__init__()
+
+    def test_get_response_cache(self):
+        """Test get_response_cache()"""
+        # disabled by default
+        self.assertEqual(None, get_response_cache())
+
+        Settings().add_setting(
+            "travis_cache",
+            {"enabled": True, "path": self.path, "max_size": 2}
+        )
+        cache = get_response_cache()
+        self.assertEqual(self.path, cache.path)
+        self.assertEqual(2 * 1024 * 1024, cache.max_size)
+        self.assertTrue(cache.revalidate)
+
+    def test_store(self):
+        """Test storing and reading a response"""
+        self.assertEqual(None, self.cache.get(URL1))
+        self.assertEqual(0, self.cache.get_size())
+
+        content = b'travis_fold:start:git.1\r\x1b[0K\n' * 1000
+        metadata = self.cache.store(
+            URL1, io.BytesIO(content), '"1234"', "Sat, 17 Jun 2016"
+        )
+        self.assertDictEqual(metadata, self.cache.get(URL1))
+        self.assertEqual(URL1, metadata["url"])
+        self.assertEqual('"1234"', metadata["etag"])
+        self.assertEqual("Sat, 17 Jun 2016", metadata["last_modified"])
+        self.assertEqual(content, self.cache.read(URL1))
+
+        # response is stored compressed
+        self.assertTrue(metadata["size"] < len(content) / 10)
+        self.assertEqual(metadata["size"], self.cache.get_size())
+
+        # replace response
+        self.cache.store(URL1, io.BytesIO(b'{}'))
+        self.assertEqual(b'{}', self.cache.read(URL1))
+        self.assertEqual(None, self.cache.get(URL1)["etag"])
+        self.assertEqual(2, len(os.listdir(self.cache.path)))
+
+        # cache is loaded from disk
+        cache = ResponseCache(self.cache.path)
+        self.assertEqual(b'{}', cache.read(URL1))
+        self.assertEqual(self.cache.get_size(), cache.get_size())
+
+    def test_open_removed(self):
+        """Test opening a response that isn't cached (anymore)"""
+        self.assertEqual(None, self.cache.open(URL1))
+        self.assertEqual(None, self.cache.read(URL1))
+
+        self.cache.store(URL1, io.BytesIO(b'{}'))
+        cache_file = self.cache.open(URL1)
+        # opened file can be read after it is removed
+        os.remove(self.cache.get_filename(self.cache.get_key(URL1)))
+        self.assertEqual(b'{}', cache_file.read())
+        cache_file.close()
+
+        # file removed by another process
+        self.assertEqual(None, self.cache.open(URL1))
+        self.assertEqual(None, self.cache.get(URL1))
+        self.assertEqual(0, self.cache.get_size())
+
+    def test_set_final(self):
+        """Test marking a cached response as final"""
+        self.assertFalse(self.cache.set_final(URL1))
+
+        self.cache.store(URL1, io.BytesIO(b'{}'))
+        self.assertFalse(self.cache.get(URL1)["final"])
+        self.assertTrue(self.cache.set_final(URL1))
+        self.assertTrue(self.cache.get(URL1)["final"])
+
+        # replaced response isn't final
+        self.cache.store(URL1, io.BytesIO(b'{}'))
+        self.assertFalse(self.cache.get(URL1)["final"])
+        self.cache.store(URL1, io.BytesIO(b'{}'), final=True)
+        self.assertTrue(self.cache.get(URL1)["final"])
+
+    def test_evict(self):
+        """Test removing least recently used responses"""
+        for url in (URL1, URL2):
+            self.cache.store(url, io.BytesIO(os.urandom(1000)))
+        size = self.cache.get_size()
+
+        # use URL1, so URL2 is least recently used
+        self.cache.max_size = size + 500
+        self.assertNotEqual(None, self.cache.get(URL1))
+
+        self.cache.store(URL3, io.BytesIO(os.urandom(1000)))
+        self.assertEqual(None, self.cache.get(URL2))
+        self.assertNotEqual(None, self.cache.get(URL1))
+        self.assertNotEqual(None, self.cache.get(URL3))
+        self.assertTrue(self.cache.get_size() <= self.cache.max_size)
+        self.assertEqual(4, len(os.listdir(self.cache.path)))
@@ -0,0 +1,318 @@
+# vim: set expandtab sw=4 ts=4:
+#
+# Unit tests for Travis CI connector
+#
+# Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+#
+# This file is part of buildtimetrend/python-lib
+# <https://github.com/buildtimetrend/python-lib/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import mock
+from six.moves.BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from six.moves.socketserver import ThreadingMixIn
+from buildtimetrend.travis import connector
+from buildtimetrend.travis.connector import TravisConnector
+from buildtimetrend.travis.connector import TravisOrgConnector
+from buildtimetrend.travis.cache import ResponseCache
+import unittest
+try:
+    # For Python 3.0 and later
+    from urllib.error import HTTPError, URLError
+except ImportError:
+    # Fall back to Python 2's urllib2
+    from urllib2 import HTTPError, URLError
+
+JOB_LOG = b'travis_fold:start:git.1\r\x1b[0K\n' * 100
+JOB_1 = {"job": {
+    "id": 1, "state": "passed", "finished_at": "2014-08-17T13:40:14Z"
+}}
+JOB_3 = {"job": {"id": 3, "state": "started", "finished_at": None}}
+
+
+class LocalAPIServer(ThreadingMixIn, HTTPServer):
+
+    """Local Travis CI API server, handling each connection in a thread."""
+
+    daemon_threads = True
+
+
+class LocalAPIHandler(BaseHTTPRequestHandler):
+
+    """Request handler of a local Travis CI API, with keep-alive."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """Respond to a GET request."""
+        server = self.server
+        server.requests.append(self.path)
+        server.clients.add(self.client_address)
+
+        headers = {}
+        if self.path == '/jobs/1' and \
+                self.headers.get('if-none-match') == '"job1"':
+            body = b''
+            status = 304
+        elif self.path == '/jobs/1':
+            body = json.dumps(JOB_1).encode('utf-8')
+            status = 200
+            headers['ETag'] = '"job1"'
+        elif self.path == '/jobs/3' and \
+                self.headers.get('if-none-match') == '"job3"':
+            body = b''
+            status = 304
+        elif self.path == '/jobs/3':
+            body = json.dumps(JOB_3).encode('utf-8')
+            status = 200
+            headers['ETag'] = '"job3"'
+        elif self.path in ('/jobs/1/log', '/jobs/3/log'):
+            body = JOB_LOG
+            status = 200
+        elif self.path == '/jobs/2/log' and self.headers.get('range'):
+            # supports ranges with only a start : bytes=<start>-
+            start = int(self.headers.get('range')[6:-1])
+            if start >= len(JOB_LOG):
+                body = b''
+                status = 416
+            else:
+                body = JOB_LOG[start:]
+                status = 206
+        elif self.path == '/jobs/2/log':
+            body = JOB_LOG
+            status = 200
+        elif self.path == '/unavailable' and server.failures > 0:
+            server.failures -= 1
+            body = b'{}'
+            status = 503
+        elif self.path == '/unavailable':
+            body = b'{"available": true}'
+            status = 200
+        else:
+            body = b'Not Found'
+            status = 404
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Don't log requests."""
+        pass
+
+
+class TestTravisConnector(unittest.TestCase):
+
+    """Unit tests for TravisConnector"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Start a local Travis CI API server."""
+        cls.server = LocalAPIServer(('127.0.0.1', 0), LocalAPIHandler)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop local Travis CI API server."""
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        self.server.requests = []
+        self.server.clients = set()
+        self.server.failures = 0
+
+        self.connector = TravisConnector(backoff_factor=0)
+        self.connector.api_url = 'http://127.0.0.1:{0:d}/'.format(
+            self.server.server_address[1]
+        )
+
+    def tearDown(self):
+        """Close connections."""
+        self.connector.session.close()
+
+    def test_novalue(self):
+        """Test freshly initialised connector"""
+        self.assertEqual(None, TravisConnector().api_url)
+        self.assertEqual(connector.DEFAULT_TIMEOUT, TravisConnector().timeout)
+        self.assertEqual(
+            connector.TRAVIS_ORG_API_URL, TravisOrgConnector().api_url
+        )
+        self.assertEqual(5, TravisOrgConnector(timeout=5).timeout)
+
+    def test_json_request(self):
+        """Test json_request()"""
+        self.assertDictEqual(
+            JOB_1, self.connector.json_request('jobs/1')
+        )
+
+    def test_download_job_log(self):
+        """Test download_job_log()"""
+        self.assertEqual(JOB_LOG, self.connector.download_job_log(1).read())
+
+    def test_download_job_log_part(self):
+        """Test download_job_log_part()"""
+        # range requests are supported
+        self.assertEqual(
+            JOB_LOG, self.connector.download_job_log_part(2).read()
+        )
+        self.assertEqual(
+            JOB_LOG[100:], self.connector.download_job_log_part(2, 100).read()
+        )
+        self.assertEqual(
+            b'', self.connector.download_job_log_part(2, len(JOB_LOG)).read()
+        )
+
+        # range requests are not supported, complete log is returned
+        self.assertEqual(
+            JOB_LOG[100:], self.connector.download_job_log_part(1, 100).read()
+        )
+        self.assertEqual(
+            b'', self.connector.download_job_log_part(1, len(JOB_LOG)).read()
+        )
+
+    def test_keep_alive(self):
+        """Test if requests reuse a connection"""
+        for _ in range(3):
+            self.connector.json_request('jobs/1')
+            self.connector.download_job_log(1).read()
+
+        self.assertEqual(6, len(self.server.requests))
+        self.assertEqual(1, len(self.server.clients))
+
+    def test_errors(self):
+        """Test error responses and connection errors"""
+        with self.assertRaises(HTTPError) as context:
+            self.connector.json_request('unknown')
+        self.assertEqual(404, context.exception.code)
+        # client errors are not retried
+        self.assertEqual(1, len(self.server.requests))
+
+        self.connector.api_url = "http://127.0.0.1:1/"
+        self.assertRaises(URLError, self.connector.json_request, 'jobs/1')
+
+    def test_retry(self):
+        """Test retrying requests after server errors"""
+        self.server.failures = 2
+        self.assertDictEqual(
+            {"available": True}, self.connector.json_request('unavailable')
+        )
+        self.assertEqual(3, len(self.server.requests))
+
+        # give up after the maximum number of retries
+        self.server.failures = 5
+        with self.assertRaises(HTTPError) as context:
+            self.connector.json_request('unavailable')
+        self.assertEqual(503, context.exception.code)
+        self.assertEqual(3 + connector.DEFAULT_RETRIES + 1,
+                         len(self.server.requests))
+
+    def test_is_finished_response(self):
+        """Test is_finished_response()"""
+        self.assertFalse(connector.is_finished_response(None))
+        self.assertFalse(connector.is_finished_response({}))
+        self.assertFalse(connector.is_finished_response({"commits": []}))
+        self.assertTrue(connector.is_finished_response(JOB_1))
+        self.assertFalse(connector.is_finished_response(JOB_3))
+
+        # all jobs of a build should be finished
+        self.assertTrue(connector.is_finished_response({
+            "build": JOB_1["job"], "jobs": [JOB_1["job"]]
+        }))
+        self.assertFalse(connector.is_finished_response({
+            "build": JOB_1["job"], "jobs": [JOB_1["job"], JOB_3["job"]]
+        }))
+        self.assertFalse(connector.is_finished_response({
+            "builds": [JOB_3["job"]]
+        }))
+
+    def test_cache(self):
+        """Test caching responses, revalidated with ETag"""
+        cache_path = tempfile.mkdtemp()
+        self.connector.cache = ResponseCache(cache_path)
+
+        try:
+            # second request of job data is revalidated (304 response)
+            for _ in range(2):
+                self.assertDictEqual(
+                    JOB_1, self.connector.json_request('jobs/1')
+                )
+                self.assertEqual(
+                    JOB_LOG, self.connector.download_job_log(1).read()
+                )
+            self.assertEqual(4, len(self.server.requests))
+            self.assertEqual(
+                '"job1"',
+                self.connector.cache.get(
+                    self.connector.api_url + 'jobs/1'
+                )["etag"]
+            )
+
+            # use cached responses without contacting the API
+            self.connector.cache.revalidate = False
+            self.assertDictEqual(
+                JOB_1, self.connector.json_request('jobs/1')
+            )
+            self.assertEqual(
+                JOB_LOG, self.connector.download_job_log(1).read()
+            )
+            self.assertEqual(4, len(self.server.requests))
+
+            # cached response removed by another process before it is opened
+            with mock.patch.object(
+                    self.connector.cache, 'open', return_value=None
+            ):
+                self.assertDictEqual(
+                    JOB_1, self.connector.json_request('jobs/1')
+                )
+            self.assertEqual(6, len(self.server.requests))
+
+            # errors are not cached
+            self.assertRaises(
+                HTTPError, self.connector.json_request, 'unknown'
+            )
+            self.assertEqual(4, len(os.listdir(cache_path)))
+
+            # job data of a running job is always revalidated,
+            # its job log isn't cached
+            self.server.requests = []
+            for _ in range(2):
+                self.assertDictEqual(
+                    JOB_3, self.connector.json_request('jobs/3')
+                )
+                self.assertEqual(
+                    JOB_LOG, self.connector.download_job_log(3).read()
+                )
+            self.assertEqual(4, len(self.server.requests))
+            self.assertFalse(self.connector.cache.get(
+                self.connector.api_url + 'jobs/3'
+            )["final"])
+            self.assertEqual(None, self.connector.cache.get(
+                self.connector.api_url + 'jobs/3/log'
+            ))
+            self.assertEqual(set(["1"]), self.connector.finished_jobs)
+        finally:
+            shutil.rmtree(cache_path)
@@ -0,0 +1,218 @@
+# vim: set expandtab sw=4 ts=4:
+#
+# Unit tests for Travis CI build importer
+#
+# Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+#
+# This file is part of buildtimetrend/python-lib
+# <https://github.com/buildtimetrend/python-lib/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import mock
+from buildtimetrend.settings import Settings
+from buildtimetrend.travis.connector import TravisConnector
+from buildtimetrend.travis.connector import TravisOrgConnector
+from buildtimetrend.travis.importer import BuildImporter
+import unittest
+try:
+    # For Python 3.0 and later
+    from urllib.error import URLError
+except ImportError:
+    # Fall back to Python 2's urllib2
+    from urllib2 import URLError
+
+TEST_REPO = "buildtimetrend/python-lib"
+
+
+class LocalBuildsConnector(TravisConnector):
+
+    """Travis connector returning builds with two jobs, without network."""
+
+    def __init__(self, failing_builds=()):
+        """Constructor."""
+        super(LocalBuildsConnector, self).__init__()
+        self.failing_builds = failing_builds
+        self.requested_builds = []
+        self.lock = threading.Lock()
+
+    def json_request(self, json_request):
+        """Return build or job data."""
+        if "number=" in json_request:
+            build = json_request.split("number=")[1]
+            with self.lock:
+                self.requested_builds.append(build)
+            if build in self.failing_builds:
+                raise URLError("build {0!s} failed".format(build))
+            return {"builds": [{
+                "job_ids": [int(build) * 10 + 1, int(build) * 10 + 2],
+                "event_type": "push"
+            }]}
+
+        job_id = int(json_request.split("/")[1])
+        return {
+            "job": {
+                "number": "{0:d}.{1:d}".format(job_id // 10, job_id % 10),
+                "repository_slug": TEST_REPO,
+                "state": "passed",
+                "started_at": "2014-08-17T13:40:14Z",
+                "finished_at": "2014-08-17T13:45:14Z",
+                "config": {"language": "python"}
+            },
+            "commit": {"branch": "master"}
+        }
+
+    def download_job_log(self, job_id):
+        """Return empty job log."""
+        return io.BytesIO(b'')
+
+
+class RecordingBuildImporter(BuildImporter):
+
+    """Build importer storing build jobs in a list."""
+
+    def __init__(self, *args, **kwargs):
+        """Constructor."""
+        super(RecordingBuildImporter, self).__init__(*args, **kwargs)
+        self.stored_jobs = []
+
+    def store_build_job(self, build_job, data_detail):
+        """Store build job in a list."""
+        self.stored_jobs.append(build_job.get_property("job"))
+
+
+class TestBuildImporter(unittest.TestCase):
+
+    """Unit tests for BuildImporter"""
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        self.settings = Settings()
+        self.settings.__init__()
+        self.settings.add_setting(
+            "multi_import", {"max_builds": 100, "delay": 0}
+        )
+        self.path = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.path, "state.json")
+
+    def tearDown(self):
+        """Remove state file."""
+        shutil.rmtree(self.path)
+        self.settings.__init__()
+
+    def test_novalue(self):
+        """Test freshly initialised importer"""
+        self.settings.__init__()
+        importer = BuildImporter(TEST_REPO, 10, 14)
+        # a connector is created once, it is shared by all builds
+        self.assertTrue(isinstance(importer.connector, TravisOrgConnector))
+        self.assertListEqual(
+            ["10", "11", "12", "13", "14"], importer.builds
+        )
+        self.assertEqual(100, importer.max_builds)
+        self.assertEqual(3, importer.delay)
+        self.assertDictEqual(
+            {"repo": TEST_REPO, "imported": [], "failed": []},
+            importer.state
+        )
+
+    def test_run(self):
+        """Test importing builds, resuming an import"""
+        connector = LocalBuildsConnector(failing_builds=["3"])
+        importer = RecordingBuildImporter(
+            TEST_REPO, 1, 5, self.state_file, connector, workers=3
+        )
+        self.assertDictEqual(
+            {"imported": 4, "failed": 1, "skipped": 0, "remaining": 0},
+            importer.run()
+        )
+        self.assertListEqual(
+            ["1.1", "1.2", "2.1", "2.2", "4.1", "4.2", "5.1", "5.2"],
+            sorted(importer.stored_jobs)
+        )
+
+        # progress is saved in state file
+        with open(self.state_file) as state_file:
+            state = json.load(state_file)
+        self.assertListEqual(["1", "2", "4", "5"], sorted(state["imported"]))
+        self.assertListEqual(["3"], state["failed"])
+
+        # resume import : only failed build is retried
+        connector = LocalBuildsConnector()
+        importer = RecordingBuildImporter(
+            TEST_REPO, 1, 6, self.state_file, connector
+        )
+        self.assertDictEqual(
+            {"imported": 2, "failed": 0, "skipped": 4, "remaining": 0},
+            importer.run()
+        )
+        self.assertListEqual(["3", "6"], sorted(connector.requested_builds))
+        self.assertListEqual([], importer.state["failed"])
+
+        # state file of another repo is ignored
+        importer = BuildImporter("test/repo", 1, 6, self.state_file)
+        self.assertListEqual([], importer.state["imported"])
+
+    def test_max_builds(self):
+        """Test limiting the number of builds in one run"""
+        self.settings.add_setting("multi_import", {"max_builds": 2})
+        connector = LocalBuildsConnector()
+        importer = RecordingBuildImporter(
+            TEST_REPO, 1, 5, self.state_file, connector
+        )
+        self.assertDictEqual(
+            {"imported": 2, "failed": 0, "skipped": 0, "remaining": 3},
+            importer.run()
+        )
+        self.assertListEqual(["1", "2"], sorted(connector.requested_builds))
+
+    @mock.patch('buildtimetrend.keenio.is_readable', return_value=True)
+    @mock.patch(
+        'buildtimetrend.keenio.get_build_ids', return_value=["2", "3"]
+    )
+    def test_skip_builds_in_keen(self, get_build_ids_func, readable_func):
+        """Test skipping builds that exist in Keen.io, with one query"""
+        connector = LocalBuildsConnector()
+        importer = RecordingBuildImporter(
+            TEST_REPO, 1, 4, None, connector
+        )
+        self.assertDictEqual(
+            {"imported": 2, "failed": 0, "skipped": 2, "remaining": 0},
+            importer.run()
+        )
+        self.assertListEqual(["1", "4"], sorted(connector.requested_builds))
+        get_build_ids_func.assert_called_once_with(TEST_REPO)
+
+        # Keen.io errors don't stop the import
+        get_build_ids_func.side_effect = SystemError
+        self.assertListEqual(["2", "3"], importer.get_pending_builds())
+
+    def test_delay(self):
+        """Test spacing the start of builds by the delay setting"""
+        self.settings.add_setting("multi_import", {"delay": 0.05})
+        importer = RecordingBuildImporter(
+            TEST_REPO, 1, 3, None, LocalBuildsConnector(), workers=3
+        )
+
+        start = time.time()
+        importer.run()
+        self.assertTrue(time.time() - start >= 0.1)
+        self.assertEqual(6, len(importer.stored_jobs))
@@ -0,0 +1,266 @@
+# vim: set expandtab sw=4 ts=4:
+#
+# Unit tests for Travis CI job log reader
+#
+# Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+#
+# This file is part of buildtimetrend/python-lib
+# <https://github.com/buildtimetrend/python-lib/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+import io
+import tempfile
+from buildtimetrend.travis.logreader import decode_line
+from buildtimetrend.travis.logreader import find_first_marker
+from buildtimetrend.travis.logreader import find_tagged_lines
+from buildtimetrend.travis.logreader import get_markers
+from buildtimetrend.travis.logreader import iter_tagged_lines
+from buildtimetrend.travis.logreader import iter_mapped_tagged_lines
+from buildtimetrend.travis.logreader import truncate_line
+from buildtimetrend.travis.logreader import TaggedLineReader
+from buildtimetrend.travis.logreader import TRAVIS_LOG_MARKERS
+from buildtimetrend.travis.logreader import TRAVIS_LOG_MARKER_WORKER
+import unittest
+
+TRAVIS_LOG_FILE = "buildtimetrend/test/test_sample_travis_log"
+LOG_BYTES = b'output\ntravis_fold:start:git.1\r\x1b[0K\n' \
+    b'output\n\xff\xfeinvalid\nUsing worker: host:os\n' \
+    b'travis_fold:end:git.1\r\x1b[0K'
+
+
+class TestLogReader(unittest.TestCase):
+
+    """Unit tests for Travis CI job log reader"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up test fixture."""
+        # show full diff in case of assert mismatch
+        cls.maxDiff = None
+
+        with open(TRAVIS_LOG_FILE, 'rb') as log_file:
+            cls.log_lines = log_file.readlines()
+
+        cls.tagged_lines = [
+            line.decode('utf-8') for line in cls.log_lines
+            if b'travis_' in line or b'Using worker:' in line
+        ]
+
+    def test_decode_line(self):
+        """Test decode_line()"""
+        self.assertEqual(u'', decode_line(b''))
+        self.assertEqual(u'travis_\n', decode_line(b'travis_\n'))
+        self.assertEqual(u'\ufffdtravis_', decode_line(b'\xfftravis_'))
+
+    def test_get_markers(self):
+        """Test get_markers()"""
+        self.assertListEqual(TRAVIS_LOG_MARKERS, get_markers())
+        self.assertListEqual(TRAVIS_LOG_MARKERS, get_markers(True))
+        self.assertListEqual([TRAVIS_LOG_MARKER_WORKER], get_markers(False))
+
+    def test_find_tagged_lines(self):
+        """Test find_tagged_lines()"""
+        self.assertListEqual([], list(find_tagged_lines(b'')))
+        self.assertListEqual([], list(find_tagged_lines(b'no\ntags\n')))
+
+        self.assertListEqual(
+            [(7, 36), (53, 75), (75, 101)],
+            list(find_tagged_lines(LOG_BYTES))
+        )
+
+        # only search one marker
+        self.assertListEqual(
+            [(53, 75)],
+            list(find_tagged_lines(LOG_BYTES, [TRAVIS_LOG_MARKER_WORKER]))
+        )
+
+        # search part of the buffer
+        self.assertListEqual(
+            [(53, 75)],
+            list(find_tagged_lines(LOG_BYTES, None, 36, 75))
+        )
+
+        # line with several markers is returned once
+        self.assertListEqual(
+            [(0, 30)],
+            list(find_tagged_lines(b'travis_ Using worker: travis_\n'))
+        )
+
+    def test_iter_tagged_lines(self):
+        """Test iter_tagged_lines()"""
+        self.assertListEqual([], list(iter_tagged_lines(io.BytesIO(b''))))
+
+        expected = [
+            u'travis_fold:start:git.1\r\x1b[0K\n',
+            u'Using worker: host:os\n',
+            u'travis_fold:end:git.1\r\x1b[0K'
+        ]
+        self.assertListEqual(
+            expected, list(iter_tagged_lines(io.BytesIO(LOG_BYTES)))
+        )
+
+        # lines spanning several chunks
+        for chunk_size in (1, 2, 7, 30):
+            stream = io.BytesIO(LOG_BYTES)
+            self.assertListEqual(
+                expected, list(iter_tagged_lines(stream, None, chunk_size))
+            )
+
+        # stream in text mode
+        self.assertListEqual(
+            [u'Using worker: host:os\n'],
+            list(iter_tagged_lines(
+                io.StringIO(u'\xe9\nUsing worker: host:os\n'),
+                [TRAVIS_LOG_MARKER_WORKER]
+            ))
+        )
+
+    def test_iter_tagged_lines_sample_log(self):
+        """Test iter_tagged_lines() with a sample Travis CI log file"""
+        for chunk_size in (100, 1024, 64 * 1024):
+            with open(TRAVIS_LOG_FILE, 'rb') as log_file:
+                self.assertListEqual(
+                    self.tagged_lines,
+                    list(iter_tagged_lines(log_file, None, chunk_size))
+                )
+
+    def test_tagged_line_reader(self):
+        """Test TaggedLineReader"""
+        reader = TaggedLineReader()
+        self.assertListEqual([], list(reader.feed(b'output\ntravis_fold:')))
+        # incomplete line is kept until the rest of the line is received
+        self.assertEqual(b'travis_fold:', reader.pending)
+        self.assertListEqual(
+            [u'travis_fold:start:git.1\r\x1b[0K\n'],
+            list(reader.feed(b'start:git.1\r\x1b[0K\noutput\nUsing'))
+        )
+        self.assertListEqual(
+            [u'Using worker: host:os\n'],
+            list(reader.feed(b' worker: host:os\ntravis_fold:end:git.1'))
+        )
+
+        # last line without newline
+        self.assertListEqual(
+            [u'travis_fold:end:git.1'], list(reader.flush())
+        )
+        self.assertEqual(b'', reader.pending)
+        self.assertListEqual([], list(reader.flush()))
+
+    def test_find_first_marker(self):
+        """Test find_first_marker()"""
+        self.assertEqual(-1, find_first_marker(b''))
+        self.assertEqual(-1, find_first_marker(b'output\n'))
+        self.assertEqual(0, find_first_marker(b'travis_ Using worker:'))
+        self.assertEqual(3, find_first_marker(b'abcUsing worker: travis_'))
+        self.assertEqual(
+            -1, find_first_marker(b'travis_', [TRAVIS_LOG_MARKER_WORKER])
+        )
+
+    def test_truncate_line(self):
+        """Test truncate_line()"""
+        # line without marker is discarded, except for the overlap
+        line = bytearray(b'0123456789abcdefghij')
+        self.assertEqual(None, truncate_line(line, None, 10))
+        self.assertEqual(bytearray(b'89abcdefghij'), line)
+
+        line = bytearray(b'0123456789abcdefghij')
+        self.assertEqual(
+            None, truncate_line(line, [TRAVIS_LOG_MARKERS[0]], 10)
+        )
+        self.assertEqual(bytearray(b'efghij'), line)
+
+        # overlap contains beginning of a marker
+        line = bytearray(b'0123456789abcdefUsing')
+        self.assertEqual(None, truncate_line(line, None, 10))
+        self.assertEqual(bytearray(b'9abcdefUsing'), line)
+
+        # part before marker is discarded
+        line = bytearray(b'0123456789travis_')
+        self.assertEqual(None, truncate_line(line, None, 10))
+        self.assertEqual(bytearray(b'travis_'), line)
+
+        # line with marker is truncated
+        line = bytearray(b'0123travis_fold:start:git.1')
+        self.assertEqual(b'travis_fol', truncate_line(line, None, 10))
+        self.assertEqual(bytearray(b'd:start:git.1'), line)
+
+    def test_iter_tagged_lines_max_line_length(self):
+        """Test iter_tagged_lines() with lines exceeding maximum length"""
+        log_bytes = b'0123456789' * 10 + b'\n' \
+            b'travis_fold:start:git.1\n' + \
+            b'0123456789' * 10 + b'Using worker: host:os\n' + \
+            b'0123456789' * 10 + b'travis_fold:end:git.1\n'
+        expected = [
+            u'travis_fold:start:git.1\n',
+            u'Using worker: host:os\n',
+            u'travis_fold:end:git.1\n'
+        ]
+
+        # lines without marker are skipped, part before marker is discarded,
+        # except for the bytes kept to find a marker spanning two chunks
+        for chunk_size in (1, 7, 30):
+            lines = list(iter_tagged_lines(
+                io.BytesIO(log_bytes), None, chunk_size, 30
+            ))
+            self.assertEqual(len(expected), len(lines))
+            for expected_line, line in zip(expected, lines):
+                self.assertTrue(line.endswith(expected_line))
+                self.assertLessEqual(len(line), len(expected_line) + 12)
+
+        # tagged lines are truncated, remaining part is skipped
+        self.assertListEqual(
+            [
+                u'travis_fold:start:',
+                u'Using worker: host',
+                u'travis_fold:end:gi'
+            ],
+            list(iter_tagged_lines(io.BytesIO(log_bytes), None, 1, 18))
+        )
+
+    def test_iter_mapped_tagged_lines(self):
+        """Test iter_mapped_tagged_lines()"""
+        with tempfile.TemporaryFile() as log_file:
+            # empty file
+            self.assertListEqual([], list(iter_mapped_tagged_lines(log_file)))
+
+            log_file.write(LOG_BYTES)
+            log_file.flush()
+
+            expected = [
+                u'travis_fold:start:git.1\r\x1b[0K\n',
+                u'Using worker: host:os\n',
+                u'travis_fold:end:git.1\r\x1b[0K'
+            ]
+            self.assertListEqual(
+                expected, list(iter_mapped_tagged_lines(log_file))
+            )
+            # windows smaller than a line
+            self.assertListEqual(
+                expected, list(iter_mapped_tagged_lines(log_file, None, 1))
+            )
+            self.assertListEqual(
+                [u'Using worker: host:os\n'],
+                list(iter_mapped_tagged_lines(
+                    log_file, [TRAVIS_LOG_MARKER_WORKER]
+                ))
+            )
+
+    def test_iter_mapped_tagged_lines_sample_log(self):
+        """Test iter_mapped_tagged_lines() with a sample Travis CI log file"""
+        for window in (1, 4096, 16 * 1024 * 1024):
+            with open(TRAVIS_LOG_FILE, 'rb') as log_file:
+                self.assertListEqual(
+                    self.tagged_lines,
+                    list(iter_mapped_tagged_lines(log_file, None, window))
+                )
@@ -0,0 +1,129 @@
+# vim: set expandtab sw=4 ts=4:
+#
+# Unit tests for Travis CI build pipeline
+#
+# Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+#
+# This file is part of buildtimetrend/python-lib
+# <https://github.com/buildtimetrend/python-lib/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import threading
+import mock
+from buildtimetrend.buildjob import BuildJob
+from buildtimetrend.travis.connector import TravisOrgConnector
+from buildtimetrend.travis.pipeline import BuildPipeline
+from buildtimetrend.travis.pipeline import LOG_SPOOL_MAX_MEMORY
+from buildtimetrend.travis.pipeline import PIPELINE_STAGES
+from buildtimetrend.travis.pipeline import spool_job_log
+from buildtimetrend.travis.pipeline import upload_build_job
+from buildtimetrend.travis.test.importer_test import LocalBuildsConnector
+from buildtimetrend.travis.test.importer_test import TEST_REPO
+import unittest
+
+
+class TestBuildPipeline(unittest.TestCase):
+
+    """Unit tests for BuildPipeline"""
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        self.uploaded_jobs = []
+        self.lock = threading.Lock()
+
+    def upload(self, build_job):
+        """Store uploaded build job."""
+        with self.lock:
+            self.uploaded_jobs.append(build_job)
+
+    def test_novalue(self):
+        """Test freshly initialised pipeline"""
+        pipeline = BuildPipeline()
+        # a connector is created once, it is shared by all builds
+        self.assertTrue(isinstance(pipeline.connector, TravisOrgConnector))
+
+        connector = LocalBuildsConnector()
+        self.assertEqual(connector, BuildPipeline(connector).connector)
+
+    def test_pipeline(self):
+        """Test processing builds in a pipeline"""
+        pipeline = BuildPipeline(
+            LocalBuildsConnector(failing_builds=["3"]),
+            fetchers=3, parsers=2, uploaders=1, queue_size=1,
+            upload=self.upload
+        )
+        pipeline.start()
+        for build in range(1, 7):
+            pipeline.add_build(TEST_REPO, build)
+        pipeline.join()
+
+        # all jobs of successful builds are uploaded
+        self.assertListEqual(
+            ["{0:d}.{1:d}".format(build, job)
+             for build in (1, 2, 4, 5, 6) for job in (1, 2)],
+            sorted(job.get_property("job") for job in self.uploaded_jobs)
+        )
+        for build_job in self.uploaded_jobs:
+            self.assertEqual("push", build_job.get_property("build_trigger"))
+            self.assertEqual(TEST_REPO, build_job.get_property("repo"))
+
+        stats = pipeline.get_stats()
+        self.assertListEqual(sorted(PIPELINE_STAGES), sorted(stats.keys()))
+        self.assertEqual(6, stats["fetch"]["processed"])
+        self.assertEqual(1, stats["fetch"]["errors"])
+        self.assertEqual(10, stats["parse"]["processed"])
+        self.assertEqual(10, stats["upload"]["processed"])
+        self.assertEqual(0, stats["upload"]["errors"])
+        for stage in PIPELINE_STAGES:
+            self.assertEqual(0, stats[stage]["queue_depth"])
+            # queues are bounded
+            self.assertLessEqual(stats[stage]["max_queue_depth"], 1)
+            self.assertTrue(stats[stage]["throughput"] > 0)
+            self.assertTrue(stats[stage]["busy_time"] >= 0)
+
+    def test_pipeline_upload_errors(self):
+        """Test errors in upload stage"""
+        pipeline = BuildPipeline(
+            LocalBuildsConnector(), upload=mock.Mock(side_effect=ValueError)
+        )
+        pipeline.start()
+        pipeline.add_build(TEST_REPO, 1)
+        pipeline.join()
+
+        self.assertEqual(2, pipeline.get_stats()["upload"]["errors"])
+
+    @mock.patch('buildtimetrend.keenio.send_build_data_service')
+    def test_upload_build_job(self, send_func):
+        """Test upload_build_job()"""
+        build_job = BuildJob()
+        build_job.add_property("repo", TEST_REPO)
+        upload_build_job(build_job)
+        send_func.assert_called_once_with(build_job, "full")
+
+    def test_spool_job_log(self):
+        """Test spooling a job log to a temporary file"""
+        job_log = spool_job_log(io.BytesIO(b'line1\nline2\n'))
+        self.assertEqual(b'line1\nline2\n', job_log.read())
+        # small log is kept in memory
+        self.assertFalse(job_log._rolled)
+        job_log.close()
+
+        # large log is written to a temporary file
+        content = b'line\n' * (LOG_SPOOL_MAX_MEMORY // 5 + 1)
+        job_log = spool_job_log(io.BytesIO(content))
+        self.assertTrue(job_log._rolled)
+        self.assertEqual(content, job_log.read())
+        job_log.close()
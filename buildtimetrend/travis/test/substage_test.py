@@ -163,6 +163,54 @@ class TestTravisSubstage(unittest.TestCase):
             self.substage.stage.to_dict()
         )
 
+    def test_process_parsed_tags_tag_type(self):
+        """Test Substage.process_parsed_tags() with a tag type"""
+        # handler of tag type is called, even if tags don't match
+        self.assertRaises(
+            TypeError, self.substage.process_parsed_tags, None, 'fold_start'
+        )
+        self.assertFalse(self.substage.process_parsed_tags(
+            {'start_hash': VALID_HASH1}, 'fold_start'
+        ))
+        self.assertFalse(self.substage.has_started())
+
+        # unknown tag type : handler is derived from tags
+        self.assertTrue(self.substage.process_parsed_tags(
+            {'start_stage': 'stage1', 'start_substage': 'substage1'},
+            'unknown'
+        ))
+        self.assertEqual("stage1.substage1", self.substage.get_name())
+
+        self.assertTrue(self.substage.process_parsed_tags(
+            {'start_hash': VALID_HASH1}, 'time_start'
+        ))
+        self.assertTrue(self.substage.process_parsed_tags(
+            {'command': 'command1.sh'}, 'shell_command'
+        ))
+        self.assertTrue(self.substage.process_parsed_tags({
+            'end_hash': VALID_HASH1,
+            'start_timestamp': constants.TIMESTAMP_NANO_STARTED,
+            'finish_timestamp': constants.TIMESTAMP_NANO_FINISHED,
+            'duration': DURATION_NANO
+        }, 'time_end'))
+        self.assertFalse(self.substage.has_finished())
+        self.assertTrue(self.substage.process_parsed_tags(
+            {'end_stage': 'stage1', 'end_substage': 'substage1'}, 'fold_end'
+        ))
+        self.assertFalse(self.substage.finished_incomplete)
+        self.assertTrue(self.substage.has_finished())
+
+        self.assertDictEqual(
+            {
+                "name": "stage1.substage1",
+                "duration": DURATION_SEC,
+                "command": "command1.sh",
+                "started_at": constants.SPLIT_TIMESTAMP_STARTED,
+                "finished_at": constants.SPLIT_TIMESTAMP_FINISHED
+            },
+            self.substage.stage.to_dict()
+        )
+
     def test_process_parsed_tags_no_starttag(self):
         """Test Substage.process_parsed_tags() with a missing start tag"""
         # pass a valid timing hash
@@ -559,7 +607,7 @@ class TestTravisSubstage(unittest.TestCase):
         or if finished_incomplete is set
         """
         # set finish_timestamp
-        self.substage.stage.set_finished_at = constants.TIMESTAMP_FINISHED
+        self.substage.stage.set_finished_at(constants.TIMESTAMP_FINISHED)
         # set finished_incomplete
         self.substage.finished_incomplete = True
         self.assertTrue(self.substage.has_finished())
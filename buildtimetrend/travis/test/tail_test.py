@@ -0,0 +1,145 @@
+# vim: set expandtab sw=4 ts=4:
+#
+# Unit tests for following the job log of a running Travis CI job
+#
+# Copyright (C) 2014-2016 Dieter Adriaenssens <ruleant@users.sourceforge.net>
+#
+# This file is part of buildtimetrend/python-lib
+# <https://github.com/buildtimetrend/python-lib/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import json
+from buildtimetrend.settings import Settings
+from buildtimetrend.travis.connector import TravisConnector
+from buildtimetrend.travis.parser import TravisData
+from buildtimetrend.travis.tail import JobLogTail
+from buildtimetrend.travis.test.travis_test import JOB_DATA_PYTHON
+from buildtimetrend.travis.test.travis_test import TRAVIS_LOG_FILE
+import unittest
+
+
+class GrowingLogConnector(TravisConnector):
+
+    """Travis connector returning the log of a running job."""
+
+    def __init__(self, job_log):
+        """
+        Constructor.
+
+        Parameters:
+        - job_log : complete job log, as bytes
+        """
+        super(GrowingLogConnector, self).__init__()
+        self.job_log = job_log
+        # number of bytes of the job log that were written
+        self.size = 0
+        # number of bytes written to the job log after each request
+        self.growth = 0
+        self.requests = []
+
+    def json_request(self, json_request):
+        """Return job data, the job is finished if the log is complete."""
+        job_data = json.loads(JOB_DATA_PYTHON)
+        if self.size < len(self.job_log):
+            job_data['job']['state'] = 'started'
+            job_data['job']['finished_at'] = None
+        return job_data
+
+    def download_job_log_part(self, job_id, offset=0):
+        """Return the part of the written job log after offset."""
+        self.requests.append(offset)
+        job_log_part = self.job_log[offset:self.size]
+        self.size = min(self.size + self.growth, len(self.job_log))
+        return io.BytesIO(job_log_part)
+
+
+class TestJobLogTail(unittest.TestCase):
+
+    """Unit tests for JobLogTail"""
+
+    def setUp(self):
+        """Initialise test environment before each test."""
+        # reinit settings singleton
+        Settings().__init__()
+
+        with open(TRAVIS_LOG_FILE, 'rb') as log_file:
+            self.job_log = log_file.read()
+
+        # stages of the complete job log
+        travis_data = TravisData("buildtimetrend/python-lib", 536)
+        travis_data.process_job_data(json.loads(JOB_DATA_PYTHON))
+        travis_data.parse_job_log_stream(io.BytesIO(self.job_log))
+        self.stages = travis_data.current_job.stages.stage_list
+
+        self.connector = GrowingLogConnector(self.job_log)
+        self.travis_data = TravisData(
+            "buildtimetrend/python-lib", 536, self.connector
+        )
+        self.tail = JobLogTail(self.travis_data, 54287645)
+
+    def test_poll(self):
+        """Test poll(), job log grows between polls"""
+        self.assertEqual([], self.tail.poll())
+        self.assertEqual("started", self.travis_data.current_job.get_property(
+            "result"
+        ))
+
+        # log grows in parts that end in the middle of a line
+        stages = []
+        part_size = len(self.job_log) // 7 + 1
+        for size in range(part_size, len(self.job_log), part_size):
+            self.connector.size = size
+            stages.extend(self.tail.poll())
+            self.assertEqual(size, self.tail.offset)
+            # stages are returned as soon as they are finished
+            self.assertListEqual(
+                [stage.to_dict() for stage in self.stages[:len(stages)]],
+                [stage.to_dict() for stage in stages]
+            )
+
+        self.assertTrue(0 < len(stages) < len(self.stages))
+
+        self.connector.size = len(self.job_log)
+        stages.extend(self.tail.poll())
+        stages.extend(self.tail.finish())
+
+        # only the new part of the log was requested
+        self.assertEqual(
+            [0, 0] + list(range(part_size, len(self.job_log), part_size)),
+            self.connector.requests
+        )
+        self.assertEqual(len(self.job_log), self.tail.offset)
+        self.assertTrue(self.tail.finished)
+        self.assertListEqual(
+            [stage.to_dict() for stage in self.stages],
+            [stage.to_dict() for stage in stages]
+        )
+
+    def test_follow(self):
+        """Test follow(), until job is finished"""
+        self.connector.growth = len(self.job_log) // 3 + 1
+
+        stages = list(self.tail.follow(interval=0))
+
+        # log was polled until job finished
+        self.assertEqual(4, len(self.connector.requests))
+        self.assertListEqual(
+            [stage.to_dict() for stage in self.stages],
+            [stage.to_dict() for stage in stages]
+        )
+        self.assertEqual("passed", self.travis_data.current_job.get_property(
+            "result"
+        ))
@@ -20,9 +20,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import os
+import re
 import json
+import time
 import buildtimetrend
+from collections import OrderedDict
 from builtins import str
 from buildtimetrend.settings import Settings
 from buildtimetrend.tools import get_repo_slug
@@ -30,6 +34,9 @@ from buildtimetrend.tools import check_dict
 from buildtimetrend.travis import connector
 from buildtimetrend.buildjob import BuildJob
 from buildtimetrend.travis.parser import TravisData
+from buildtimetrend.travis.parser import scan_travis_time_tags
+from buildtimetrend.travis.parser import create_substage_index
+from buildtimetrend.travis.parser import TRAVIS_LOG_PARSE_TIMING_STRINGS
 from buildtimetrend.travis.connector import TravisConnector
 from buildtimetrend.travis.tools import convert_build_result
 from buildtimetrend.travis.tools import check_authorization
@@ -313,6 +320,31 @@ JOB_DATA_JAVA = '{"job":{"id":35665484,"repository_id":1390431,"repository_slug"
 JOB_DATA_ANDROID = '{"job":{"id":62985775,"repository_id":1390431,"repository_slug":"ruleant/getback_gps","build_id":62985773,"commit_id":17998453,"log_id":43745930,"number":"577.1","config":{"language":"android","android":{"components":["android-20","build-tools-21.1.2"]},"before_install":["cd $HOME","if [[ -d buildtime-trend/.git ]]; then cd buildtime-trend; git pull; cd ..; else git clone --recursive https://github.com/buildtimetrend/python-client.git buildtime-trend; fi","source buildtime-trend/init.sh","mvn -v","timestamp.sh install_libs","sudo apt-get update -qq","sudo apt-get install -qq python-pip","timestamp.sh install_python_libs","sudo CFLAGS=-O0 pip install -r ${BUILD_TREND_HOME}/requirements.txt","timestamp.sh deploy_android_sdk","$TRAVIS_BUILD_DIR/.utility/deploy-sdk-to-m2-repo.sh","cd $TRAVIS_BUILD_DIR"],"script":["timestamp.sh test","./gradlew clean check"],"after_success":["timestamp.sh coverage","mvn clean test cobertura:cobertura coveralls:cobertura -B","timestamp.sh update_javadoc","mvn clean install javadoc:javadoc -DskipTests=true",".utility/copy-javadoc-to-gh-pages.sh"],"after_script":["timestamp.sh end","sync-buildtime-trend-with-gh-pages.sh"],"addons":{},"notifications":{"webhooks":["https://buildtimetrend.herokuapp.com/travis","https://buildtimetrend-dev.herokuapp.com/travis"]},".result":"configured","global_env":"GH_TOKEN=[secure] COVERITY_SCAN_TOKEN=[secure] KEEN_PROJECT_ID=[secure] KEEN_WRITE_KEY=[secure] KEEN_MASTER_KEY=[secure]","os":"linux"},"state":"passed","started_at":"2015-05-18T08:56:53Z","finished_at":"2015-05-18T09:00:18Z","queue":"builds.linux","allow_failure":false,"tags":null,"annotation_ids":[]},"commit":{"id":17998453,"sha":"0f6f6f4af0b9c5013c9ebd1022780915e79a0701","branch":"master","message":"update bttaas url","committed_at":"2015-05-18T08:55:38Z","author_name":"Dieter Adriaenssens","author_email":"ruleant@users.sourceforge.net","committer_name":"Dieter Adriaenssens","committer_email":"ruleant@users.sourceforge.net","compare_url":"https://github.com/ruleant/getback_gps/compare/6de49007276c...0f6f6f4af0b9"},"annotations":[]}'
 
 
+class LocalTravisConnector(TravisConnector):
+
+    """Travis connector returning local job data and logs."""
+
+    def __init__(self, job_ids):
+        """Constructor."""
+        super(LocalTravisConnector, self).__init__()
+        self.job_ids = job_ids
+
+    def json_request(self, json_request):
+        """Return job data, with the job number based on the job ID."""
+        job_id = json_request.split('/')[-1]
+        job_data = json.loads(JOB_DATA_PYTHON)
+        job_data['job']['number'] = '536.{}'.format(
+            self.job_ids.index(job_id) + 1
+        )
+        return job_data
+
+    def download_job_log(self, job_id):
+        """Return sample log, first jobs are slowest."""
+        time.sleep(0.01 * (len(self.job_ids) - self.job_ids.index(job_id)))
+        with open(TRAVIS_LOG_FILE, 'rb') as log_file:
+            return io.BytesIO(log_file.read())
+
+
 class TestTravis(unittest.TestCase):
 
     """Unit tests for Travis CI related functions and classes"""
@@ -428,6 +460,113 @@ class TestTravis(unittest.TestCase):
             "61db633141cd24b4c9cbccb2a2c2c6a99988c3e346b951e4666e50474518cb82"
         ))
 
+    def test_scan_travis_time_tags(self):
+        """Test scan_travis_time_tags()"""
+        self.assertListEqual([], scan_travis_time_tags(""))
+        self.assertListEqual([], scan_travis_time_tags("no tags"))
+
+        self.assertListEqual(
+            [
+                (
+                    'time_end',
+                    {
+                        'end_hash': '29db6a24',
+                        'start_timestamp': '1408282815329854910',
+                        'finish_timestamp': '1408282815463525921',
+                        'duration': '133671011'
+                    }
+                ),
+                ('fold_end', {'end_stage': 'git', 'end_substage': '1'}),
+                ('fold_start', {'start_stage': 'git', 'start_substage': '2'}),
+                ('time_start', {'start_hash': '0e44eb6d'}),
+                ('shell_command', {'command': 'cd ruleant/buildtime-trend'}),
+            ],
+            scan_travis_time_tags(
+                'travis_time:end:29db6a24:start=1408282815329854910,'
+                'finish=1408282815463525921,duration=133671011\r\x1b[0K'
+                'travis_fold:end:git.1\r\x1b[0K'
+                'travis_fold:start:git.2\r\x1b[0K'
+                'travis_time:start:0e44eb6d\r\x1b[0K'
+                '$ cd ruleant/buildtime-trend\r\n'
+            )
+        )
+
+        # only first tag of each type is returned
+        self.assertListEqual(
+            [('fold_end', {'end_stage': 'git', 'end_substage': '1'})],
+            scan_travis_time_tags(
+                'travis_fold:end:git.1\r\x1b[0Ktravis_fold:end:git.2\r\x1b'
+            )
+        )
+
+    def test_scan_travis_time_tags_escapes(self):
+        """
+        Test scan_travis_time_tags() with escape sequences in values.
+
+        Values end at the first carriage return or escape character,
+        the regular expressions in TRAVIS_LOG_PARSE_TIMING_STRINGS
+        matched up to the last one, swallowing the next tags.
+        """
+        # ANSI escape sequences in a command are kept
+        self.assertListEqual(
+            [('shell_command', {'command': 'echo -e "\x1b[33mhi\x1b[0m"'})],
+            scan_travis_time_tags('$ echo -e "\x1b[33mhi\x1b[0m"\r\n')
+        )
+        # command ends at the first carriage return
+        self.assertListEqual(
+            [('shell_command', {'command': 'echo a'})],
+            scan_travis_time_tags('$ echo a\rb\r\n')
+        )
+        # hash of a timing tag doesn't include the next tag
+        self.assertListEqual(
+            [
+                ('fold_end', {'end_stage': 'git', 'end_substage': '1'}),
+                ('time_start', {'start_hash': '0e44eb6d'}),
+            ],
+            scan_travis_time_tags(
+                'travis_time:start:0e44eb6d\r\x1b[0K'
+                'travis_fold:end:git.1\r\x1b[0K'
+            )
+        )
+        self.assertListEqual(
+            [
+                (
+                    'time_end',
+                    {
+                        'end_hash': '29db6a24',
+                        'start_timestamp': '1',
+                        'finish_timestamp': '2',
+                        'duration': '1'
+                    }
+                ),
+            ],
+            scan_travis_time_tags(
+                'travis_time:end:29db6a24:start=1,finish=2,duration=1\r\x1b'
+                '[0Ktravis_time:end:0e44eb6d:start=3,finish=4,duration=1\r\x1b'
+            )
+        )
+
+    def test_scan_travis_time_tags_sample_log(self):
+        """
+        Test scan_travis_time_tags() with a sample Travis CI log.
+
+        Results should match parsing each TRAVIS_LOG_PARSE_TIMING_STRINGS
+        regular expression separately.
+        """
+        with open(TRAVIS_LOG_FILE, 'rb') as log_file:
+            for line in log_file:
+                line = line.decode('utf-8')
+                expected_tags = []
+                for parse_string in TRAVIS_LOG_PARSE_TIMING_STRINGS:
+                    result = re.search(parse_string, line)
+                    if result:
+                        expected_tags.append(result.groupdict())
+
+                self.assertListEqual(
+                    expected_tags,
+                    [tags for tag_type, tags in scan_travis_time_tags(line)]
+                )
+
 
 class TestTravisData(unittest.TestCase):
 
@@ -588,6 +727,56 @@ class TestTravisData(unittest.TestCase):
             "before_install.4", self.travis_data.get_substage_name("mvn -v")
         )
 
+    def test_create_substage_index(self):
+        """Test create_substage_index()"""
+        self.assertDictEqual({}, create_substage_index(None))
+        self.assertDictEqual({}, create_substage_index({}))
+
+        build_config = OrderedDict([
+            ("language", "python"),
+            ("install", ["pip install .", "setup.sh"]),
+            ("script", ["test.sh", "setup.sh", "test.sh", {"key": "value"}])
+        ])
+        # first stage and first position of a command is used
+        self.assertDictEqual(
+            {
+                "pip install .": "install.1",
+                "setup.sh": "install.2",
+                "test.sh": "script.1"
+            },
+            create_substage_index(build_config)
+        )
+
+    def test_get_substage_index(self):
+        """Test TravisData.get_substage_index()"""
+        self.assertDictEqual({}, self.travis_data.get_substage_index())
+
+        build_data = json.loads(JOB_DATA_ANDROID)["job"]
+        self.travis_data.current_build_data = build_data
+        substage_index = self.travis_data.get_substage_index()
+        self.assertEqual("before_install.4", substage_index["mvn -v"])
+
+        # index is reused for the same build
+        self.assertIs(substage_index, self.travis_data.get_substage_index())
+        self.assertIs(
+            substage_index, self.travis_data.get_substage_index(build_data)
+        )
+
+        # index is shared with job parsers of the same build
+        job_parser = self.travis_data.create_job_parser(build_data)
+        self.assertIs(substage_index, job_parser.get_substage_index())
+        self.assertEqual(
+            "before_install.4", job_parser.get_substage_name("mvn -v")
+        )
+
+        # index is created again when build changes
+        self.travis_data.current_build_data = {
+            "config": {"script": ["mvn -v"]}
+        }
+        self.assertEqual(
+            "script.1", self.travis_data.get_substage_name("mvn -v")
+        )
+
     def test_process_no_build_job(self):
         """Test TravisData.process_build_job() with invalid parameters"""
         self.assertRaises(TypeError, self.travis_data.process_build_job)
@@ -671,6 +860,67 @@ class TestTravisData(unittest.TestCase):
             self.travis_data.build_jobs["50398739"].properties.get_items()
         )
 
+    def test_process_build_jobs_concurrent(self):
+        """Test TravisData.process_build_jobs() with several workers"""
+        job_ids = [str(job_id) for job_id in range(54287645, 54287651)]
+        builds_data = {
+            "builds": [
+                {"job_ids": job_ids[:4], "event_type": "push"},
+                {"job_ids": job_ids[4:], "event_type": "pull_request"}
+            ]
+        }
+
+        serial_data = TravisData(
+            TEST_REPO, 536, LocalTravisConnector(job_ids)
+        )
+        serial_data.builds_data = builds_data
+        serial_jobs = list(serial_data.process_build_jobs())
+
+        self.travis_data = TravisData(
+            TEST_REPO, 536, LocalTravisConnector(job_ids)
+        )
+        self.travis_data.builds_data = builds_data
+        self.travis_data.job_workers = 4
+        build_jobs = list(self.travis_data.process_build_jobs())
+
+        # build jobs are returned in job order, with separate job state
+        self.assertEqual(len(job_ids), len(build_jobs))
+        self.assertEqual(len(job_ids), len(set(build_jobs)))
+        for serial_job, build_job in zip(serial_jobs, build_jobs):
+            self.assertDictEqual(
+                serial_job.properties.get_items(),
+                build_job.properties.get_items()
+            )
+            self.assertListEqual(
+                serial_job.stages.stages, build_job.stages.stages
+            )
+        self.assertListEqual(
+            ['536.{}'.format(i) for i in range(1, 7)],
+            [build_job.get_property('job') for build_job in build_jobs]
+        )
+        self.assertEqual(
+            'pull_request', build_jobs[5].get_property('build_trigger')
+        )
+        self.assertEqual(18, len(build_jobs[0].stages.stages))
+
+        # build jobs are stored, state of instance is unchanged
+        self.assertListEqual(
+            sorted(job_ids), sorted(self.travis_data.build_jobs.keys())
+        )
+        self.assertDictEqual({}, self.travis_data.current_build_data)
+        self.assertEqual(0, len(self.travis_data.current_job.stages.stages))
+
+        # workers parameter overrides job_workers
+        self.travis_data.build_jobs = {}
+        self.assertEqual(
+            len(job_ids), len(list(self.travis_data.process_build_jobs(2)))
+        )
+        self.assertEqual(len(job_ids), len(self.travis_data.build_jobs))
+
+        # no jobs
+        self.travis_data.builds_data = {"builds": [{}]}
+        self.assertListEqual([], list(self.travis_data.process_build_jobs()))
+
     def test_no_pull_request_data(self):
         """Test TravisData.process_pull_request_data() with no data"""
         self.travis_data.current_build_data = {"test_value": "empty"}
@@ -876,6 +1126,88 @@ class TestTravisData(unittest.TestCase):
         self.assertTrue(self.travis_data.parse_job_log_file(TRAVIS_LOG_FILE))
         self._check_travis_log()
 
+    def test_parse_valid_job_log_travis_sample_mmap(self):
+        """Test TravisData.parse_job_log_file() with a memory mapped file"""
+        self.assertFalse(
+            self.travis_data.parse_job_log_file('nofile.csv', use_mmap=True)
+        )
+
+        self.travis_data.current_job.set_started_at("2014-08-17T13:40:14Z")
+        self.assertTrue(
+            self.travis_data.parse_job_log_file(TRAVIS_LOG_FILE, use_mmap=True)
+        )
+        self._check_travis_log()
+
+    def test_parse_job_log_stream(self):
+        """Test TravisData.parse_job_log_stream() with streams and lists"""
+        self.travis_data.current_job.set_started_at("2014-08-17T13:40:14Z")
+        with open(TRAVIS_LOG_FILE, 'rb') as log_file:
+            log_bytes = log_file.read()
+
+        # stream with invalid UTF-8 characters
+        self.travis_data.parse_job_log_stream(
+            io.BytesIO(b'\xff\xfe invalid\n' + log_bytes)
+        )
+        self._check_travis_log()
+
+        # list of lines (bytes)
+        self.travis_data.current_job = BuildJob()
+        self.travis_data.current_job.set_started_at("2014-08-17T13:40:14Z")
+        self.travis_data.parse_job_log_stream(
+            io.BytesIO(log_bytes).readlines()
+        )
+        self._check_travis_log()
+
+    def test_iter_job_log_stages(self):
+        """Test TravisData.iter_job_log_stages()"""
+        self.travis_data.current_job.set_started_at("2014-08-17T13:40:14Z")
+        with open(TRAVIS_LOG_FILE, 'rb') as log_file:
+            log_bytes = log_file.read()
+        self.travis_data.parse_job_log_stream(io.BytesIO(log_bytes))
+        expected = [
+            stage.to_dict()
+            for stage in self.travis_data.current_job.stages.stage_list
+        ]
+
+        self.travis_data.current_job = BuildJob()
+        self.travis_data.current_job.set_started_at("2014-08-17T13:40:14Z")
+        self.travis_data.log_chunk_size = 1024
+        stream = io.BytesIO(log_bytes)
+        stages = self.travis_data.iter_job_log_stages(stream)
+
+        # first stage is returned before the stream is read completely
+        stage = next(stages)
+        self.assertEqual(expected[0], stage.to_dict())
+        self.assertTrue(stream.tell() < len(log_bytes))
+
+        self.assertListEqual(
+            expected[1:], [stage.to_dict() for stage in stages]
+        )
+
+        # stages are not added to the current job, worker is set
+        self.assertEqual(0, len(self.travis_data.current_job.stages))
+        self.assertDictEqual(
+            {
+                'hostname': 'worker-linux-12-1.bb.travis-ci.org',
+                'os': 'travis-linux-11'
+            },
+            self.travis_data.current_job.get_property("worker")
+        )
+
+    def test_parse_job_log_stream_no_timing_tags(self):
+        """Test TravisData.parse_job_log_stream() without timing tags"""
+        with open(TRAVIS_LOG_FILE, 'rb') as log_file:
+            self.travis_data.parse_job_log_stream(log_file)
+
+        self.assertEqual(0, len(self.travis_data.current_job.stages.stages))
+        self.assertDictEqual(
+            {
+                'hostname': 'worker-linux-12-1.bb.travis-ci.org',
+                'os': 'travis-linux-11'
+            },
+            self.travis_data.current_job.get_property("worker")
+        )
+
     def test_parse_travis_log(self):
         """Test TravisData.parse_job_log() : download and parse"""
         self.travis_data.current_job.set_started_at("2014-08-17T13:40:14Z")